@@ -36,6 +36,8 @@ import logging
 import random
 import math
 import abc
+import time
+import cProfile
 
 from . import __version__ as package_version
 from .formula import Formula, Radical
@@ -45,8 +47,9 @@ from .metabolicmodel import MetabolicModel
 from .reaction import Compound
 from .datasource.native import NativeModel
 from .datasource import sbml
-from . import fluxanalysis, massconsistency, fastcore
-from .lpsolver import generic
+from . import fluxanalysis, massconsistency, fastcore, deletion, sampling
+from . import coupling
+from .lpsolver import generic, lp
 
 # Module-level logging
 logger = logging.getLogger(__name__)
@@ -234,6 +237,214 @@ class ConsoleCommand(Command):
             self.open_ipython_kernel(message, namespace)
 
 
+class FluxCouplingCommand(SolverCommandMixin, Command):
+    """Find the flux coupling of pairs of reactions
+
+    The coupled pairs of reactions are printed with the type of coupling.
+    For fully coupled pairs the ratio of the fluxes of the first reaction to
+    the second is also printed, and for partially coupled pairs the minimum
+    and maximum ratio is printed. For directionally coupled pairs non-zero
+    flux of the first reaction implies non-zero flux of the second.
+    """
+
+    name = 'coupling'
+    title = 'Find the flux coupling of pairs of reactions'
+
+    @classmethod
+    def init_parser(cls, parser):
+        parser.add_argument(
+            '--reaction', help='Reaction to find coupling of (default all'
+            ' reactions)', action='append', type=str, metavar='reaction')
+        parser.add_argument(
+            '--epsilon', type=float, help='Flux threshold',
+            default=1e-5)
+        parser.add_argument(
+            '--parallel', help='Number of worker processes to use',
+            type=int, default=1, metavar='N')
+        super(FluxCouplingCommand, cls).init_parser(parser)
+
+    def run(self):
+        if self._args.reaction is not None:
+            reactions = self._args.reaction
+            for reaction_id in reactions:
+                if not self._mm.has_reaction(reaction_id):
+                    raise ValueError(
+                        'Specified reaction is not in model: {}'.format(
+                            reaction_id))
+        else:
+            reactions = sorted(self._mm.reactions)
+
+        solver = self._get_solver()
+        results = coupling.flux_coupling(
+            self._mm, solver, reactions, epsilon=self._args.epsilon,
+            parallel=self._args.parallel)
+        for reaction1, reaction2, coupling_type, ratio in results:
+            if ratio is not None and coupling_type == coupling.Coupling.Full:
+                print('{}\t{}\t{}\t{}'.format(
+                    reaction1, reaction2, coupling_type, ratio[0]))
+            elif ratio is not None:
+                print('{}\t{}\t{}\t{}\t{}'.format(
+                    reaction1, reaction2, coupling_type, *ratio))
+            else:
+                print('{}\t{}\t{}'.format(
+                    reaction1, reaction2, coupling_type))
+
+
+class DeletionCommand(SolverCommandMixin, Command):
+    """Find the effect of deleting single reactions or pairs of reactions
+
+    The objective reaction is maximized with each reaction (or each pair of
+    reactions) deleted, and the maximum objective flux is printed. By default
+    all reactions in the model are deleted.
+    """
+
+    name = 'deletion'
+    title = 'Find the effect of deleting reactions'
+
+    @classmethod
+    def init_parser(cls, parser):
+        parser.add_argument(
+            '--objective', help='Reaction to maximize')
+        parser.add_argument(
+            '--double', help='Delete all pairs of reactions',
+            action='store_true')
+        parser.add_argument(
+            '--delete', help='Reaction to delete (default all reactions)',
+            action='append', type=str, metavar='reaction')
+        parser.add_argument(
+            '--parallel', help='Number of worker processes to use',
+            type=int, default=1, metavar='N')
+        super(DeletionCommand, cls).init_parser(parser)
+
+    def run(self):
+        if self._args.objective is not None:
+            reaction = self._args.objective
+        else:
+            reaction = self._model.get_biomass_reaction()
+            if reaction is None:
+                raise ValueError('The biomass reaction was not specified')
+
+        if not self._mm.has_reaction(reaction):
+            raise ValueError('Specified reaction is not in model: {}'.format(
+                reaction))
+
+        if self._args.delete is not None:
+            reactions = self._args.delete
+            for reaction_id in reactions:
+                if not self._mm.has_reaction(reaction_id):
+                    raise ValueError(
+                        'Specified reaction is not in model: {}'.format(
+                            reaction_id))
+        else:
+            reactions = sorted(self._mm.reactions)
+
+        def format_flux(value):
+            return 'infeasible' if value is None else value
+
+        solver = self._get_solver()
+        if not self._args.double:
+            results = deletion.single_deletion(
+                self._mm, reaction, solver, reactions,
+                parallel=self._args.parallel)
+            for reaction_id, value in results:
+                print('{}\t{}'.format(reaction_id, format_flux(value)))
+        else:
+            results = deletion.double_deletion(
+                self._mm, reaction, solver, reactions,
+                parallel=self._args.parallel)
+            for reaction1, reaction2, value in results:
+                print('{}\t{}\t{}'.format(
+                    reaction1, reaction2, format_flux(value)))
+
+
+class FastcoreCommand(SolverCommandMixin, Command):
+    """Find context-specific subnetworks of many core sets using Fastcore
+
+    Each line of the core file contains the name of a core set followed by
+    the IDs of the core reactions. The name and the reactions of the
+    subnetwork of each core set are printed on one line (or written to the
+    output file) as soon as the subnetwork is found. If Fastcore fails on
+    any of the core sets the command exits with an error after the other
+    core sets are written.
+    """
+
+    name = 'fastcore'
+    title = 'Find context-specific subnetworks using Fastcore'
+
+    @classmethod
+    def init_parser(cls, parser):
+        parser.add_argument(
+            'cores', metavar='file', type=argparse.FileType('r'),
+            help='List of core sets with one core set on each line')
+        parser.add_argument(
+            '--penalty', metavar='file', type=argparse.FileType('r'),
+            help='List of penalty scores for non-core reactions')
+        parser.add_argument(
+            '--epsilon', type=float, help='Threshold for Fastcore',
+            default=1e-5)
+        parser.add_argument(
+            '--output', metavar='file',
+            help='Write subnetworks to file instead of standard output')
+        parser.add_argument(
+            '--parallel', help='Number of worker processes to use',
+            type=int, default=1, metavar='N')
+        super(FastcoreCommand, cls).init_parser(parser)
+
+    def _parse_cores(self):
+        """Yield name and set of reactions of each core set in file"""
+        for line in self._args.cores:
+            line, _, comment = line.partition('#')
+            fields = line.split()
+            if len(fields) == 0:
+                continue
+            name, core = fields[0], set(fields[1:])
+            for reaction_id in core:
+                if not self._mm.has_reaction(reaction_id):
+                    raise ValueError(
+                        'Reaction of core set {} is not in model: {}'.format(
+                            name, reaction_id))
+            yield name, core
+
+    def run(self):
+        weights = {}
+        if self._args.penalty is not None:
+            for line in self._args.penalty:
+                line, _, comment = line.partition('#')
+                line = line.strip()
+                if line == '':
+                    continue
+                rxnid, weight = line.split(None, 1)
+                weights[rxnid] = float(weight)
+
+        solver = self._get_solver()
+        results = fastcore.fastcore_batch(
+            self._mm, self._parse_cores(), self._args.epsilon, solver,
+            weights=weights, parallel=self._args.parallel)
+
+        failed = []
+        output = None
+        if self._args.output is not None:
+            output = open(self._args.output, 'w')
+        try:
+            for name, subnetwork in results:
+                if subnetwork is None:
+                    failed.append(name)
+                    continue
+                line = '\t'.join([name] + sorted(subnetwork))
+                if output is None:
+                    print(line)
+                else:
+                    output.write(line + '\n')
+                    output.flush()
+        finally:
+            if output is not None:
+                output.close()
+
+        if len(failed) > 0:
+            sys.exit('Fastcore failed on {} core sets: {}'.format(
+                len(failed), ', '.join(failed)))
+
+
 class FastGapFillCommand(SolverCommandMixin, Command):
     """Run FastGapFill algorithm on a metabolic model"""
 
@@ -368,6 +579,10 @@ class FluxBalanceCommand(SolverCommandMixin, Command):
         parser.add_argument(
             '--no-tfba', help='Disable thermodynamic constraints on FBA',
             action='store_true')
+        parser.add_argument(
+            '--loopless', action='store_true',
+            help='Remove internal loops using LP instead of thermodynamic'
+                 ' constraints')
         parser.add_argument(
             '--epsilon', type=float, help='Threshold for flux minimization',
             default=1e-5)
@@ -396,7 +611,9 @@ class FluxBalanceCommand(SolverCommandMixin, Command):
             raise ValueError('Specified reaction is not in model: {}'.format(
                 reaction))
 
-        if self._args.no_tfba:
+        if self._args.loopless:
+            result = self.run_fba_loopless(reaction)
+        elif self._args.no_tfba:
             result = self.run_fba_minimized(reaction)
         else:
             result = self.run_tfba(reaction)
@@ -417,21 +634,32 @@ class FluxBalanceCommand(SolverCommandMixin, Command):
         """Run normal FBA and flux minimization on model, then print output"""
 
         solver = self._get_solver()
-        fba_fluxes = dict(fluxanalysis.flux_balance(
-            self._mm, reaction, tfba=False, solver=solver))
-        optimum = fba_fluxes[reaction]
         epsilon = self._args.epsilon
 
-        # Run flux minimization
-        fmin_fluxes = dict(fluxanalysis.flux_minimization(
-            self._mm, {reaction: optimum}, solver=solver))
+        # Run FBA and flux minimization on the same problem
         count = 0
-        for reaction_id, flux in fmin_fluxes.iteritems():
-            if fba_fluxes[reaction_id] - epsilon > flux:
+        for reaction_id, fba_flux, flux in (
+                fluxanalysis.parsimonious_flux_balance(
+                    self._mm, reaction, solver=solver)):
+            if fba_flux - epsilon > flux:
                 count += 1
-            yield reaction_id, fba_fluxes[reaction_id], flux
+            yield reaction_id, fba_flux, flux
         logger.info('Minimized reactions: {}'.format(count))
 
+    def run_fba_loopless(self, reaction):
+        """Run FBA and remove internal loops from the solution"""
+
+        solver = self._get_solver()
+        fba = fluxanalysis.FluxBalanceProblem(self._mm, solver)
+        fba.solve(reaction)
+
+        reactions = list(self._mm.reactions)
+        fba_fluxes = fba.get_fluxes(reactions)
+        fluxes = fba.get_loopless_fluxes(reactions, fixed=[reaction])
+        for reaction_id, fba_flux, flux in zip(
+                reactions, fba_fluxes, fluxes):
+            yield reaction_id, fba_flux, flux
+
     def run_tfba(self, reaction):
         """Run FBA and tFBA on model"""
 
@@ -467,6 +695,10 @@ class FluxConsistencyCommand(SolverCommandMixin, Command):
             '--no-tfba',
             help='Disable thermodynamic constraints on flux check',
             action='store_true')
+        parser.add_argument(
+            '--loopless', action='store_true',
+            help='Remove internal loops using LP instead of thermodynamic'
+                 ' constraints')
         parser.add_argument(
             '--epsilon', type=float, help='Flux threshold',
             default=1e-5)
@@ -500,7 +732,7 @@ class FluxConsistencyCommand(SolverCommandMixin, Command):
             inconsistent = set(fastcore.fastcc(
                 self._mm, epsilon, solver=solver))
         else:
-            enable_tfba = not self._args.no_tfba
+            enable_tfba = not (self._args.no_tfba or self._args.loopless)
             if enable_tfba:
                 solver = self._get_solver(integer=True)
             else:
@@ -508,7 +740,8 @@ class FluxConsistencyCommand(SolverCommandMixin, Command):
             inconsistent = set(
                 fluxanalysis.consistency_check(
                     self._mm, self._mm.reactions, epsilon,
-                    tfba=enable_tfba, solver=solver))
+                    tfba=enable_tfba, solver=solver,
+                    loopless=self._args.loopless))
 
         # Count the number of reactions that are fixed at zero. While these
         # reactions are still inconsistent, they are inconsistent because they
@@ -559,6 +792,13 @@ class FluxVariabilityCommand(SolverCommandMixin, Command):
         parser.add_argument(
             '--no-tfba', help='Disable thermodynamic constraints on FVA',
             action='store_true')
+        parser.add_argument(
+            '--loopless', action='store_true',
+            help='Remove internal loops using LP instead of thermodynamic'
+                 ' constraints')
+        parser.add_argument(
+            '--parallel', help='Number of worker processes to use',
+            type=int, default=1, metavar='N')
         parser.add_argument('reaction', help='Reaction to maximize', nargs='?')
         super(FluxVariabilityCommand, cls).init_parser(parser)
 
@@ -584,7 +824,7 @@ class FluxVariabilityCommand(SolverCommandMixin, Command):
             raise ValueError('Specified reaction is not in model: {}'.format(
                 reaction))
 
-        enable_tfba = not self._args.no_tfba
+        enable_tfba = not (self._args.no_tfba or self._args.loopless)
         if enable_tfba:
             solver = self._get_solver(integer=True)
         else:
@@ -596,7 +836,8 @@ class FluxVariabilityCommand(SolverCommandMixin, Command):
 
         flux_bounds = fluxanalysis.flux_variability(
             self._mm, sorted(self._mm.reactions), {reaction: optimum},
-            tfba=enable_tfba, solver=solver)
+            tfba=enable_tfba, solver=solver, parallel=self._args.parallel,
+            loopless=self._args.loopless)
         for reaction_id, bounds in flux_bounds:
             rx = self._mm.get_reaction(reaction_id)
             rxt = rx.translated_compounds(lambda x: compound_name.get(x, x))
@@ -735,6 +976,76 @@ class GapFillCommand(SolverCommandMixin, Command):
             logger.info('No blocked compounds found')
 
 
+class GeneDeletionCommand(SolverCommandMixin, Command):
+    """Find the effect of deleting single genes or pairs of genes
+
+    The reactions disabled by the deleted genes are found from the gene
+    association rules (``genes`` property) of the reactions. The objective
+    reaction is then maximized with the disabled reactions deleted.
+    """
+
+    name = 'genedelete'
+    title = 'Find the effect of deleting genes'
+
+    @classmethod
+    def init_parser(cls, parser):
+        parser.add_argument(
+            '--objective', help='Reaction to maximize')
+        parser.add_argument(
+            '--double', help='Delete all pairs of genes',
+            action='store_true')
+        parser.add_argument(
+            '--gene', help='Gene to delete (default all genes)',
+            action='append', type=str)
+        parser.add_argument(
+            '--parallel', help='Number of worker processes to use',
+            type=int, default=1, metavar='N')
+        super(GeneDeletionCommand, cls).init_parser(parser)
+
+    def run(self):
+        if self._args.objective is not None:
+            reaction = self._args.objective
+        else:
+            reaction = self._model.get_biomass_reaction()
+            if reaction is None:
+                raise ValueError('The biomass reaction was not specified')
+
+        if not self._mm.has_reaction(reaction):
+            raise ValueError('Specified reaction is not in model: {}'.format(
+                reaction))
+
+        rules = {}
+        for reaction_entry in self._model.parse_reactions():
+            if (reaction_entry.genes is not None and
+                    self._mm.has_reaction(reaction_entry.id)):
+                rules[reaction_entry.id] = reaction_entry.genes
+        rules = deletion.GeneRules(rules)
+
+        if self._args.gene is not None:
+            genes = self._args.gene
+            for gene in genes:
+                if gene not in rules.genes:
+                    raise ValueError(
+                        'Specified gene is not in model: {}'.format(gene))
+        else:
+            genes = sorted(rules.genes)
+
+        if not self._args.double:
+            knockouts = [(gene,) for gene in genes]
+        else:
+            knockouts = [(gene1, gene2) for i, gene1 in enumerate(genes)
+                         for gene2 in genes[i+1:]]
+
+        solver = self._get_solver()
+        results = deletion.gene_deletion(
+            self._mm, reaction, solver, rules, knockouts,
+            parallel=self._args.parallel)
+        for knockout, value in results:
+            if value is None:
+                value = 'infeasible'
+            print('{}\t{}'.format('\t'.join(knockout), value))
+
+
 class MassConsistencyCommand(SolverCommandMixin, Command):
     """Command that checks whether a database is mass consistent"""
 
@@ -886,7 +1197,6 @@ class RandomSparseNetworkCommand(SolverCommandMixin, Command):
         logger.info('Flux threshold for {} is {}'.format(reaction, flux_threshold))
 
         if self._args.exchange:
-            model_test = self._mm.copy()
             essential = { reaction }
             deleted = set()
             exchange = set()
@@ -895,32 +1205,32 @@ class RandomSparseNetworkCommand(SolverCommandMixin, Command):
                     exchange.add(reaction_id)
             test_set = set(exchange) - essential
         else:
-            model_test = self._mm.copy()
             essential = { reaction }
             deleted = set()
             test_set = set(self._mm.reactions) - essential
 
+        # The same problem is reused for all deletions. Deleted reactions
+        # keep the bounds at zero while essential reactions are restored.
         while len(test_set) > 0:
             testing_reaction = random.sample(test_set, 1)[0]
             test_set.remove(testing_reaction)
-            saved_bounds = model_test.limits[testing_reaction].bounds
-            model_test.limits[testing_reaction].bounds = 0, 0
+            saved_bounds = self._mm.limits[testing_reaction].bounds
+            p.set_flux_bounds(testing_reaction, 0, 0)
 
             logger.info('Trying FBA without reaction {}...'.format(testing_reaction))
 
-            p = fb_problem(model_test, solver)
             try:
                 p.solve(reaction)
             except fluxanalysis.FluxBalanceError:
                 logger.info('FBA is infeasible, marking {} as essential'.format(testing_reaction))
-                model_test.limits[testing_reaction].bound = saved_bounds
+                p.set_flux_bounds(testing_reaction, *saved_bounds)
                 essential.add(testing_reaction)
                 continue
 
             logger.debug('Reaction {} has flux {}'.format(reaction, p.get_flux(reaction)))
 
             if p.get_flux(reaction) < flux_threshold:
-                model_test.limits[testing_reaction].bounds = saved_bounds
+                p.set_flux_bounds(testing_reaction, *saved_bounds)
                 essential.add(testing_reaction)
                 logger.info('Reaction {} was essential'.format(testing_reaction))
             else:
@@ -943,6 +1253,12 @@ class RobustnessCommand(SolverCommandMixin, Command):
     reaction to vary at each iteration. The reaction will
     be fixed at the specified number of steps between the
     minimum and maximum flux value specified in the model.
+    If a second reaction to vary is given, the FBA is run
+    at each point in a grid of the two fluxes (phenotype
+    phase plane). In exact mode the breakpoints of the
+    optimal objective as a function of the varying flux
+    are found from the reduced costs and the FBA is only
+    run at the breakpoints.
     """
 
     name = 'robustness'
@@ -959,42 +1275,59 @@ class RobustnessCommand(SolverCommandMixin, Command):
         parser.add_argument(
             '--maximum', metavar='V', type=float,
             help='Maximum flux value of varying reacton')
+        parser.add_argument(
+            '--second', metavar='reaction', type=str,
+            help='Second reaction to vary (phenotype phase plane)')
+        parser.add_argument(
+            '--second-steps', metavar='N', type=int,
+            help='Number of flux value steps for second varying reaction')
+        parser.add_argument(
+            '--second-minimum', metavar='V', type=float,
+            help='Minimum flux value of second varying reaction')
+        parser.add_argument(
+            '--second-maximum', metavar='V', type=float,
+            help='Maximum flux value of second varying reaction')
+        parser.add_argument(
+            '--exact', action='store_true',
+            help='Solve only at the breakpoints of the objective value')
         parser.add_argument(
             '--no-tfba', help='Disable thermodynamic constraints on FBA',
             action='store_true')
+        parser.add_argument(
+            '--parallel', help='Number of worker processes to use',
+            type=int, default=1, metavar='N')
         parser.add_argument(
             '--reaction', help='Reaction to maximize', nargs='?')
         parser.add_argument('varying', help='Reaction to vary')
         super(RobustnessCommand, cls).init_parser(parser)
 
-    def run(self):
-        """Run flux analysis command"""
+    def _flux_steps(self, reaction, steps, minimum, maximum):
+        """Return list of evenly spaced flux values of varying reaction"""
+        if not self._mm.has_reaction(reaction):
+            raise ValueError('Specified reaction is not in model: {}'.format(
+                reaction))
 
-        def run_fba_fmin(model, reaction):
-            fba = fluxanalysis.FluxBalanceProblem(model, solver=solver)
-            fba.solve(reaction)
-            optimum = fba.get_flux(reaction)
-            return fluxanalysis.flux_minimization(
-                model, {reaction: optimum}, solver=solver)
+        if steps <= 0:
+            raise ValueError('Invalid number of steps: {}\n'.format(steps))
 
-        def run_tfba(model, reaction):
-            return fluxanalysis.flux_balance(
-                model, reaction, tfba=True, solver=solver)
+        flux_min = self._mm.limits[reaction].lower
+        flux_max = self._mm.limits[reaction].upper
+        if minimum is not None:
+            flux_min = minimum
+        if maximum is not None:
+            flux_max = maximum
 
-        if self._args.no_tfba:
-            run_fba = run_fba_fmin
-            solver = self._get_solver()
-        else:
-            run_fba = run_tfba
-            solver = self._get_solver(integer=True)
+        if flux_min > flux_max:
+            raise ValueError('Invalid flux range: {}, {}\n'.format(
+                flux_min, flux_max))
 
-        # Load compound information
-        compound_name = {}
-        for compound in self._model.parse_compounds():
-            if 'name' in compound.properties:
-                compound_name[compound.id] = compound.properties['name']
-            elif compound.id not in compound_name:
-                compound_name[compound.id] = compound.id
+        if steps == 1:
+            return [flux_min]
+        return [flux_min + i*(flux_max - flux_min)/float(steps-1)
+                for i in xrange(steps)]
+
+    def run(self):
+        """Run flux analysis command"""
 
         if self._args.reaction is not None:
             reaction = self._args.reaction
@@ -1007,38 +1340,130 @@ class RobustnessCommand(SolverCommandMixin, Command):
             raise ValueError('Specified reaction is not in model: {}'.format(
                 reaction))
 
-        varying_reaction = self._args.varying
-        if not self._mm.has_reaction(varying_reaction):
-            raise ValueError('Specified reaction is not in model: {}'.format(
-                varying_reaction))
+        varying = [self._args.varying]
+        if self._args.exact:
+            if self._args.second is not None:
+                raise ValueError(
+                    'Exact mode does not support a second varying reaction')
+            if not self._args.no_tfba:
+                raise ValueError(
+                    'Exact mode requires thermodynamic constraints to be'
+                    ' disabled (--no-tfba)')
+            if not self._mm.has_reaction(self._args.varying):
+                raise ValueError(
+                    'Specified reaction is not in model: {}'.format(
+                        self._args.varying))
+
+            breakpoints = fluxanalysis.robustness_breakpoints(
+                self._mm, reaction, self._args.varying, self._get_solver(),
+                minimum=self._args.minimum, maximum=self._args.maximum)
+            values = [value for value, _ in breakpoints]
+        else:
+            values = self._flux_steps(
+                self._args.varying, self._args.steps,
+                self._args.minimum, self._args.maximum)
 
-        steps = self._args.steps
-        if steps <= 0:
-            raise ValueError('Invalid number of steps: {}\n'.format(steps))
+        if self._args.second is None:
+            points = [(value,) for value in values]
+        else:
+            steps = self._args.second_steps
+            if steps is None:
+                steps = self._args.steps
+            second_values = self._flux_steps(
+                self._args.second, steps,
+                self._args.second_minimum, self._args.second_maximum)
+            varying.append(self._args.second)
+            points = fluxanalysis.phase_plane_points(values, second_values)
+
+        # One problem is used for all points and only the bounds of the
+        # varying reactions are changed. Without thermodynamic constraints
+        # the L1 norm of the fluxes is also minimized at each point.
+        if self._args.no_tfba:
+            solver = self._get_solver()
+        else:
+            solver = self._get_solver(integer=True)
 
-        # Run FBA on model at different fixed flux values
-        flux_min = self._mm.limits[varying_reaction].lower
-        flux_max = self._mm.limits[varying_reaction].upper
-        if self._args.minimum is not None:
-            flux_min = self._args.minimum
-        if self._args.maximum is not None:
-            flux_max = self._args.maximum
+        results = fluxanalysis.robustness(
+            self._mm, reaction, varying, points,
+            tfba=not self._args.no_tfba, solver=solver,
+            minimize=self._args.no_tfba, parallel=self._args.parallel)
+        for point, fluxes in results:
+            if fluxes is None:
+                continue
 
-        if flux_min > flux_max:
-            raise ValueError('Invalid flux range: {}, {}\n'.format(
-                flux_min, flux_max))
+            point = '\t'.join(str(value) for value in point)
+            for other_reaction in self._mm.reactions:
+                print('{}\t{}\t{}'.format(
+                    other_reaction, point, fluxes[other_reaction]))
 
-        for i in xrange(steps):
-            fixed_flux = flux_min + i*(flux_max - flux_min)/float(steps-1)
-            test_model = self._mm.copy()
-            test_model.limits[varying_reaction].bounds = fixed_flux, fixed_flux
 
-            try:
-                for other_reaction, flux in run_fba(test_model, reaction):
-                    print('{}\t{}\t{}'.format(
-                        other_reaction, fixed_flux, flux))
-            except fluxanalysis.FluxBalanceError:
-                pass
+class SampleCommand(SolverCommandMixin, Command):
+    """Sample the flux space of the model
+
+    Warm-up points are found by minimizing and maximizing each reaction and
+    the flux space is then sampled using the artificial centering
+    hit-and-run random walk. If an objective fraction is given, the flux of
+    the objective reaction is kept at or above that fraction of the maximum
+    objective flux.
+    """
+
+    name = 'sample'
+    title = 'Sample the flux space of a metabolic model'
+
+    @classmethod
+    def init_parser(cls, parser):
+        parser.add_argument(
+            '--samples', help='Number of samples',
+            type=int, default=1000, metavar='N')
+        parser.add_argument(
+            '--thinning', help='Number of steps between samples',
+            type=int, default=100, metavar='N')
+        parser.add_argument(
+            '--objective', help='Reaction to maximize')
+        parser.add_argument(
+            '--objective-fraction', type=float, metavar='F',
+            help='Fraction of the maximum objective flux to keep')
+        parser.add_argument(
+            '--output', metavar='file',
+            help='Write samples to .npy file instead of standard output')
+        parser.add_argument(
+            '--seed', help='Seed of the random number generator', type=int)
+        parser.add_argument(
+            '--parallel', help='Number of chains to run in worker processes',
+            type=int, default=1, metavar='N')
+        super(SampleCommand, cls).init_parser(parser)
+
+    def run(self):
+        solver = self._get_solver()
+
+        fixed = {}
+        if self._args.objective_fraction is not None:
+            if self._args.objective is not None:
+                reaction = self._args.objective
+            else:
+                reaction = self._model.get_biomass_reaction()
+                if reaction is None:
+                    raise ValueError('The biomass reaction was not specified')
+
+            if not self._mm.has_reaction(reaction):
+                raise ValueError(
+                    'Specified reaction is not in model: {}'.format(reaction))
+
+            fluxes = dict(fluxanalysis.flux_balance(
+                self._mm, reaction, tfba=False, solver=solver))
+            fixed[reaction] = self._args.objective_fraction * fluxes[reaction]
+
+        reactions, samples = sampling.sample(
+            self._mm, solver, self._args.samples, fixed=fixed,
+            thinning=self._args.thinning, output=self._args.output,
+            parallel=self._args.parallel, seed=self._args.seed)
+
+        # The reaction IDs are printed as the header of the columns. The
+        # samples are only printed when they are not written to a file.
+        print('\t'.join(reactions))
+        if self._args.output is None:
+            for row in samples:
+                print('\t'.join(str(value) for value in row))
 
 
 class SBMLExport(Command):
@@ -1205,6 +1630,13 @@ def main(command_class=None):
     parser.add_argument(
         '-V', '--version', action='version',
         version='%(prog)s ' + package_version)
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Print time spent in each phase of the command')
+    parser.add_argument(
+        '--profile-dump', metavar='file', type=str,
+        help='Write cProfile statistics of the command to file'
+             ' (implies --profile)')
 
     if command_class is not None:
         # Command explicitly given, only allow that command
@@ -1232,12 +1664,80 @@ def main(command_class=None):
 
     args = parser.parse_args()
 
-    # Load model definition
-    model = NativeModel(args.model)
+    if not args.profile and args.profile_dump is None:
+        # Load model definition
+        model = NativeModel(args.model)
+
+        # Instantiate command with model and run
+        command = args.command(model, args)
+        command.run()
+    else:
+        _run_profiled(args)
+
 
-    # Instantiate command with model and run
+def _run_profiled(args):
+    """Run command while recording the time spent in each phase
+
+    The phases are loading the model, building LP problems, solving LP
+    problems and the remaining time of the command (mainly analysis and
+    output). The time spent on LP problems is obtained from
+    :data:`psamm.lpsolver.lp.statistics`.
+    """
+
+    profiler = None
+    if args.profile_dump is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    lp.statistics.enabled = True
+    lp.statistics.reset()
+
+    wall_start, cpu_start = time.time(), time.clock()
+    model = NativeModel(args.model)
     command = args.command(model, args)
-    command.run()
+    load_wall, load_cpu = time.time() - wall_start, time.clock() - cpu_start
+
+    wall_start, cpu_start = time.time(), time.clock()
+    try:
+        command.run()
+    finally:
+        run_wall = time.time() - wall_start
+        run_cpu = time.clock() - cpu_start
+        lp.statistics.enabled = False
+
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_dump)
+
+        stats = lp.statistics
+        build_wall = stats.build_time
+        solve_wall, solve_cpu = stats.solve_wall_time, stats.solve_cpu_time
+        rows, columns, nonzeros = stats.max_size()
+
+        def format_size(value):
+            return '-' if value is None else str(value)
+
+        f = sys.stderr
+        print('Profile (wall time, CPU time):', file=f)
+        print('  Model load:    {:10.3f} s {:10.3f} s'.format(
+            load_wall, load_cpu), file=f)
+        print('  Problem build: {:10.3f} s'.format(build_wall), file=f)
+        print('  Solve:         {:10.3f} s {:10.3f} s'.format(
+            solve_wall, solve_cpu), file=f)
+        print('  Other/output:  {:10.3f} s'.format(
+            max(0.0, run_wall - build_wall - solve_wall)), file=f)
+        print('  Total:         {:10.3f} s {:10.3f} s'.format(
+            load_wall + run_wall, load_cpu + run_cpu), file=f)
+        print('Solves: {}, mean solve time: {:.6f} s'.format(
+            stats.solve_count,
+            solve_wall / stats.solve_count if stats.solve_count > 0 else 0.0),
+            file=f)
+        print('Largest problem: {} rows, {} columns, {} nonzeros'.format(
+            format_size(rows), format_size(columns), format_size(nonzeros)),
+            file=f)
+        if profiler is not None:
+            print('cProfile statistics written to {}'.format(
+                args.profile_dump), file=f)
 
 
 if __name__ == '__main__':
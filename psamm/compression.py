@@ -0,0 +1,416 @@
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+"""Compression of metabolic models
+
+A model is compressed by removing the blocked reactions and merging
+reactions whose fluxes are fully coupled into lumped reactions, similar to
+the compression described in [Gagneur04]_. Two kinds of coupling are
+merged:
+
+- Linear chains: If a compound is only produced or consumed by two
+  reactions, the steady state of the compound fixes the ratio of the two
+  fluxes, and the compound is removed when the reactions are merged.
+- Enzyme subsets: Reactions with proportional rows in the nullspace of the
+  stoichiometric matrix have proportional fluxes in every steady state.
+
+The flux of every original reaction is a fixed multiple of the flux of the
+lumped reaction that it is part of, and the flux bounds of a lumped reaction
+are the intersection of the scaled bounds of its reactions. The compressed
+model is an ordinary :class:`psamm.metabolicmodel.MetabolicModel` so the
+analyses (e.g. :func:`psamm.fluxanalysis.flux_balance`,
+:func:`psamm.fluxanalysis.flux_variability` or
+:func:`psamm.fastcore.fastcc`) can be run on it directly, and the results are
+expanded to the original reactions with :class:`CompressedModel`.
+"""
+
+import logging
+from collections import defaultdict
+
+import numpy
+
+from .database import DictDatabase
+from .metabolicmodel import MetabolicModel
+from .matrix import stoichiometric_matrix, nullspace
+from .reaction import Reaction
+from . import fastcore
+
+# Module-level logging
+logger = logging.getLogger(__name__)
+
+# Nullspace values smaller than this are zero, and so are stoichiometric
+# values of merged reactions that are this small relative to their terms
+_TOLERANCE = 1e-9
+
+
+class CompressedModel(object):
+    """Compressed model and the mapping to the original reactions
+
+    The compressed model is available as :attr:`model`. Each reaction of
+    the compressed model is a lumped reaction that is identified by the ID of
+    one of its original reactions (a reaction that is not merged keeps its
+    ID).
+    """
+
+    def __init__(self, model, members, blocked):
+        self._model = model
+        self._members = members
+        self._blocked = frozenset(blocked)
+        self._lumped = {}
+        for lumped_id, reactions in members.iteritems():
+            for reaction_id, factor in reactions.iteritems():
+                self._lumped[reaction_id] = lumped_id, factor
+
+    @property
+    def model(self):
+        """Compressed :class:`psamm.metabolicmodel.MetabolicModel`"""
+        return self._model
+
+    @property
+    def blocked(self):
+        """Set of original reactions that were removed as blocked"""
+        return self._blocked
+
+    def members(self, reaction_id):
+        """Return dict of original reactions and factors of lumped reaction
+
+        The flux of each original reaction is the flux of the lumped
+        reaction multiplied by the factor.
+        """
+        return dict(self._members[reaction_id])
+
+    def lumped_reaction(self, reaction_id):
+        """Return the lumped reaction and factor of an original reaction
+
+        Returns None for a blocked reaction.
+        """
+        return self._lumped.get(reaction_id)
+
+    def expand_fluxes(self, fluxes):
+        """Return dict of fluxes of the original reactions
+
+        The fluxes of the compressed model are given as pairs of lumped
+        reaction ID and flux, e.g. from
+        :func:`psamm.fluxanalysis.flux_balance`. Blocked reactions have zero
+        flux.
+        """
+        result = dict((reaction_id, 0.0) for reaction_id in self._blocked)
+        for lumped_id, flux in fluxes:
+            for reaction_id, factor in self._members[lumped_id].iteritems():
+                result[reaction_id] = factor * flux
+        return result
+
+    def expand_bounds(self, bounds):
+        """Return dict of flux bounds of the original reactions
+
+        The bounds of the compressed model are given as pairs of lumped
+        reaction ID and a tuple of lower and upper bound, e.g. from
+        :func:`psamm.fluxanalysis.flux_variability`. Blocked reactions have
+        bounds of zero.
+        """
+        result = dict((reaction_id, (0.0, 0.0))
+                      for reaction_id in self._blocked)
+        for lumped_id, (lower, upper) in bounds:
+            for reaction_id, factor in self._members[lumped_id].iteritems():
+                values = factor * lower, factor * upper
+                result[reaction_id] = min(values), max(values)
+        return result
+
+    def expand_reactions(self, reactions):
+        """Return set of the original reactions of the lumped reactions"""
+        return set(reaction_id for lumped_id in reactions
+                   for reaction_id in self._members[lumped_id])
+
+
+class _Compressor(object):
+    """Lumped reactions that are merged while compressing a model
+
+    Each lumped reaction has a stoichiometry, flux bounds and the factors of
+    its original reactions. The reactions of each compound are kept so the
+    linear chains can be found. A reaction in keep is never removed and is
+    always the representative of the lumped reaction it is part of, so at
+    most one of these can be part of each lumped reaction.
+    """
+
+    def __init__(self, model, reactions, keep):
+        self.keep = keep
+        self.stoichiometry = dict((reaction_id, {})
+                                  for reaction_id in reactions)
+        self.bounds = dict(
+            (reaction_id, tuple(float(v) for v in model.limits[reaction_id]))
+            for reaction_id in reactions)
+        self.members = dict((reaction_id, {reaction_id: 1.0})
+                            for reaction_id in reactions)
+        self.compound_reactions = defaultdict(set)
+        self.exchange = set(reaction_id for reaction_id in reactions
+                            if model.is_exchange(reaction_id))
+
+        for (compound, reaction_id), value in model.matrix.iteritems():
+            if reaction_id in self.stoichiometry and value != 0:
+                self.stoichiometry[reaction_id][compound] = float(value)
+                self.compound_reactions[compound].add(reaction_id)
+
+    def _representative(self, reactions):
+        """Return the representative and the other of two reactions
+
+        Returns None if both reactions are kept.
+        """
+        first, second = sorted(reactions)
+        if second in self.keep:
+            if first in self.keep:
+                return None
+            return second, first
+        return first, second
+
+    def _merged_stoichiometry(self, reaction_id, other, factor):
+        """Return stoichiometry of reaction merged with other reaction
+
+        Values that cancel are removed when they are small relative to the
+        values that are added.
+        """
+        stoichiometry = dict(self.stoichiometry[reaction_id])
+        for compound, value in self.stoichiometry[other].iteritems():
+            current = stoichiometry.get(compound, 0.0)
+            added = factor * value
+            value = current + added
+            if abs(value) < _TOLERANCE * max(abs(current), abs(added)):
+                stoichiometry.pop(compound, None)
+            else:
+                stoichiometry[compound] = value
+        return stoichiometry
+
+    def can_merge(self, reaction_id, other, factor):
+        """Return whether other reaction can be merged into reaction
+
+        Exchange reactions are not constrained by the thermodynamic
+        constraints so a merge is only allowed if the lumped reaction is an
+        exchange reaction exactly when one of the reactions is.
+        """
+        exchange = reaction_id in self.exchange or other in self.exchange
+        values = self._merged_stoichiometry(
+            reaction_id, other, factor).itervalues()
+        return exchange == (len(set(value > 0 for value in values)) <= 1)
+
+    def merge(self, reaction_id, other, factor):
+        """Merge other reaction into reaction
+
+        The flux of the other reaction is the flux of the reaction
+        multiplied by factor.
+        """
+        stoichiometry = self._merged_stoichiometry(reaction_id, other, factor)
+        for compound in self.stoichiometry[reaction_id]:
+            self.compound_reactions[compound].discard(reaction_id)
+        for compound in self.stoichiometry.pop(other):
+            self.compound_reactions[compound].discard(other)
+        self.stoichiometry[reaction_id] = stoichiometry
+        for compound in stoichiometry:
+            self.compound_reactions[compound].add(reaction_id)
+
+        if other in self.exchange:
+            self.exchange.discard(other)
+            self.exchange.add(reaction_id)
+
+        for member, value in self.members.pop(other).iteritems():
+            self.members[reaction_id][member] = factor * value
+
+        lower, upper = self.bounds[reaction_id]
+        other_lower, other_upper = self.bounds.pop(other)
+        if factor < 0:
+            other_lower, other_upper = other_upper, other_lower
+        lower = max(lower, other_lower / factor)
+        upper = min(upper, other_upper / factor)
+        if lower > upper:
+            raise ValueError(
+                'Coupled reactions {} and {} cannot have flux within'
+                ' their flux bounds'.format(reaction_id, other))
+        self.bounds[reaction_id] = lower, upper
+
+    def remove(self, reaction_id):
+        """Remove reaction and return dict of its original reactions"""
+        for compound in self.stoichiometry.pop(reaction_id):
+            self.compound_reactions[compound].discard(reaction_id)
+        del self.bounds[reaction_id]
+        self.exchange.discard(reaction_id)
+        return self.members.pop(reaction_id)
+
+    def merge_linear_chains(self):
+        """Merge the two reactions of every compound with two reactions
+
+        Returns the number of merged reactions.
+        """
+        merged = 0
+        compounds = list(self.compound_reactions)
+        while len(compounds) > 0:
+            compound = compounds.pop()
+            reactions = self.compound_reactions[compound]
+            if len(reactions) != 2:
+                continue
+
+            pair = self._representative(reactions)
+            if pair is None:
+                continue
+
+            reaction_id, other = pair
+            factor = -(self.stoichiometry[reaction_id][compound] /
+                       self.stoichiometry[other][compound])
+            if not self.can_merge(reaction_id, other, factor):
+                continue
+
+            compounds.extend(self.stoichiometry[other])
+            self.merge(reaction_id, other, factor)
+            merged += 1
+
+        return merged
+
+    def merge_enzyme_subsets(self):
+        """Merge reactions with proportional rows in the nullspace
+
+        Reactions with a zero row in the nullspace cannot have flux at steady
+        state. Returns a dict of the original reactions of the removed
+        reactions along with the number of merged reactions.
+        """
+        reactions = sorted(self.stoichiometry)
+        matrix = stoichiometric_matrix(
+            (((compound, reaction_id), value)
+             for reaction_id in reactions
+             for compound, value in
+             self.stoichiometry[reaction_id].iteritems()),
+            reactions)
+        kernel = nullspace(matrix)
+
+        # Reactions are grouped by the column of the largest absolute value
+        # of the nullspace row so only rows in the same bucket are compared.
+        blocked = {}
+        buckets = defaultdict(list)
+        for j, reaction_id in enumerate(reactions):
+            row = kernel[j]
+            index = numpy.argmax(numpy.abs(row))
+            if abs(row[index]) < _TOLERANCE:
+                if reaction_id not in self.keep:
+                    blocked.update(self.remove(reaction_id))
+                continue
+
+            for group in buckets[index]:
+                factor = row[index] / group[0][1][index]
+                if numpy.allclose(row, factor * group[0][1],
+                                  rtol=1e-6, atol=1e-7):
+                    group.append((reaction_id, row))
+                    break
+            else:
+                buckets[index].append([(reaction_id, row)])
+
+        merged = 0
+        for index, groups in buckets.iteritems():
+            for group in groups:
+                kept = [(reaction_id, row) for reaction_id, row in group
+                        if reaction_id in self.keep]
+                if len(kept) > 1:
+                    continue
+                reaction_id, row = kept[0] if len(kept) > 0 else group[0]
+                for other, other_row in group:
+                    factor = other_row[index] / row[index]
+                    if (other != reaction_id and
+                            self.can_merge(reaction_id, other, factor)):
+                        self.merge(reaction_id, other, factor)
+                        merged += 1
+
+        return blocked, merged
+
+    def orient(self):
+        """Reverse lumped reactions that can only have negative flux"""
+        for reaction_id, (lower, upper) in self.bounds.iteritems():
+            if upper <= 0 and lower < 0 and reaction_id not in self.keep:
+                self.bounds[reaction_id] = -upper, -lower
+                self.stoichiometry[reaction_id] = dict(
+                    (compound, -value) for compound, value in
+                    self.stoichiometry[reaction_id].iteritems())
+                self.members[reaction_id] = dict(
+                    (member, -value) for member, value in
+                    self.members[reaction_id].iteritems())
+
+
+def compress_model(model, solver, epsilon=1e-5, keep=()):
+    """Return compressed model
+
+    The blocked reactions are found using
+    :func:`psamm.fastcore.fastcc` and removed. Then linear chains and
+    enzyme subsets are merged into lumped reactions until no more
+    reactions can be merged. The reactions in keep (e.g. the objective
+    reaction) are not removed or renamed and have the same flux in the
+    compressed model, but other reactions can be merged into them.
+
+    Exchange reactions are only merged with reactions when the lumped
+    reaction is also an exchange reaction, so the thermodynamic constraints
+    of tFBA apply to the same reactions in the compressed model. The
+    thermodynamic constraint of a lumped reaction is that of its net
+    reaction.
+
+    Args:
+        model: MetabolicModel to compress.
+        solver: LP solver instance to use for finding blocked reactions.
+        epsilon: Flux threshold of blocked reactions.
+        keep: Reactions that are kept in the compressed model.
+
+    Returns:
+        A :class:`CompressedModel`.
+    """
+
+    keep = set(keep)
+    for reaction_id in keep:
+        if not model.has_reaction(reaction_id):
+            raise ValueError('Reaction {} is not in model'.format(
+                reaction_id))
+
+    blocked = set(fastcore.fastcc(model, epsilon, solver=solver)) - keep
+    compressor = _Compressor(
+        model, [r for r in model.reactions if r not in blocked], keep)
+
+    while True:
+        merged = compressor.merge_linear_chains()
+        removed, subsets = compressor.merge_enzyme_subsets()
+        blocked.update(removed)
+        if subsets == 0 and len(removed) == 0:
+            break
+        logger.debug('Merged {} linear chain and {} enzyme subset'
+                     ' reactions, removed {} reactions'.format(
+                         merged, subsets, len(removed)))
+
+    compressor.orient()
+
+    database = DictDatabase()
+    for reaction_id, stoichiometry in compressor.stoichiometry.iteritems():
+        lower, upper = compressor.bounds[reaction_id]
+        direction = Reaction.Right if lower >= 0 else Reaction.Bidir
+        left = [(compound, -value) for compound, value in
+                sorted(stoichiometry.iteritems()) if value < 0]
+        right = [(compound, value) for compound, value in
+                 sorted(stoichiometry.iteritems()) if value > 0]
+        database.set_reaction(reaction_id, Reaction(direction, left, right))
+
+    compressed = MetabolicModel(database)
+    for reaction_id, (lower, upper) in compressor.bounds.iteritems():
+        compressed.add_reaction(reaction_id)
+        compressed.limits[reaction_id].bounds = lower, upper
+
+    logger.info('Compressed model from {} reactions and {} compounds to {}'
+                ' reactions and {} compounds ({} blocked)'.format(
+                    sum(1 for _ in model.reactions),
+                    sum(1 for _ in model.compounds),
+                    sum(1 for _ in compressed.reactions),
+                    sum(1 for _ in compressed.compounds), len(blocked)))
+
+    return CompressedModel(compressed, compressor.members, blocked)
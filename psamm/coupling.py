@@ -0,0 +1,442 @@
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+"""Flux coupling analysis
+
+Two reactions are coupled if a non-zero flux of one of the reactions implies
+a non-zero flux of the other at steady state [Burgard04]_. A pair of
+reactions is
+
+- fully coupled if the ratio of the fluxes is fixed,
+- partially coupled if non-zero flux of either reaction implies non-zero
+  flux of the other but the ratio is not fixed, or
+- directionally coupled if non-zero flux of one reaction implies non-zero
+  flux of the other but not the reverse.
+
+Whether non-zero flux of one reaction implies non-zero flux of another is
+found by looking for a flux where the other reaction is zero and the first is
+not [David11]_. The ratio of the fluxes of reactions that are coupled in both
+directions is found by solving the ratio problem as an LP using the
+Charnes-Cooper transformation. Both kinds of problems are solved on the same
+LP problem that is built once (see :class:`FluxCouplingProblem`).
+
+Most pairs are decided without solving any problems: Blocked reactions are
+removed first, each flux that is found shows that the reactions with
+non-zero flux do not imply any of the reactions with zero flux, the
+implications are transitive, and reactions that are fully coupled to a
+reaction are merged with it.
+"""
+
+import logging
+import multiprocessing
+from collections import defaultdict
+from itertools import izip
+
+from .lpsolver import lp
+from .matrix import add_mass_balance
+from .util import chunks
+from . import fastcore
+
+# Module-level logging
+logger = logging.getLogger(__name__)
+
+
+class Coupling(object):
+    """Type of coupling between two reactions"""
+
+    Full = 'full'
+    """The ratio of the fluxes is fixed"""
+
+    Partial = 'partial'
+    """Non-zero flux of either reaction implies non-zero flux of the other"""
+
+    Directional = 'directional'
+    """Non-zero flux of the first reaction implies non-zero flux of the
+    second"""
+
+
+class FluxCouplingProblem(object):
+    """Problem for finding the coupling between pairs of reactions
+
+    The variables w and t of the problem are constrained by ``S w = 0`` and
+    ``lower * t <= w <= upper * t`` where lower and upper are the flux
+    bounds of each reaction. With t fixed at one, w is a steady state flux
+    which is used to find fluxes where one reaction is zero and another is
+    not. With t free, this is the Charnes-Cooper transformation of the
+    problem of the ratio of two fluxes ``v_1 / v_2``: Fixing ``w_2`` at one
+    (or minus one) makes the value of ``w_1`` the ratio of the fluxes. Only
+    the bounds of t and of the variable of the second reaction are changed
+    between solves.
+    """
+
+    def __init__(self, model, solver, epsilon=1e-5):
+        self._prob = solver.create_problem()
+        self._epsilon = epsilon
+        self._bounds = dict(
+            (reaction_id, tuple(model.limits[reaction_id]))
+            for reaction_id in model.reactions)
+
+        self._prob.define(*(('w', reaction_id)
+                            for reaction_id in self._bounds))
+        self._prob.define('t', lower=1, upper=1)
+
+        # Define mass balance constraints
+        add_mass_balance(self._prob, model, 'w')
+
+        # Define the bounds of w scaled by t
+        rows, columns, values, senses = [], [], [], []
+        for reaction_id, bounds in self._bounds.iteritems():
+            for bound, sense in izip(
+                    bounds, (lp.Relation.Greater, lp.Relation.Less)):
+                row = len(senses)
+                rows.extend((row, row))
+                columns.extend((('w', reaction_id), 't'))
+                values.extend((1, -bound))
+                senses.append(sense)
+        self._prob.add_sparse_constraints(rows, columns, values, senses, 0)
+
+    def _solve(self, reaction, sense):
+        """Return optimal value of reaction variable or None"""
+        self._prob.set_linear_objective(self._prob.var(('w', reaction)))
+        result = self._prob.solve(sense)
+        if not result:
+            return None
+        return result.get_value(('w', reaction))
+
+    def _senses(self, reaction):
+        """Return objective senses that give non-zero flux of reaction"""
+        lower, upper = self._bounds[reaction]
+        if upper > 0:
+            yield lp.ObjectiveSense.Maximize
+        if lower < 0:
+            yield lp.ObjectiveSense.Minimize
+
+    def find_witness(self, reaction_1, reaction_2, reactions):
+        """Return support of a flux where reaction_1 is not implied
+
+        A steady state flux where reaction_2 has zero flux and reaction_1
+        has non-zero flux is found, and the set of the given reactions with
+        non-zero flux in this solution is returned. None is returned if
+        there is no such flux, which means that non-zero flux of reaction_1
+        implies non-zero flux of reaction_2.
+        """
+        self._prob.set_bounds(('w', reaction_2), lower=0, upper=0)
+        try:
+            for sense in self._senses(reaction_1):
+                value = self._solve(reaction_1, sense)
+                if value is not None and abs(value) > self._epsilon:
+                    fluxes = self._prob.result.get_values(
+                        [('w', reaction_id) for reaction_id in reactions])
+                    return set(
+                        reaction_id for reaction_id, flux in izip(
+                            reactions, fluxes) if abs(flux) > self._epsilon)
+            return None
+        finally:
+            self._prob.set_bounds(('w', reaction_2))
+
+    def ratio_ranges(self, reaction_1, reaction_2):
+        """Return ranges of the ratio of the flux of reaction_1 to reaction_2
+
+        The range is found separately for positive and for negative flux of
+        reaction_2 and a list of the minimum and maximum ratio is returned
+        with an entry for each direction where reaction_2 can have flux.
+        The ratio must be bounded, i.e. non-zero flux of reaction_1 must
+        imply non-zero flux of reaction_2.
+        """
+        ranges = []
+        self._prob.set_bounds('t', lower=0)
+        try:
+            for sense in self._senses(reaction_2):
+                sign = 1 if sense == lp.ObjectiveSense.Maximize else -1
+                self._prob.set_bounds(
+                    ('w', reaction_2), lower=sign, upper=sign)
+                minimum = self._solve(reaction_1, lp.ObjectiveSense.Minimize)
+                if minimum is None:
+                    continue
+                maximum = self._solve(reaction_1, lp.ObjectiveSense.Maximize)
+                if maximum is None:
+                    continue
+                if sign > 0:
+                    ranges.append((minimum, maximum))
+                else:
+                    ranges.append((-maximum, -minimum))
+            return ranges
+        finally:
+            self._prob.set_bounds('t', lower=1, upper=1)
+            self._prob.set_bounds(('w', reaction_2))
+
+
+class _Implications(object):
+    """Known implications between non-zero fluxes of reactions
+
+    The implications that are known to hold are kept transitively closed.
+    """
+
+    def __init__(self):
+        self._implied = defaultdict(set)
+        self._not_implied = defaultdict(set)
+
+    def get(self, reaction_1, reaction_2):
+        """Return whether reaction_1 implies reaction_2 or None if unknown"""
+        if reaction_2 in self._implied[reaction_1]:
+            return True
+        if reaction_2 in self._not_implied[reaction_1]:
+            return False
+        return None
+
+    def add(self, reaction_1, reaction_2, implied):
+        """Add whether reaction_1 implies reaction_2"""
+        if not implied:
+            self._not_implied[reaction_1].add(reaction_2)
+            return
+
+        targets = set(self._implied[reaction_2])
+        targets.add(reaction_2)
+        for reaction_id, implied_set in self._implied.items():
+            if reaction_1 in implied_set:
+                implied_set.update(targets)
+        self._implied[reaction_1].update(targets)
+
+    def add_support(self, support, reactions):
+        """Add the implications that are refuted by the support of a flux
+
+        A reaction with non-zero flux does not imply any of the reactions
+        with zero flux in the same solution.
+        """
+        zero = set(reactions).difference(support)
+        for reaction_id in support:
+            self._not_implied[reaction_id].update(zero)
+
+
+def _solve_pairs(problem, reactions, pairs, implications):
+    """Yield implications in both directions and ratio ranges of pairs
+
+    The ranges are None unless the reactions imply each other. The supports
+    of the fluxes that were found are also yielded for each pair.
+    """
+    for reaction_1, reaction_2 in pairs:
+        supports = []
+        implied = []
+        for first, second in ((reaction_1, reaction_2),
+                              (reaction_2, reaction_1)):
+            value = implications.get(first, second)
+            if value is None:
+                support = problem.find_witness(first, second, reactions)
+                value = support is None
+                if support is not None:
+                    implications.add_support(support, reactions)
+                    supports.append(support)
+                implications.add(first, second, value)
+            implied.append(value)
+
+        ranges = None
+        if all(implied):
+            ranges = problem.ratio_ranges(reaction_1, reaction_2)
+        yield reaction_1, reaction_2, implied[0], implied[1], ranges, supports
+
+
+# Problem of the current worker process
+_worker_problem = None
+
+
+def _coupling_worker_init(model, reactions, solver, epsilon):
+    """Build the coupling problem of a worker process"""
+    global _worker_problem
+    _worker_problem = (
+        FluxCouplingProblem(model, solver, epsilon), reactions)
+
+
+def _coupling_worker_solve(tasks):
+    """Return list of results of pairs solved in a worker process
+
+    The known implications of each pair are given with the pair and the
+    implications found in the worker are used for the remaining pairs.
+    """
+    problem, reactions = _worker_problem
+    implications = _Implications()
+    for reaction_1, reaction_2, implied_1, implied_2 in tasks:
+        if implied_1 is not None:
+            implications.add(reaction_1, reaction_2, implied_1)
+        if implied_2 is not None:
+            implications.add(reaction_2, reaction_1, implied_2)
+
+    pairs = [(reaction_1, reaction_2)
+             for reaction_1, reaction_2, _, _ in tasks]
+    return list(_solve_pairs(problem, reactions, pairs, implications))
+
+
+def _is_fixed_ratio(ranges):
+    """Return the ratio if all ranges are the same single value"""
+    if len(ranges) == 0:
+        return None
+    values = [value for bounds in ranges for value in bounds]
+    scale = max(1.0, max(abs(value) for value in values))
+    if max(values) - min(values) > 1e-6 * scale:
+        return None
+    return ranges[0][0]
+
+
+def _scale_ranges(ranges, factor):
+    """Return ratio ranges multiplied by factor"""
+    if factor < 0:
+        return [(factor * upper, factor * lower) for lower, upper in ranges]
+    return [(factor * lower, factor * upper) for lower, upper in ranges]
+
+
+def _invert_ranges(ranges):
+    """Return ranges of the inverse ratio
+
+    The ranges of reactions that imply each other do not include zero.
+    """
+    return [(1.0 / upper, 1.0 / lower) for lower, upper in ranges]
+
+
+def flux_coupling(model, solver, reactions=None, epsilon=1e-5,
+                  parallel=None):
+    """Find the coupling of each pair of reactions
+
+    Yields the coupled pairs of reactions with the type of coupling
+    (see :class:`Coupling`) and the ratio of the fluxes of the first to the
+    second reaction. Uncoupled pairs are not yielded. For fully and
+    partially coupled pairs the first reaction precedes the second in the
+    order of the reactions and the ratio is given as a tuple of minimum and
+    maximum, which are equal for fully coupled pairs. For directionally
+    coupled pairs the first reaction is the one that implies the other and
+    the ratio is None. Blocked reactions are not coupled to any reactions.
+
+    The pairs are solved one reaction at a time, and when the pairs of a
+    reaction have been solved, the reactions that are fully coupled to it
+    are merged with it, so only one of each set of fully coupled reactions
+    is solved against the other reactions. If parallel is larger than one,
+    the pairs of each reaction are split into chunks that are solved by a
+    pool of worker processes.
+
+    Args:
+        model: MetabolicModel to solve.
+        solver: LP solver instance to use.
+        reactions: Reactions to find the coupling of (default all reactions
+            in model).
+        epsilon: Flux threshold of non-zero fluxes.
+        parallel: Number of worker processes to use.
+
+    Returns:
+        Iterator over tuples of two reaction IDs, coupling and ratio.
+    """
+    if reactions is None:
+        reactions = sorted(model.reactions)
+    reactions = list(reactions)
+
+    blocked = set(fastcore.fastcc(model, epsilon, solver))
+    candidates = [r for r in reactions if r not in blocked]
+    logger.info('Finding coupling of {} reactions ({} blocked)'.format(
+        len(candidates), len(reactions) - len(candidates)))
+
+    problem = FluxCouplingProblem(model, solver, epsilon)
+    implications = _Implications()
+
+    pool = None
+    if parallel is not None and parallel > 1:
+        pool = multiprocessing.Pool(
+            parallel, _coupling_worker_init,
+            (model, candidates, solver, epsilon))
+
+    # Fully coupled reactions that are merged with each reaction, with the
+    # ratio of the flux of the merged reaction to the reaction.
+    members = dict((reaction_id, {reaction_id: 1.0})
+                   for reaction_id in candidates)
+    results = {}
+    solved = 0
+    try:
+        for i, reaction_1 in enumerate(candidates):
+            if reaction_1 not in members:
+                continue
+
+            pairs = [(reaction_1, reaction_2)
+                     for reaction_2 in candidates[i+1:]
+                     if reaction_2 in members]
+            if pool is None:
+                pair_results = _solve_pairs(
+                    problem, candidates, pairs, implications)
+            else:
+                tasks = [(r1, r2, implications.get(r1, r2),
+                          implications.get(r2, r1)) for r1, r2 in pairs]
+                chunk_size = max(1, min(50, len(tasks) // (parallel * 4)))
+                pair_results = (
+                    result for chunk_results in pool.imap(
+                        _coupling_worker_solve, chunks(tasks, chunk_size))
+                    for result in chunk_results)
+
+            for (reaction_1, reaction_2, implied_1, implied_2, ranges,
+                    supports) in pair_results:
+                if pool is not None:
+                    for support in supports:
+                        implications.add_support(support, candidates)
+                    implications.add(reaction_1, reaction_2, implied_1)
+                    implications.add(reaction_2, reaction_1, implied_2)
+                solved += len(supports)
+
+                ratio = None
+                if ranges is not None:
+                    ratio = _is_fixed_ratio(ranges)
+                if ratio is not None:
+                    members[reaction_1][reaction_2] = 1.0 / ratio
+                    del members[reaction_2]
+                else:
+                    results[reaction_1, reaction_2] = (
+                        implied_1, implied_2, ranges)
+
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    logger.info('Found {} fluxes of uncoupled reactions'.format(solved))
+
+    merged = {}
+    for reaction_id, reaction_members in members.iteritems():
+        for member, factor in reaction_members.iteritems():
+            merged[member] = reaction_id, factor
+
+    for i, reaction_1 in enumerate(candidates):
+        merged_1, factor_1 = merged[reaction_1]
+        for reaction_2 in candidates[i+1:]:
+            merged_2, factor_2 = merged[reaction_2]
+            if merged_1 == merged_2:
+                ratio = factor_1 / factor_2
+                yield reaction_1, reaction_2, Coupling.Full, (ratio, ratio)
+                continue
+
+            if (merged_1, merged_2) in results:
+                implied_1, implied_2, ranges = results[merged_1, merged_2]
+            else:
+                implied_2, implied_1, ranges = results[merged_2, merged_1]
+                if ranges is not None:
+                    ranges = _invert_ranges(ranges)
+
+            if implied_1 and implied_2:
+                ranges = _scale_ranges(ranges, factor_1 / factor_2)
+                ratio = None
+                if len(ranges) > 0:
+                    ratio = (min(lower for lower, _ in ranges),
+                             max(upper for _, upper in ranges))
+                yield reaction_1, reaction_2, Coupling.Partial, ratio
+            elif implied_1:
+                yield reaction_1, reaction_2, Coupling.Directional, None
+            elif implied_2:
+                yield reaction_2, reaction_1, Coupling.Directional, None
@@ -20,6 +20,8 @@
 import abc
 from collections import defaultdict, Mapping
 
+import numpy
+
 from .reaction import Reaction
 
 
@@ -64,14 +66,23 @@ class StoichiometricMatrixView(Mapping):
         return sum(sum(1 for _ in self._database.get_reaction_values(reaction))
                    for reaction in self._database.reactions)
 
+    def iteritems(self):
+        """Iterator of ((compound, reaction), value)-pairs
+
+        This avoids looking up each value separately which is what the
+        generic mapping implementation would do.
+        """
+        for reaction in self._database.reactions:
+            for compound, value in self._database.get_reaction_values(
+                    reaction):
+                yield (compound, reaction), value
+
     def __array__(self):
         """Return Numpy ndarray instance of matrix
 
         The matrix is indexed by sorted compound, reaction-keys
         """
 
-        import numpy  # NumPy is only required for this method
-
         compound_list = sorted(self._database.compounds)
         reaction_list = sorted(self._database.reactions)
         matrix = numpy.zeros((len(compound_list), len(reaction_list)))
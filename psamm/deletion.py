@@ -0,0 +1,494 @@
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+"""Single and double reaction deletion analysis
+
+The effect of deleting reactions is found by maximizing the objective
+reaction with the flux bounds of the deleted reactions set to zero. One flux
+balance problem is built and the bounds are changed in place for each
+deletion.
+
+A deletion can only change the optimum if every optimal solution uses the
+deleted reactions. Deletions of reactions that carry no flux in a known
+solution (the wild type solution for single deletions, or the solution of
+one of the single deletions for double deletions) are therefore not solved.
+
+Gene deletions are evaluated by finding the reactions that are disabled by
+the deleted genes using the gene association rules of the reactions (see
+:class:`GeneRules`).
+"""
+
+import logging
+import multiprocessing
+from itertools import izip
+
+from .fluxanalysis import FluxBalanceProblem, FluxBalanceError
+from .util import chunks
+from .expression import boolean
+
+# Module-level logging
+logger = logging.getLogger(__name__)
+
+
+class _DeletionProblem(object):
+    """Flux balance problem for solving deletions of reactions
+
+    The support of a solution is returned as a boolean
+    :class:`numpy.ndarray` indicating which of the given reactions carry
+    flux in the solution.
+    """
+
+    def __init__(self, model, objective, reactions, solver):
+        self._model = model
+        self._objective = objective
+        self._reactions = reactions
+        self._fba = FluxBalanceProblem(model, solver)
+
+    def solve(self, deleted, support=False):
+        """Return objective flux and support with reactions deleted
+
+        The objective flux is None if the problem is infeasible. The support
+        is only returned if support is True (otherwise None).
+        """
+        for reaction_id in deleted:
+            self._fba.set_flux_bounds(reaction_id, 0, 0)
+
+        try:
+            self._fba.solve(self._objective)
+        except FluxBalanceError:
+            return None, None
+        else:
+            value = self._fba.get_flux(self._objective)
+            if not support:
+                return value, None
+            return value, self._fba.get_fluxes(self._reactions) != 0
+        finally:
+            for reaction_id in deleted:
+                self._fba.set_flux_bounds(
+                    reaction_id, *self._model.limits[reaction_id])
+
+
+# Problem of the current worker process
+_worker_problem = None
+
+
+def _deletion_worker_init(model, objective, reactions, solver):
+    """Build the deletion problem of a worker process"""
+    global _worker_problem
+    _worker_problem = _DeletionProblem(model, objective, reactions, solver)
+
+
+def _deletion_worker_solve(task):
+    """Return list of results of deletions solved in a worker process"""
+    deletions, support = task
+    return [_worker_problem.solve(deleted, support) for deleted in deletions]
+
+
+def _solve_deletions(problem, pool, deletions, support, chunk_size):
+    """Yield result of each deletion in order
+
+    The deletions are solved using problem, or by the workers of pool if it
+    is not None.
+    """
+    if pool is None:
+        for deleted in deletions:
+            yield problem.solve(deleted, support)
+    else:
+        tasks = ((chunk, support) for chunk in chunks(deletions, chunk_size))
+        for results in pool.imap(_deletion_worker_solve, tasks):
+            for result in results:
+                yield result
+
+
+def _chunk_size(count, parallel):
+    """Return number of deletions that are sent to a worker at a time"""
+    return max(1, min(50, count // (parallel * 4)))
+
+
+class _DeletionScreen(object):
+    """Solves the wild type and single deletions shared by the screens"""
+
+    def __init__(self, model, objective, reactions, solver, parallel):
+        self.reactions = list(reactions)
+        self.parallel = parallel if parallel is not None else 1
+        self._problem = _DeletionProblem(
+            model, objective, self.reactions, solver)
+
+        self._wild_type = None
+
+        self.pool = None
+        if self.parallel > 1:
+            self.pool = multiprocessing.Pool(
+                self.parallel, _deletion_worker_init,
+                (model, objective, self.reactions, solver))
+
+    def close(self):
+        """Stop the worker processes"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+    def solve(self, deletions, support):
+        """Yield results of deletions in order"""
+        return _solve_deletions(
+            self._problem, self.pool, deletions, support,
+            _chunk_size(len(deletions), self.parallel))
+
+    def wild_type(self):
+        """Return objective flux and support of the wild type solution"""
+        if self._wild_type is None:
+            self._wild_type = self._problem.solve([], support=True)
+            if self._wild_type[0] is None:
+                raise FluxBalanceError('Wild type problem is infeasible')
+        return self._wild_type
+
+    def single_deletions(self):
+        """Yield objective flux and support of each single deletion"""
+        wild_type, wild_type_support = self.wild_type()
+
+        # Deletions of reactions without flux in the wild type solution do
+        # not change the optimum so only the others are solved.
+        solve = [(reaction_id,) for i, reaction_id in
+                 enumerate(self.reactions) if wild_type_support[i]]
+        logger.info('Solving {} of {} single deletions'.format(
+            len(solve), len(self.reactions)))
+
+        results = self.solve(solve, support=True)
+        for i, reaction_id in enumerate(self.reactions):
+            if wild_type_support[i]:
+                yield next(results)
+            else:
+                yield wild_type, wild_type_support
+
+
+def single_deletion(model, objective, solver, reactions=None, parallel=None):
+    """Find the objective flux when each reaction is deleted
+
+    Yields the reaction ID and the maximum flux of the objective reaction
+    when the reaction is deleted. The flux is None if the problem is
+    infeasible without the reaction. Deletions of reactions that carry no
+    flux in the wild type solution are not solved.
+
+    Args:
+        model: MetabolicModel to solve.
+        objective: Reaction to maximize.
+        solver: LP solver instance to use.
+        reactions: Reactions to delete (default all reactions in model).
+        parallel: Number of worker processes to use.
+
+    Returns:
+        Iterator over pairs of reaction ID and objective flux.
+    """
+    if reactions is None:
+        reactions = sorted(model.reactions)
+
+    screen = _DeletionScreen(model, objective, reactions, solver, parallel)
+    try:
+        for reaction_id, (value, _) in izip(
+                screen.reactions, screen.single_deletions()):
+            yield reaction_id, value
+    finally:
+        screen.close()
+
+
+def double_deletion(model, objective, solver, reactions=None, parallel=None,
+                    block_size=10000):
+    """Find the objective flux when each pair of reactions is deleted
+
+    Yields the IDs of the two reactions and the maximum flux of the
+    objective reaction when both are deleted. The flux is None if the
+    problem is infeasible without the reactions. The pairs are yielded in
+    the order of the reactions with the first reaction preceding the second.
+
+    The single deletions are solved first. A pair is not solved if one of the
+    reactions carries no flux in the solution of the single deletion of the
+    other, since that solution is still feasible when both are deleted. If a
+    single deletion is infeasible then so are all pairs that include it.
+
+    Args:
+        model: MetabolicModel to solve.
+        objective: Reaction to maximize.
+        solver: LP solver instance to use.
+        reactions: Reactions to delete (default all reactions in model).
+        parallel: Number of worker processes to use.
+        block_size: Number of pairs that are pruned and solved at a time.
+
+    Returns:
+        Iterator over tuples of two reaction IDs and objective flux.
+    """
+    if reactions is None:
+        reactions = sorted(model.reactions)
+
+    screen = _DeletionScreen(model, objective, reactions, solver, parallel)
+    try:
+        singles = list(screen.single_deletions())
+        reactions = screen.reactions
+
+        def pairs():
+            for i in range(len(reactions)):
+                for j in range(i + 1, len(reactions)):
+                    yield i, j
+
+        def known_value(i, j):
+            value_i, support_i = singles[i]
+            value_j, support_j = singles[j]
+            if value_i is None or value_j is None:
+                return True, None
+            elif not support_i[j]:
+                return True, value_i
+            elif not support_j[i]:
+                return True, value_j
+            return False, None
+
+        # Pairs are handled in blocks so the results can be yielded in
+        # order while the pairs that must be solved are still sent to the
+        # workers in large batches.
+        solved_count = 0
+        for pair in _blocks(pairs(), block_size):
+            known = [known_value(i, j) for i, j in pair]
+            solve = [(reactions[i], reactions[j])
+                     for (i, j), (is_known, _) in zip(pair, known)
+                     if not is_known]
+            solved_count += len(solve)
+
+            results = screen.solve(solve, support=False)
+            for (i, j), (is_known, value) in zip(pair, known):
+                if not is_known:
+                    value, _ = next(results)
+                yield reactions[i], reactions[j], value
+
+        logger.info('Solved {} double deletions'.format(solved_count))
+    finally:
+        screen.close()
+
+
+def _blocks(items, block_size):
+    """Yield lists of at most block_size items"""
+    block = []
+    for item in items:
+        block.append(item)
+        if len(block) >= block_size:
+            yield block
+            block = []
+    if len(block) > 0:
+        yield block
+
+
+class GeneRules(object):
+    """Gene association rules of reactions compiled for fast evaluation
+
+    The rules are given as a dict of reaction IDs to rules. A rule can be a
+    boolean expression (see :mod:`psamm.expression.boolean`), a string that
+    is parsed as a boolean expression, or a list of such rules where any of
+    the rules enables the reaction (e.g. a list of isozymes).
+
+    Each gene is assigned a bit and each rule is compiled once into a tree
+    where every node is an And or Or operator with the bitmask of the genes
+    that are its direct terms and a list of the nested nodes. A rule is
+    evaluated directly against the bitmask of the deleted genes: an And node
+    is alive when all terms are alive and an Or node when any term is
+    alive. A reaction is disabled when its rule is not alive. Only the
+    reactions associated with the deleted genes are evaluated.
+
+    >>> rules = GeneRules({'rxn_1': 'A and (B or C)', 'rxn_2': 'B'})
+    >>> sorted(rules.disabled_reactions(['B']))
+    ['rxn_2']
+    >>> sorted(rules.disabled_reactions(['B', 'C']))
+    ['rxn_1', 'rxn_2']
+    """
+
+    def __init__(self, rules):
+        self._gene_bits = {}
+        self._gene_reactions = {}
+        self._rules = {}
+
+        for reaction_id, rule in rules.iteritems():
+            genes = set()
+            self._rules[reaction_id] = self._compile(self._parse(rule), genes)
+            for gene in genes:
+                self._gene_reactions.setdefault(gene, set()).add(reaction_id)
+
+    def _parse(self, rule):
+        if isinstance(rule, basestring):
+            return boolean.Expression(rule)
+        elif isinstance(rule, (list, tuple)):
+            return boolean.Or(*(self._parse(r) for r in rule))
+        return rule
+
+    def _compile(self, expr, genes):
+        """Return compiled node of expression
+
+        The node is a tuple of a flag that is True for And nodes, the
+        bitmask of the genes that are direct terms, and a list of the
+        nested nodes. The genes of the expression are added to genes.
+        """
+        if isinstance(expr, boolean.Variable):
+            return True, self._gene_bit(expr.symbol, genes), []
+        elif isinstance(expr, (boolean.And, boolean.Or)):
+            mask = 0
+            nodes = []
+            for term in expr.terms:
+                if isinstance(term, boolean.Variable):
+                    mask |= self._gene_bit(term.symbol, genes)
+                else:
+                    nodes.append(self._compile(term, genes))
+            return isinstance(expr, boolean.And), mask, nodes
+        raise ValueError('Invalid gene rule: {!r}'.format(expr))
+
+    def _gene_bit(self, gene, genes):
+        genes.add(gene)
+        return self._gene_bits.setdefault(gene, 1 << len(self._gene_bits))
+
+    @classmethod
+    def _is_alive(cls, node, deleted):
+        """Return True if compiled node is satisfied by the remaining genes"""
+        is_and, mask, nodes = node
+        if is_and:
+            return (mask & deleted == 0 and
+                    all(cls._is_alive(n, deleted) for n in nodes))
+        return (mask & ~deleted != 0 or
+                any(cls._is_alive(n, deleted) for n in nodes))
+
+    @property
+    def genes(self):
+        """Set of genes in the rules"""
+        return set(self._gene_bits)
+
+    def reactions(self, gene):
+        """Set of reactions that have a rule including the gene"""
+        return set(self._gene_reactions.get(gene, ()))
+
+    def disabled_reactions(self, genes):
+        """Return set of reactions disabled when the genes are deleted"""
+        deleted = 0
+        reactions = set()
+        for gene in genes:
+            if gene in self._gene_bits:
+                deleted |= self._gene_bits[gene]
+                reactions.update(self._gene_reactions[gene])
+
+        return frozenset(
+            reaction_id for reaction_id in reactions
+            if not self._is_alive(self._rules[reaction_id], deleted))
+
+
+def gene_deletion(model, objective, solver, rules, knockouts,
+                  parallel=None, block_size=10000):
+    """Find the objective flux when sets of genes are deleted
+
+    Yields each knockout (a tuple of genes) and the maximum flux of the
+    objective reaction when the reactions disabled by the knockout are
+    deleted. The flux is None if the problem is infeasible.
+
+    The disabled reactions of each knockout are found using the compiled
+    rules, and knockouts that disable the same set of reactions are only
+    solved once. The single gene knockouts of the genes in a knockout are
+    solved first, and a knockout is not solved if the disabled reactions
+    carry no flux in the wild type solution or in the solution of one of
+    its single gene knockouts.
+
+    Args:
+        model: MetabolicModel to solve.
+        objective: Reaction to maximize.
+        solver: LP solver instance to use.
+        rules: :class:`GeneRules` of the model reactions.
+        knockouts: List of tuples of genes to delete.
+        parallel: Number of worker processes to use.
+        block_size: Number of knockouts that are solved at a time.
+
+    Returns:
+        Iterator over pairs of knockout and objective flux.
+    """
+    model_reactions = set(model.reactions)
+
+    def disabled(genes):
+        return rules.disabled_reactions(genes) & model_reactions
+
+    screen = _DeletionScreen(
+        model, objective, sorted(model_reactions), solver, parallel)
+    try:
+        reaction_index = {
+            reaction_id: i for i, reaction_id in enumerate(screen.reactions)}
+        wild_type = screen.wild_type()
+
+        def known_value(reactions, candidates):
+            """Return value if known from solutions of subsets"""
+            if len(reactions) == 0:
+                return True, wild_type[0]
+            indices = [reaction_index[r] for r in reactions]
+            for value, support in candidates:
+                if value is None:
+                    return True, None
+                elif not support[indices].any():
+                    return True, value
+            return False, None
+
+        def solve(reaction_sets, support):
+            """Solve list of unique reaction sets"""
+            solve_sets = list(reaction_sets)
+            return dict(izip(solve_sets, screen.solve(
+                [tuple(sorted(s)) for s in solve_sets], support)))
+
+        # Solve the single gene knockouts with support
+        genes = set(gene for knockout in knockouts for gene in knockout)
+        gene_disabled = {gene: disabled([gene]) for gene in genes}
+        unique = {}
+        for gene, reactions in gene_disabled.iteritems():
+            is_known, value = known_value(reactions, [wild_type])
+            if is_known:
+                unique[reactions] = value, wild_type[1]
+        solved = solve(
+            set(gene_disabled.itervalues()) - set(unique), support=True)
+        unique.update(solved)
+        single = {gene: unique[reactions]
+                  for gene, reactions in gene_disabled.iteritems()}
+        solved_count = len(solved)
+
+        # Values of the remaining knockouts by set of disabled reactions
+        values = {}
+        for block in _blocks(knockouts, block_size):
+            pending = set()
+            block_sets = []
+            for knockout in block:
+                reactions = disabled(knockout)
+                if len(knockout) == 1:
+                    value = single[knockout[0]][0]
+                elif reactions in values:
+                    value = values[reactions]
+                else:
+                    candidates = [wild_type] + [
+                        single[gene] for gene in knockout]
+                    is_known, value = known_value(reactions, candidates)
+                    if is_known:
+                        values[reactions] = value
+                    else:
+                        pending.add(reactions)
+                block_sets.append((reactions, value))
+
+            for reactions, (value, _) in solve(
+                    pending, support=False).iteritems():
+                values[reactions] = value
+            solved_count += len(pending)
+
+            for knockout, (reactions, value) in izip(block, block_sets):
+                if reactions in pending:
+                    value = values[reactions]
+                yield knockout, value
+
+        logger.info('Solved {} unique gene knockouts'.format(solved_count))
+    finally:
+        screen.close()
@@ -21,10 +21,11 @@ This is an implementation of the algorithms described in [Vlassis14]_.
 """
 
 import logging
+import multiprocessing
+from itertools import izip
 
 from .lpsolver import lp
-from .fluxanalysis import flux_balance
-from .metabolicmodel import FlipableModelView
+from .matrix import add_mass_balance
 
 # Module-level logging
 logger = logging.getLogger(__name__)
@@ -62,6 +63,186 @@ class FastcoreError(Exception):
     """Indicates an error while running Fastcore"""
 
 
+class FastcoreProblem(object):
+    """Persistent LP problems of Fastcore
+
+    The LP-7 and LP-10 problems are built once for the model and are then
+    solved for each subset of reactions by changing the bounds of variables
+    and the objective. The LP-7 problem is also used to maximize the flux of
+    a single reaction (LP-3). The problems are built when they are first
+    needed, and the flux bounds of the LP-10 problem are multiplied by
+    scaling.
+
+    Reactions are flipped (the sign of the flux is reversed) by giving the
+    set of flipped reactions when solving. This has the same effect as
+    solving on a :class:`psamm.metabolicmodel.FlipableModelView` but the
+    problems are not built again: In LP-7 each reaction has a z variable
+    bounding the flux and one bounding the negated flux, and the one that
+    is used is selected by the bounds. In LP-10 the bound that forces flux
+    through a flipped reaction is negated. The fluxes of flipped reactions
+    are returned negated.
+    """
+
+    def __init__(self, model, epsilon, solver, scaling=1e8):
+        self._model = model
+        self._epsilon = epsilon
+        self._solver = solver
+        self._scaling = scaling
+        self._reactions = sorted(model.reactions)
+
+        # Problems that have been built
+        self._problems = {}
+
+    @property
+    def epsilon(self):
+        """Flux threshold of the problems"""
+        return self._epsilon
+
+    def _flux_bounds(self, reaction_id, scaling):
+        lower, upper = self._model.limits[reaction_id]
+        return lower * scaling, upper * scaling
+
+    def _create_flux_problem(self, scaling):
+        """Return problem of flux variables and mass balance constraints"""
+        prob = self._solver.create_problem()
+        for reaction_id in self._reactions:
+            lower, upper = self._flux_bounds(reaction_id, scaling)
+            prob.define(('v', reaction_id), lower=lower, upper=upper)
+
+        add_mass_balance(prob, self._model)
+        return prob
+
+    def _create_lp7(self):
+        prob = self._create_flux_problem(1)
+
+        # The variable zp bounds the flux and zn bounds the negated flux.
+        # The variables are fixed at the flux bounds (and do not constrain
+        # the flux) except for the reactions of the subset.
+        names = [(name, reaction_id) for reaction_id in self._reactions
+                 for name in ('zp', 'zn')]
+        prob.define(*names)
+        self._set_inactive(prob, self._reactions)
+        count = len(self._reactions)
+        rows = [i // 2 for i in range(4 * count)]
+        columns = [
+            column for reaction_id in self._reactions
+            for column in (('v', reaction_id), ('zp', reaction_id),
+                           ('v', reaction_id), ('zn', reaction_id))]
+        values = [1, -1, -1, -1] * count
+        prob.add_sparse_constraints(
+            rows, columns, values, lp.Relation.Greater, 0)
+        return prob
+
+    def _set_inactive(self, prob, reactions):
+        """Fix the z variables of LP-7 so the flux is not constrained"""
+        names, values = [], []
+        for reaction_id in reactions:
+            lower, upper = self._flux_bounds(reaction_id, 1)
+            names.extend((('zp', reaction_id), ('zn', reaction_id)))
+            values.extend((lower, -upper))
+        prob.set_bounds(*names, lower=values, upper=values)
+
+    def _create_lp10(self):
+        prob = self._create_flux_problem(self._scaling)
+
+        # The variable z bounds the absolute flux. Only the reactions of the
+        # penalty subset have z in the objective.
+        prob.define(*(('z', reaction_id)
+                      for reaction_id in self._reactions), lower=0)
+        count = len(self._reactions)
+        rows = [i // 2 for i in range(4 * count)]
+        columns = [
+            column for reaction_id in self._reactions
+            for column in (('z', reaction_id), ('v', reaction_id),
+                           ('z', reaction_id), ('v', reaction_id))]
+        values = [1, -1, 1, 1] * count
+        prob.add_sparse_constraints(
+            rows, columns, values, lp.Relation.Greater, 0)
+        return prob
+
+    def _problem(self, key):
+        """Return the problem given by key, building it if needed"""
+        if key not in self._problems:
+            self._problems[key] = getattr(self, '_create_' + key)()
+        return self._problems[key]
+
+    def _solve(self, prob, sense, flipped):
+        """Solve problem and return list of reaction IDs and fluxes"""
+        result = prob.solve(sense)
+        if not result:
+            raise FastcoreError('Non-optimal solution: {}'.format(
+                result.status))
+
+        fluxes = result.get_values(
+            [('v', reaction_id) for reaction_id in self._reactions])
+        return [(reaction_id, -flux if reaction_id in flipped else flux)
+                for reaction_id, flux in izip(self._reactions, fluxes)]
+
+    def lp7(self, reaction_subset, flipped=frozenset()):
+        """Approximately maximize the number of reactions with flux above
+        epsilon
+
+        Returns a list of reaction IDs and fluxes. See :func:`lp7`.
+        """
+        reaction_subset = sorted(reaction_subset)
+        prob = self._problem('lp7')
+
+        names = [('zn' if reaction_id in flipped else 'zp', reaction_id)
+                 for reaction_id in reaction_subset]
+        prob.set_bounds(*names, lower=0, upper=self._epsilon)
+        try:
+            prob.set_linear_objective(
+                lp.Expression.sum(prob.var(name) for name in names))
+            return self._solve(prob, lp.ObjectiveSense.Maximize, flipped)
+        finally:
+            self._set_inactive(prob, reaction_subset)
+
+    def maximize(self, reaction, flipped=frozenset()):
+        """Maximize the flux of a single reaction (LP-3)
+
+        Returns a list of reaction IDs and fluxes.
+        """
+        prob = self._problem('lp7')
+        objective = prob.var(('v', reaction))
+        if reaction in flipped:
+            objective = -objective
+        prob.set_linear_objective(objective)
+        return self._solve(prob, lp.ObjectiveSense.Maximize, flipped)
+
+    def lp10(self, subset_k, subset_p, flipped=frozenset(), weights={}):
+        """Force reactions in K above epsilon while minimizing support of P
+
+        Returns a list of reaction IDs and fluxes. See :func:`lp10`.
+        """
+        if len(subset_k) == 0:
+            return []
+
+        subset_k = sorted(subset_k)
+        names = [('v', reaction_id) for reaction_id in subset_k]
+        lower, upper = [], []
+        for reaction_id in subset_k:
+            bounds = self._flux_bounds(reaction_id, 1)
+            if reaction_id in flipped:
+                bounds = bounds[0], min(bounds[1], -self._epsilon)
+            else:
+                bounds = max(bounds[0], self._epsilon), bounds[1]
+            lower.append(bounds[0] * self._scaling)
+            upper.append(bounds[1] * self._scaling)
+
+        prob = self._problem('lp10')
+        prob.set_bounds(*names, lower=lower, upper=upper)
+        try:
+            prob.set_linear_objective(lp.Expression.sum(
+                prob.var(('z', reaction_id)) * weights.get(reaction_id, 1)
+                for reaction_id in subset_p))
+            return self._solve(prob, lp.ObjectiveSense.Minimize, flipped)
+        finally:
+            bounds = [self._flux_bounds(reaction_id, self._scaling)
+                      for reaction_id in subset_k]
+            prob.set_bounds(*names, lower=[b[0] for b in bounds],
+                            upper=[b[1] for b in bounds])
+
+
 def lp7(model, reaction_subset, epsilon, solver):
     """Approximately maximize the number of reaction with flux above epsilon
 
@@ -69,39 +250,12 @@ def lp7(model, reaction_subset, epsilon, solver):
     in subset with flux > epsilon, instead of just maximizing the flux of one
     particular reaction. LP7 prefers "flux splitting" over
     "flux concentrating".
-    """
 
-    # Create LP-7 problem of Fastcore
-    prob = solver.create_problem()
-
-    # Define flux variables
-    for rxnid in model.reactions:
-        lower, upper = model.limits[rxnid]
-        prob.define(('v', rxnid), lower=lower, upper=upper)
-
-    # Define z variables
-    prob.define(*(('z', rxnid) for rxnid in reaction_subset),
-                lower=0, upper=epsilon)
-    prob.set_linear_objective(sum(prob.var(('z', rxnid))
-                                  for rxnid in reaction_subset))
-    v = prob.set(('v', rxnid) for rxnid in reaction_subset)
-    z = prob.set(('z', rxnid) for rxnid in reaction_subset)
-    prob.add_linear_constraints(v >= z)
-
-    massbalance_lhs = { compound: 0 for compound in model.compounds }
-    for spec, value in model.matrix.iteritems():
-        compound, rxnid = spec
-        massbalance_lhs[compound] += prob.var(('v', rxnid)) * value
-    prob.add_linear_constraints(
-        *(lhs == 0 for compound, lhs in massbalance_lhs.iteritems()))
-
-    # Solve
-    result = prob.solve(lp.ObjectiveSense.Maximize)
-    if not result:
-        raise FastcoreError('Non-optimal solution: {}'.format(result.status))
-
-    for rxnid in sorted(model.reactions):
-        yield rxnid, result.get_value(('v', rxnid))
+    This builds a new problem. Use :class:`FastcoreProblem` to solve the
+    problem repeatedly.
+    """
+    problem = FastcoreProblem(model, epsilon, solver)
+    return iter(problem.lp7(reaction_subset))
 
 
 def lp10(model, subset_k, subset_p, epsilon, scaling, solver, weights={}):
@@ -110,45 +264,12 @@ def lp10(model, subset_k, subset_p, epsilon, scaling, solver, weights={}):
     This program forces reactions in subset K to attain flux > epsilon
     while minimizing the sum of absolute flux values for reactions
     in subset P (L1-regularization).
-    """
-
-    if len(subset_k) == 0:
-        return
-
-    # Create LP-10 problem of Fastcore
-    prob = solver.create_problem()
-
-    # Define flux variables
-    for rxnid in model.reactions:
-        lower, upper = model.limits[rxnid]
-        if rxnid in subset_k:
-            lower = max(lower, epsilon)
-        prob.define(('v', rxnid), lower=lower*scaling, upper=upper*scaling)
-
-    # Define z variables
-    prob.define(*(('z', rxnid) for rxnid in subset_p), lower=0)
-    prob.set_linear_objective(
-        sum(prob.var(('z', rxnid)) * weights.get(rxnid, 1)
-            for rxnid in subset_p))
 
-    z = prob.set(('z', rxnid) for rxnid in subset_p)
-    v = prob.set(('v', rxnid) for rxnid in subset_p)
-    prob.add_linear_constraints(z >= v, v >= -z)
-
-    massbalance_lhs = { compound: 0 for compound in model.compounds }
-    for spec, value in model.matrix.iteritems():
-        compound, rxnid = spec
-        massbalance_lhs[compound] += prob.var(('v', rxnid)) * value
-    prob.add_linear_constraints(
-        *(lhs == 0 for compound, lhs in massbalance_lhs.iteritems()))
-
-    # Solve
-    result = prob.solve(lp.ObjectiveSense.Minimize)
-    if not result:
-        raise FastcoreError('Non-optimal solution: {}'.format(result.status))
-
-    for reaction_id in model.reactions:
-        yield reaction_id, result.get_value(('v', reaction_id))
+    This builds a new problem. Use :class:`FastcoreProblem` to solve the
+    problem repeatedly.
+    """
+    problem = FastcoreProblem(model, epsilon, solver, scaling)
+    return iter(problem.lp10(subset_k, subset_p, weights=weights))
 
 
 def fastcc(model, epsilon, solver):
@@ -163,8 +284,11 @@ def fastcc(model, epsilon, solver):
 
     logger.debug('|J| = {}, J = {}'.format(len(subset), subset))
 
-    consistent_subset = set(
-        support(lp7(model, subset, epsilon, solver), epsilon))
+    # Fluxes at epsilon can be slightly below epsilon in the solution
+    threshold = 0.99 * epsilon
+
+    problem = FastcoreProblem(model, epsilon, solver)
+    consistent_subset = set(support(problem.lp7(subset), threshold))
 
     logger.debug('|A| = {}, A = {}'.format(
         len(consistent_subset), consistent_subset))
@@ -178,8 +302,8 @@ def fastcc(model, epsilon, solver):
 
     logger.debug('|J| = {}, J = {}'.format(len(subset), subset))
 
-    # Wrap model in flipable proxy so reactions can be flipped
-    model = FlipableModelView(model)
+    # Reactions are flipped by the problem without building it again
+    flipped_reactions = set()
 
     flipped = False
     singleton = False
@@ -189,13 +313,14 @@ def fastcc(model, epsilon, solver):
             subset_i = { reaction }
 
             logger.debug('LP3 on {}'.format(subset_i))
-            supp = support(flux_balance(
-                model, reaction, tfba=False, solver=solver), epsilon)
+            supp = support(
+                problem.maximize(reaction, flipped_reactions), threshold)
         else:
             subset_i = subset
 
             logger.debug('LP7 on {}'.format(subset_i))
-            supp = support(lp7(model, subset_i, epsilon, solver), epsilon)
+            supp = support(
+                problem.lp7(subset_i, flipped_reactions), threshold)
         consistent_subset.update(supp)
 
         logger.debug('|A| = {}, A = {}'.format(len(consistent_subset), consistent_subset))
@@ -217,7 +342,7 @@ def fastcc(model, epsilon, solver):
                 else:
                     singleton = True
             else:
-                model.flip(subset_rev_i)
+                flipped_reactions ^= subset_rev_i
                 flipped = True
                 logger.debug('Flip')
 
@@ -256,16 +381,25 @@ def find_sparse_mode(model, core, additional, epsilon, scaling, solver,
     gives further penalties for including specific additional reactions.
     """
 
+    problem = FastcoreProblem(model, epsilon, solver, scaling)
+    return _find_sparse_mode(problem, core, additional, set(), weights)
+
+
+def _find_sparse_mode(problem, core, additional, flipped, weights):
+    """Find a sparse mode using the problem with reactions flipped"""
+
     if len(core) == 0:
         return iter(())
 
-    supp = support_positive(lp7(model, core, epsilon, solver), epsilon)
+    # Fluxes at epsilon can be slightly below epsilon in the solution
+    supp = support_positive(
+        problem.lp7(core, flipped), 0.99 * problem.epsilon)
     k = core.intersection(supp)
     if len(k) == 0:
         return iter(())
 
-    return support(lp10(model, k, additional, epsilon, solver=solver,
-                        scaling=scaling, weights=weights), epsilon)
+    return support(
+        problem.lp10(k, additional, flipped, weights), problem.epsilon)
 
 
 def fastcore(model, core, epsilon, solver, scaling=1e8, weights={}):
@@ -275,6 +409,13 @@ def fastcore(model, core, epsilon, solver, scaling=1e8, weights={}):
     reactions as possible.
     """
 
+    problem = FastcoreProblem(model, epsilon, solver, scaling)
+    return _fastcore(problem, model, core, weights)
+
+
+def _fastcore(problem, model, core, weights):
+    """Find a flux consistent subnetwork using the problem"""
+
     consistent_subset = set()
     reaction_set = set(model.reactions)
 
@@ -284,9 +425,8 @@ def fastcore(model, core, epsilon, solver, scaling=1e8, weights={}):
     penalty_set = reaction_set - core
     logger.debug('|P| = {}, P = {}'.format(len(penalty_set), penalty_set))
 
-    mode = set(find_sparse_mode(
-        model, subset, penalty_set, epsilon, solver=solver, scaling=scaling,
-        weights=weights))
+    mode = set(_find_sparse_mode(
+        problem, subset, penalty_set, set(), weights))
     if not subset.issubset(mode):
         raise FastcoreError('Inconsistent irreversible core reactions:'
                             ' {}'.format(subset - mode))
@@ -298,8 +438,8 @@ def fastcore(model, core, epsilon, solver, scaling=1e8, weights={}):
     subset = core - mode
     logger.debug('|J| = {}, J = {}'.format(len(subset), subset))
 
-    # Wrap model in flipable proxy so reactions can be flipped
-    model = FlipableModelView(model)
+    # Reactions are flipped by the problem without building it again
+    flipped_reactions = set()
 
     flipped = False
     singleton = False
@@ -310,9 +450,8 @@ def fastcore(model, core, epsilon, solver, scaling=1e8, weights={}):
         else:
             subset_i = subset
 
-        mode = find_sparse_mode(
-            model, subset_i, penalty_set, epsilon, scaling=scaling,
-            solver=solver, weights=weights)
+        mode = _find_sparse_mode(
+            problem, subset_i, penalty_set, flipped_reactions, weights)
         consistent_subset.update(mode)
         logger.debug('|A| = {}, A = {}'.format(
             len(consistent_subset), consistent_subset))
@@ -335,9 +474,82 @@ def fastcore(model, core, epsilon, solver, scaling=1e8, weights={}):
                 singleton = True
                 flipped = False
             else:
-                model.flip(subset_rev_i)
+                flipped_reactions ^= subset_rev_i
                 flipped = True
                 logger.debug('Going to flipped state... {}'.format(
                     subset_rev_i))
 
     return consistent_subset
+
+
+# Problem of the current worker process
+_worker_problem = None
+
+
+def _fastcore_worker_init(model, epsilon, solver, scaling, weights):
+    """Build the Fastcore problem of a worker process"""
+    global _worker_problem
+    _worker_problem = (
+        model, FastcoreProblem(model, epsilon, solver, scaling), weights)
+
+
+def _fastcore_worker_solve(task):
+    """Return key and result of a core set solved in a worker process"""
+    key, core = task
+    model, problem, weights = _worker_problem
+    return key, _try_fastcore(problem, model, key, core, weights)
+
+
+def _try_fastcore(problem, model, key, core, weights):
+    """Return the result of Fastcore or None if the core set fails"""
+    try:
+        return _fastcore(problem, model, set(core), weights)
+    except FastcoreError as e:
+        logger.warning('Fastcore failed on core set {}: {}'.format(key, e))
+        return None
+
+
+def fastcore_batch(model, cores, epsilon, solver, scaling=1e8, weights={},
+                   parallel=None):
+    """Find flux consistent subnetworks for each of many core subsets
+
+    The LP problems of Fastcore are built once for the model and are shared
+    by all the core sets, so this is faster than calling :func:`fastcore` for
+    each core set. If parallel is larger than one, the core sets are solved
+    by a pool of worker processes that each build the problems once. The
+    results are yielded in the order of the core sets as they are found so
+    they can be written out without keeping all of them in memory.
+
+    Args:
+        model: MetabolicModel that is flux consistent.
+        cores: Iterable of pairs of a key and a set of core reaction IDs.
+        epsilon: Flux threshold of Fastcore.
+        solver: LP solver instance to use.
+        scaling: Scaling of the flux bounds in LP-10.
+        weights: dict of penalty weights of the non-core reactions.
+        parallel: Number of worker processes to use.
+
+    Returns:
+        Iterator over pairs of the key and the set of reaction IDs of the
+        subnetwork of each core set, or None if Fastcore failed on the core
+        set.
+    """
+
+    if parallel is None or parallel <= 1:
+        problem = FastcoreProblem(model, epsilon, solver, scaling)
+        for key, core in cores:
+            yield key, _try_fastcore(problem, model, key, core, weights)
+        return
+
+    pool = multiprocessing.Pool(
+        parallel, _fastcore_worker_init,
+        (model, epsilon, solver, scaling, weights))
+    try:
+        for key, result in pool.imap(
+                _fastcore_worker_solve,
+                ((key, set(core)) for key, core in cores)):
+            yield key, result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -19,17 +19,25 @@
 
 import logging
 import random
+import multiprocessing
+from itertools import izip
+
+import numpy
 
 from .lpsolver import lp
+from .matrix import add_mass_balance
+from .util import chunks
+from . import fastcore
 
 # Module-level logging
 logger = logging.getLogger(__name__)
 
 
-def _get_fba_problem(model, tfba, solver):
+def _get_fba_problem(model, tfba, solver, loop_reactions=None):
     """Convenience function for returning the right FBA problem instance"""
     if tfba:
-        return FluxBalanceTDProblem(model, solver=solver)
+        return FluxBalanceTDProblem(
+            model, solver=solver, loop_reactions=loop_reactions)
     else:
         return FluxBalanceProblem(model, solver=solver)
 
@@ -48,6 +56,21 @@ class FluxBalanceProblem(object):
 
     def __init__(self, model, solver):
         self._prob = solver.create_problem()
+        self._reactions = list(model.reactions)
+        self._exchange = set(
+            reaction_id for reaction_id in self._reactions
+            if model.is_exchange(reaction_id))
+
+        # Current flux bounds which are restored after removing loops
+        self._bounds = dict(
+            (reaction_id, tuple(model.limits[reaction_id]))
+            for reaction_id in self._reactions)
+
+        # Objective of the last solve and the constraint that keeps it at
+        # the optimum while minimizing the L1 norm.
+        self._objective = None
+        self._optimum_constraint = None
+        self._l1_defined = False
 
         # Define flux variables
         for reaction_id in model.reactions:
@@ -55,12 +78,7 @@ class FluxBalanceProblem(object):
             self._prob.define(('v', reaction_id), lower=lower, upper=upper)
 
         # Define constraints
-        massbalance_lhs = { compound: 0 for compound in model.compounds }
-        for spec, value in model.matrix.iteritems():
-            compound, reaction_id = spec
-            massbalance_lhs[compound] += self.get_flux_var(reaction_id) * value
-        for compound, lhs in massbalance_lhs.iteritems():
-            self._prob.add_linear_constraints(lhs == 0)
+        add_mass_balance(self._prob, model)
 
     @property
     def prob(self):
@@ -76,17 +94,77 @@ class FluxBalanceProblem(object):
         """
 
         if isinstance(reaction, dict):
-            objective = sum(v * self.get_flux_var(r)
-                            for r, v in reaction.iteritems())
+            objective = lp.Expression.sum(
+                v * self.get_flux_var(r) for r, v in reaction.iteritems())
         else:
             objective = self.get_flux_var(reaction)
 
+        if self._optimum_constraint is not None:
+            self._optimum_constraint.delete()
+            self._optimum_constraint = None
+
         # Set objective and solve
         self._prob.set_linear_objective(objective)
+        self._objective = None
         result = self._prob.solve(lp.ObjectiveSense.Maximize)
         if not result:
             raise FluxBalanceError('Non-optimal solution: {}'.format(
                 result.status))
+        self._objective = objective
+
+    def minimize_l1(self, weights={}):
+        """Minimize the weighted L1 norm of the fluxes at the optimum
+
+        The objective of the last call to :meth:`solve` is kept at the
+        optimum found while the weighted sum of the absolute fluxes is
+        minimized. The auxiliary variables and constraints of the L1 norm are
+        added to the problem on the first call so the problem does not have
+        to be built again, and the minimization starts from the solution of
+        the last solve. The fluxes of the minimized solution can be obtained
+        with :meth:`get_flux`.
+        """
+
+        if self._objective is None:
+            raise ValueError('Problem must be solved before minimizing')
+
+        # The solution is not available after the problem is changed
+        optimum = self._prob.result.get_value(self._objective)
+
+        if not self._l1_defined:
+            self._prob.define(
+                *(('z', reaction_id) for reaction_id in self._reactions),
+                lower=0)
+            v = self._prob.set(
+                ('v', reaction_id) for reaction_id in self._reactions)
+            z = self._prob.set(
+                ('z', reaction_id) for reaction_id in self._reactions)
+            self._prob.add_linear_constraints(z >= v, v >= -z)
+            self._l1_defined = True
+
+        if self._optimum_constraint is not None:
+            self._optimum_constraint.delete()
+        self._optimum_constraint, = self._prob.add_linear_constraints(
+            self._objective >= optimum)
+
+        self._prob.set_linear_objective(lp.Expression.sum(
+            self._prob.var(('z', reaction_id)) * weights.get(reaction_id, 1)
+            for reaction_id in self._reactions))
+        result = self._prob.solve(lp.ObjectiveSense.Minimize)
+        if not result:
+            raise FluxBalanceError('Non-optimal solution: {}'.format(
+                result.status))
+
+    def set_flux_bounds(self, reaction, lower, upper):
+        """Change the flux bounds of the reaction in the problem
+
+        The bounds are changed in place so the problem does not have to be
+        rebuilt, e.g. when testing deletions of reactions. Note that the
+        thermodynamic constraints of :class:`FluxBalanceTDProblem` are
+        derived from the model limits so the bounds should only be
+        tightened relative to the model when using that problem.
+        """
+        self._prob.set_bounds(('v', reaction), lower=lower, upper=upper)
+        self._bounds[reaction] = lower, upper
 
     def get_flux_var(self, reaction):
         """Get LP variable representing the reaction flux"""
@@ -96,6 +174,115 @@ class FluxBalanceProblem(object):
         """Get resulting flux value for reaction"""
         return self._prob.result.get_value(('v', reaction))
 
+    def get_fluxes(self, reactions):
+        """Get resulting flux values for reactions as a :class:`numpy.ndarray`
+
+        The values are returned in the order of the given reactions and are
+        obtained from the solver at once.
+        """
+        return self._prob.result.get_values(
+            [('v', reaction) for reaction in reactions])
+
+    def get_loopless_fluxes(self, reactions, fixed=()):
+        """Get fluxes of the last solution with internal loops removed
+
+        The fluxes of the exchange reactions and of the reactions in fixed
+        are kept at the values of the last solution while the internal
+        fluxes are minimized in a follow-up LP. Each internal flux is
+        restricted to be between zero and the flux of the last solution,
+        so the sum of the absolute internal fluxes is a linear objective,
+        and a solution with a loop can always be improved by reducing the
+        flux around the loop. The resulting fluxes have no internal loops
+        (CycleFreeFlux, [Desouki15]_).
+
+        Only the bounds of the fixed reactions and of the reactions with a
+        non-zero flux are changed. The reactions without flux are left at
+        their bounds and the reactions that carry flux in the minimized
+        solution anyway are fixed at zero before solving again. The changed
+        flux bounds are restored afterwards so the problem can be solved
+        again. The fluxes are returned as a :class:`numpy.ndarray` in the
+        order of the given reactions.
+        """
+
+        if self._objective is None:
+            raise ValueError('Problem must be solved before removing loops')
+
+        # The solution is not available after the problem is changed
+        fluxes = self.get_fluxes(self._reactions)
+
+        if self._optimum_constraint is not None:
+            self._optimum_constraint.delete()
+            self._optimum_constraint = None
+        self._objective = None
+
+        fixed = set(fixed)
+        changed, lower, upper = [], [], []
+        zero = []
+        objective = []
+        for reaction_id, flux in izip(self._reactions, fluxes):
+            if reaction_id in self._exchange or reaction_id in fixed:
+                changed.append(reaction_id)
+                lower.append(flux)
+                upper.append(flux)
+            elif flux != 0:
+                changed.append(reaction_id)
+                lower.append(min(0, flux))
+                upper.append(max(0, flux))
+                objective.append(
+                    self.get_flux_var(reaction_id) * (1 if flux > 0 else -1))
+            else:
+                zero.append(reaction_id)
+
+        self._prob.set_bounds(
+            *(('v', reaction_id) for reaction_id in changed),
+            lower=lower, upper=upper)
+        try:
+            self._prob.set_linear_objective(lp.Expression.sum(objective))
+            while True:
+                result = self._prob.solve(lp.ObjectiveSense.Minimize)
+                if not result:
+                    raise FluxBalanceError('Non-optimal solution: {}'.format(
+                        result.status))
+
+                moved = [reaction_id for reaction_id, flux in izip(
+                    zero, self.get_fluxes(zero)) if flux != 0]
+                if len(moved) == 0:
+                    break
+
+                moved_set = set(moved)
+                zero = [r for r in zero if r not in moved_set]
+                self._prob.set_bounds(
+                    *(('v', reaction_id) for reaction_id in moved),
+                    lower=0, upper=0)
+                changed.extend(moved)
+
+            return self.get_fluxes(reactions)
+        finally:
+            bounds = [self._bounds[reaction_id] for reaction_id in changed]
+            self._prob.set_bounds(
+                *(('v', reaction_id) for reaction_id in changed),
+                lower=[value for value, _ in bounds],
+                upper=[value for _, value in bounds])
+
+    def get_reduced_costs(self, reactions):
+        """Get reduced costs of the reaction fluxes as a
+        :class:`numpy.ndarray`
+
+        The reduced cost of a flux that is fixed by its bounds is the slope of
+        the optimal objective value as a function of the fixed flux. This is
+        only available when the problem is solved as an LP by a solver that
+        provides dual information, otherwise :class:`FluxBalanceError` is
+        raised.
+        """
+        try:
+            return self._prob.result.get_reduced_costs(
+                [('v', reaction) for reaction in reactions])
+        except NotImplementedError:
+            raise FluxBalanceError(
+                'Reduced costs are not available from the solver; use a'
+                ' solver that provides dual information (e.g. cplex or'
+                ' glpk)')
+
 
 class FluxBalanceTDProblem(FluxBalanceProblem):
     """Maximize the flux of a specific reaction with thermodynamic constraints
@@ -104,17 +291,28 @@ class FluxBalanceTDProblem(FluxBalanceProblem):
     thermodynamically feasible. This is solved as a MILP problem and the
     problem has been shown to be NP-hard in general.
 
+    A thermodynamically infeasible flux contains a cycle of internal
+    reactions, so the constraints are only needed for the reactions that
+    can take part in an internal cycle. These reactions are found with
+    :func:`find_loop_reactions` unless they are given as loop_reactions,
+    and the binary variables and constraints are only added for them.
+
     Described in [Muller13]_.
     """
 
-    def __init__(self, model, solver, epsilon=1e-5, em=1e5):
+    def __init__(self, model, solver, epsilon=1e-5, em=1e5,
+                 loop_reactions=None):
         super(FluxBalanceTDProblem, self).__init__(model, solver)
         p = self.prob
 
+        if loop_reactions is None:
+            loop_reactions = find_loop_reactions(model, solver)
+        loop_reactions = set(loop_reactions)
+
         for reaction_id in model.reactions:
             # Constrain internal reactions to a direction determined
             # by alpha.
-            if not model.is_exchange(reaction_id):
+            if reaction_id in loop_reactions:
                 p.define(('alpha', reaction_id), types=lp.VariableType.Binary)
                 p.define(('dmu', reaction_id)) # Delta mu
 
@@ -128,20 +326,72 @@ class FluxBalanceTDProblem(FluxBalanceProblem):
                                          dmu >= -em*alpha + epsilon,
                                          dmu <= em*(1 - alpha) - epsilon)
 
-        # Define mu variables
-        p.define(*(('mu', compound) for compound in model.compounds))
+        # Define mu variables of the compounds in the loop reactions
+        compounds = set(
+            compound for (compound, reaction_id) in model.matrix
+            if reaction_id in loop_reactions)
+        p.define(*(('mu', compound) for compound in compounds))
 
-        tdbalance_lhs = {reaction_id: 0 for reaction_id in model.reactions}
+        reaction_index = {}
+        rows, columns, values = [], [], []
+        for reaction_id in model.reactions:
+            if reaction_id in loop_reactions:
+                row = reaction_index.setdefault(
+                    reaction_id, len(reaction_index))
+                rows.append(row)
+                columns.append(('dmu', reaction_id))
+                values.append(-1)
         for spec, value in model.matrix.iteritems():
             compound, reaction_id = spec
-            if not model.is_exchange(reaction_id):
-                tdbalance_lhs[reaction_id] += p.var(('mu', compound)) * value
-        for reaction_id, lhs in tdbalance_lhs.iteritems():
-            if not model.is_exchange(reaction_id):
-                p.add_linear_constraints(lhs == p.var(('dmu', reaction_id)))
+            if reaction_id in reaction_index:
+                rows.append(reaction_index[reaction_id])
+                columns.append(('mu', compound))
+                values.append(value)
+        p.add_sparse_constraints(rows, columns, values, lp.Relation.Equals, 0)
 
 
-def flux_balance(model, reaction, tfba, solver):
+def find_loop_reactions(model, solver, epsilon=1e-5):
+    """Return set of reactions that can take part in internal cycles
+
+    The internal cycles are the fluxes that are possible when all exchange
+    reactions are closed. A reaction is part of a cycle if it can have a
+    non-zero flux in the model without the exchange reactions, which is
+    found with :func:`psamm.fastcore.fastcc`. Only these reactions can form
+    thermodynamically infeasible loops. The set only depends on the model
+    so it can be found once and given as loop_reactions to the analyses
+    with thermodynamic constraints.
+
+    Args:
+        model: MetabolicModel to check.
+        solver: LP solver instance to use.
+        epsilon: The threshold at which the flux is considered non-zero.
+
+    Returns:
+        Set of IDs of reactions that can carry flux in an internal cycle.
+    """
+
+    # Limits that force a flux (e.g. maintenance reactions) are relaxed to
+    # include zero as the closed model would otherwise be infeasible.
+    closed = model.copy()
+    for reaction_id in model.reactions:
+        if closed.is_exchange(reaction_id):
+            closed.remove_reaction(reaction_id)
+        else:
+            lower, upper = closed.limits[reaction_id]
+            closed.limits[reaction_id].bounds = min(lower, 0), max(upper, 0)
+
+    inconsistent = set(fastcore.fastcc(closed, epsilon, solver))
+    return set(closed.reactions) - inconsistent
+
+
+def _check_loopless(tfba, loopless):
+    if tfba and loopless:
+        raise ValueError(
+            'Loop removal cannot be combined with thermodynamic constraints')
+
+
+def flux_balance(model, reaction, tfba, solver, loopless=False,
+                 loop_reactions=None):
     """Run flux balance analysis on the given model
 
     Yields the reaction id and flux value for each reaction in the model.
@@ -151,56 +401,441 @@ def flux_balance(model, reaction, tfba, solver):
     it is recommended to setup and reuse the FluxBalanceProblem manually
     for a speed up.
 
+    If loopless is True, internal loops are removed from the solution with
+    an LP problem while the exchange fluxes and the objective fluxes are
+    kept (see :meth:`FluxBalanceProblem.get_loopless_fluxes`). This is an
+    alternative to thermodynamic constraints that only requires an LP
+    solver.
+
     Args:
         model: MetabolicModel to solve.
         reaction: Reaction to maximize. If a dict is given, this instead
             represents the objective function weights on each reaction.
         tfba: If True enable thermodynamic constraints.
         solver: LP solver instance to use.
+        loopless: If True remove internal loops from the solution.
+        loop_reactions: Reactions that can take part in internal cycles
+            (see :func:`find_loop_reactions`). Found from the model if
+            thermodynamic constraints are enabled and this is not given.
 
     Returns:
         Iterator over reaction ID and reaction flux pairs.
     """
 
-    fba = _get_fba_problem(model, tfba, solver)
+    _check_loopless(tfba, loopless)
+    fba = _get_fba_problem(model, tfba, solver, loop_reactions)
     fba.solve(reaction)
-    for reaction in model.reactions:
-        yield reaction, fba.get_flux(reaction)
+    reactions = list(model.reactions)
+    if loopless:
+        fixed = reaction.keys() if isinstance(reaction, dict) else [reaction]
+        fluxes = fba.get_loopless_fluxes(reactions, fixed=fixed)
+    else:
+        fluxes = fba.get_fluxes(reactions)
+    for reaction, flux in izip(reactions, fluxes):
+        yield reaction, flux
+
 
+def parsimonious_flux_balance(model, reaction, solver, weights={}):
+    """Run flux balance analysis followed by flux minimization
 
-def flux_variability(model, reactions, fixed, tfba, solver):
+    The reaction is maximized and the weighted L1 norm of the fluxes is then
+    minimized while the reaction is kept at the maximum (parsimonious FBA).
+    Both steps use the same problem: the auxiliary variables of the L1 norm
+    and the constraint on the optimum are added to the FBA problem after the
+    first solve, and the minimization starts from the basis of the FBA
+    solution. This replaces running :func:`flux_balance` followed by
+    :func:`flux_minimization`, which builds the problem twice.
+
+    Args:
+        model: MetabolicModel to solve.
+        reaction: Reaction to maximize. If a dict is given, this instead
+            represents the objective function weights on each reaction.
+        solver: LP solver instance to use.
+        weights: dict of weights on the L1-norm terms.
+
+    Returns:
+        Iterator over reaction ID, FBA flux and minimized flux.
+    """
+
+    fba = FluxBalanceProblem(model, solver)
+    fba.solve(reaction)
+    reactions = list(model.reactions)
+    fba_fluxes = fba.get_fluxes(reactions)
+
+    fba.minimize_l1(weights)
+    return izip(reactions, fba_fluxes, fba.get_fluxes(reactions))
+
+
+def _get_fva_problem(model, fixed, tfba, solver, loop_reactions=None):
+    """Return FBA problem with additional lower bounds on fixed fluxes"""
+    fba = _get_fba_problem(model, tfba, solver, loop_reactions)
+
+    for reaction_id, value in fixed.iteritems():
+        flux = fba.get_flux_var(reaction_id)
+        fba.prob.add_linear_constraints(flux >= value)
+
+    return fba
+
+
+def _fva_solve(model, fba, reactions, loopless=False):
+    """Yield reaction ID and bounds of each reaction using FBA problem
+
+    Every solution found is a witness of feasible flux values for all the
+    reactions, so the smallest and largest flux seen for each reaction is
+    kept. A direction of a reaction is not solved when a witness has already
+    reached the flux limit of the reaction in that direction, since the
+    solution cannot exceed the limit. Fluxes are clipped to the limits so
+    solver tolerances do not carry into the bounds. If loopless is True,
+    loops are removed from each solution before it is used.
+    """
+
+    reactions = list(reactions)
+    lower = numpy.array([model.limits[reaction_id].lower
+                         for reaction_id in reactions], dtype=float)
+    upper = numpy.array([model.limits[reaction_id].upper
+                         for reaction_id in reactions], dtype=float)
+    limits = {-1: lower, 1: upper}
+    witness = {-1: numpy.full(len(reactions), numpy.inf),
+               1: numpy.full(len(reactions), -numpy.inf)}
+
+    # Solve for each reaction. Both directions of a reaction are solved back
+    # to back and the order of the directions alternates between reactions,
+    # so every solve starts from the optimal basis of a neighbouring
+    # objective (same reaction or same direction).
+    directions = (-1, 1)
+    for i, reaction_id in enumerate(reactions):
+        bounds = {}
+        for direction in directions:
+            if witness[direction][i] == limits[direction][i]:
+                bounds[direction] = float(witness[direction][i])
+                continue
+
+            # Values beyond the limits are only solver tolerances
+            fba.solve({ reaction_id: direction })
+            if loopless:
+                fluxes = fba.get_loopless_fluxes(reactions)
+            else:
+                fluxes = fba.get_fluxes(reactions)
+            fluxes = numpy.clip(fluxes, lower, upper)
+            numpy.minimum(witness[-1], fluxes, out=witness[-1])
+            numpy.maximum(witness[1], fluxes, out=witness[1])
+            bounds[direction] = float(fluxes[i])
+        yield reaction_id, (bounds[-1], bounds[1])
+        directions = directions[::-1]
+
+
+# Problem of the current worker process in parallel FVA
+_fva_worker_problem = None
+
+
+def _fva_worker_init(model, fixed, tfba, solver, loopless, loop_reactions):
+    """Build the FVA problem of a worker process"""
+    global _fva_worker_problem
+    _fva_worker_problem = (
+        model, _get_fva_problem(model, fixed, tfba, solver, loop_reactions),
+        loopless)
+
+
+def _fva_worker_solve(reactions):
+    """Return list of reaction IDs and bounds solved in a worker process"""
+    model, fba, loopless = _fva_worker_problem
+    return list(_fva_solve(model, fba, reactions, loopless))
+
+
+def flux_variability(model, reactions, fixed, tfba, solver, parallel=None,
+                     loopless=False, loop_reactions=None):
     """Find the variability of each reaction while fixing certain fluxes
 
     Yields the reaction id, and a tuple of minimum and maximum value for each
     of the given reactions. The fixed reactions are given in a dictionary as
     a reaction id to value mapping.
 
+    If parallel is larger than one, the reactions are split into chunks
+    that are solved by a pool of worker processes. Each worker builds its own
+    problem when started. The loop reactions of the thermodynamic
+    constraints are found before the workers are started so they are only
+    found once. The results are yielded in the same order as the reactions
+    are given.
+
+    If loopless is True, internal loops are removed from each solution with
+    an LP problem (see :meth:`FluxBalanceProblem.get_loopless_fluxes`) and
+    the bounds are taken from the solutions without loops.
+
     Args:
         model: MetabolicModel to solve.
         reactions: Reactions on which to report variablity.
         fixed: dict of additional lower bounds on reaction fluxes.
         tfba: If True enable thermodynamic constraints.
         solver: LP solver instance to use.
+        parallel: Number of worker processes to use.
+        loopless: If True remove internal loops from the solutions.
+        loop_reactions: Reactions that can take part in internal cycles
+            (see :func:`find_loop_reactions`). Found from the model if
+            thermodynamic constraints are enabled and this is not given.
 
     Returns:
         Iterator over pairs of reaction ID and bounds. Bounds are returned as
         pairs of lower and upper values.
     """
 
-    fba = _get_fba_problem(model, tfba, solver)
+    _check_loopless(tfba, loopless)
+    if parallel is None or parallel <= 1:
+        fba = _get_fva_problem(model, fixed, tfba, solver, loop_reactions)
+        for result in _fva_solve(model, fba, reactions, loopless):
+            yield result
+        return
+
+    if tfba and loop_reactions is None:
+        loop_reactions = find_loop_reactions(model, solver)
+
+    # Use small chunks so the work is balanced between the workers but
+    # large enough that neighbouring reactions are solved in the same
+    # worker and the basis can be reused.
+    reactions = list(reactions)
+    chunk_size = max(1, min(50, len(reactions) // (parallel * 4)))
+
+    pool = multiprocessing.Pool(
+        parallel, _fva_worker_init,
+        (model, fixed, tfba, solver, loopless, loop_reactions))
+    try:
+        for results in pool.imap(
+                _fva_worker_solve, chunks(reactions, chunk_size)):
+            for result in results:
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _robustness_solve(fba, reaction, varying, points, minimize, reactions):
+    """Yield fluxes of reactions at each point of the varying fluxes
+
+    The fluxes are None at points where the problem is infeasible.
+    """
+    for point in points:
+        for reaction_id, value in izip(varying, point):
+            fba.set_flux_bounds(reaction_id, value, value)
+
+        try:
+            fba.solve(reaction)
+            if minimize:
+                fba.minimize_l1()
+        except FluxBalanceError:
+            yield None
+        else:
+            yield fba.get_fluxes(reactions)
 
-    for reaction_id, value in fixed.iteritems():
-        flux = fba.get_flux_var(reaction_id)
-        fba.prob.add_linear_constraints(flux >= value)
 
-    def min_max_solve(reaction_id):
-        for direction in (-1, 1):
-            fba.solve({ reaction_id: direction })
-            yield fba.get_flux(reaction_id)
+# Problem of the current worker process in parallel robustness analysis
+_robustness_worker_problem = None
+
+
+def _robustness_worker_init(model, reaction, varying, tfba, solver, minimize,
+                            loop_reactions):
+    """Build the robustness problem of a worker process"""
+    global _robustness_worker_problem
+    _robustness_worker_problem = (
+        _get_fba_problem(model, tfba, solver, loop_reactions), reaction,
+        varying, minimize, list(model.reactions))
+
+
+def _robustness_worker_solve(points):
+    """Return list of fluxes at points solved in a worker process"""
+    fba, reaction, varying, minimize, reactions = _robustness_worker_problem
+    return list(_robustness_solve(
+        fba, reaction, varying, points, minimize, reactions))
+
 
-    # Solve for each reaction
-    for reaction_id in reactions:
-        yield reaction_id, tuple(min_max_solve(reaction_id))
+def phase_plane_points(values1, values2):
+    """Return list of points in a grid of two varying fluxes
+
+    The points are ordered along a path where the second value goes back
+    and forth (e.g. ``(0, 0), (0, 1), (1, 1), (1, 0)``) so every point
+    is next to the previous point. This allows each solve to start from the
+    solution at a nearby point.
+    """
+    values2 = list(values2)
+    points = []
+    for i, value1 in enumerate(values1):
+        row = values2 if i % 2 == 0 else reversed(values2)
+        points.extend((value1, value2) for value2 in row)
+    return points
+
+
+def robustness(model, reaction, varying, points, tfba, solver,
+               minimize=False, parallel=None, loop_reactions=None):
+    """Maximize reaction while the varying reactions are fixed at each point
+
+    The varying reactions are given as a tuple of reaction IDs and each
+    point is a tuple of flux values, one for each varying reaction. One
+    problem is built and only the bounds of the varying reactions are
+    changed at each point so each solve starts from the solution at the
+    previous point. The points should be ordered so consecutive points are
+    close (see :func:`phase_plane_points`).
+
+    If parallel is larger than one, the points are split into consecutive
+    chunks that are solved by a pool of worker processes that each build
+    their own problem. The loop reactions of the thermodynamic constraints
+    are found before the workers are started so they are only found once.
+
+    Args:
+        model: MetabolicModel to solve.
+        reaction: Reaction to maximize.
+        varying: Tuple of reactions to fix at each point.
+        points: List of tuples of fluxes of the varying reactions.
+        tfba: If True enable thermodynamic constraints.
+        solver: LP solver instance to use.
+        minimize: If True minimize the L1 norm of the fluxes at the optimum.
+        parallel: Number of worker processes to use.
+        loop_reactions: Reactions that can take part in internal cycles
+            (see :func:`find_loop_reactions`). Found from the model if
+            thermodynamic constraints are enabled and this is not given.
+
+    Returns:
+        Iterator over points and dicts of the flux of every reaction, or
+        None if the problem is infeasible at the point.
+    """
+
+    varying = tuple(varying)
+    points = list(points)
+    reactions = list(model.reactions)
+
+    pool = None
+    if parallel is None or parallel <= 1:
+        fba = _get_fba_problem(model, tfba, solver, loop_reactions)
+        results = _robustness_solve(
+            fba, reaction, varying, points, minimize, reactions)
+    else:
+        if tfba and loop_reactions is None:
+            loop_reactions = find_loop_reactions(model, solver)
+        pool = multiprocessing.Pool(
+            parallel, _robustness_worker_init,
+            (model, reaction, varying, tfba, solver, minimize,
+             loop_reactions))
+        chunk_size = max(1, len(points) // (parallel * 4))
+        results = (
+            fluxes for chunk in pool.imap(
+                _robustness_worker_solve, chunks(points, chunk_size))
+            for fluxes in chunk)
+
+    try:
+        for point, fluxes in izip(points, results):
+            if fluxes is not None:
+                fluxes = dict(izip(reactions, fluxes))
+            yield point, fluxes
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def _collinear(point1, point2, point3, tolerance):
+    """Return True if the middle point is on the line through the others"""
+    (x1, y1), (x2, y2), (x3, y3) = point1, point2, point3
+    expected = y1 + (y3 - y1) * (x2 - x1) / (x3 - x1)
+    return abs(y2 - expected) <= tolerance * max(1.0, abs(y2))
+
+
+def robustness_breakpoints(model, reaction, varying, solver,
+                           minimum=None, maximum=None, tolerance=1e-7,
+                           max_solves=1000):
+    """Find the exact optimal objective as a function of a varying flux
+
+    The maximum flux of the reaction is a concave piecewise-linear function
+    of the flux of the varying reaction. The function is determined exactly
+    from a small number of LP solves: at each solve the reduced cost of the
+    fixed varying flux gives the slope of the function at that point, and
+    the tangents at the two ends of an interval intersect at the only point
+    where a breakpoint can be found. If the objective value at the
+    intersection lies on the tangents the intersection is a breakpoint,
+    otherwise both halves of the interval are searched. The number of solves
+    is therefore proportional to the number of breakpoints rather than to
+    the resolution of a grid.
+
+    The varying flux is limited to the range where the problem is feasible,
+    optionally restricted further by minimum and maximum. Thermodynamic
+    constraints are not supported since the slopes are only defined for
+    LP problems, and the solver must provide reduced costs (QSopt_ex does
+    not) or :class:`FluxBalanceError` is raised.
+
+    Args:
+        model: MetabolicModel to solve.
+        reaction: Reaction to maximize.
+        varying: Reaction to vary.
+        solver: LP solver instance to use.
+        minimum: Lower limit of the varying flux.
+        maximum: Upper limit of the varying flux.
+        tolerance: Relative tolerance of objective values and slopes.
+        max_solves: Maximum number of solves when searching breakpoints.
+
+    Returns:
+        List of tuples of varying flux and maximum objective value ordered
+        by flux. The list contains the ends of the feasible range and the
+        breakpoints between them, and the objective is linear between
+        consecutive points.
+    """
+
+    fba = FluxBalanceProblem(model, solver)
+
+    # Feasible range of the varying flux
+    fba.solve(varying)
+    flux_max = fba.get_flux(varying)
+    fba.solve({varying: -1})
+    flux_min = fba.get_flux(varying)
+    if minimum is not None:
+        flux_min = max(flux_min, minimum)
+    if maximum is not None:
+        flux_max = min(flux_max, maximum)
+    if flux_min > flux_max:
+        raise ValueError('No feasible flux of {} in range {}, {}'.format(
+            varying, minimum, maximum))
+
+    def evaluate(value):
+        fba.set_flux_bounds(varying, value, value)
+        fba.solve(reaction)
+        slope, = fba.get_reduced_costs([varying])
+        return value, fba.get_flux(reaction), slope
+
+    start = evaluate(flux_min)
+    if flux_max == flux_min:
+        return [start[:2]]
+    end = evaluate(flux_max)
+
+    points = [start, end]
+    intervals = [(start, end)]
+    while len(intervals) > 0:
+        if len(points) >= max_solves:
+            raise FluxBalanceError(
+                'Breakpoints not found within {} solves'.format(max_solves))
+
+        (x1, y1, slope1), (x2, y2, slope2) = intervals.pop()
+        if slope1 - slope2 <= tolerance * max(1.0, abs(slope1), abs(slope2)):
+            # Tangents are parallel so the objective is linear
+            continue
+
+        # Intersection of the tangents at the two ends
+        x = (y2 - y1 + slope1 * x1 - slope2 * x2) / (slope1 - slope2)
+        x = min(max(x, x1), x2)
+        if x == x1 or x == x2:
+            continue
+
+        point = evaluate(x)
+        points.append(point)
+        if y1 + slope1 * (x - x1) - point[1] > tolerance * max(
+                1.0, abs(point[1])):
+            intervals.append((point, (x2, y2, slope2)))
+            intervals.append(((x1, y1, slope1), point))
+
+    # Keep only the points where the slope changes
+    points = sorted(point[:2] for point in points)
+    breakpoints = [points[0]]
+    for point, next_point in izip(points[1:], points[2:]):
+        if not _collinear(breakpoints[-1], point, next_point, tolerance):
+            breakpoints.append(point)
+    breakpoints.append(points[-1])
+
+    return breakpoints
 
 
 def flux_minimization(model, fixed, solver, weights={}):
@@ -231,8 +866,9 @@ def flux_minimization(model, fixed, solver, weights={}):
     # Define z variables
     prob.define(*(('z', reaction_id) for reaction_id in model.reactions),
                 lower=0)
-    objective = sum(prob.var(('z', reaction_id)) * weights.get(reaction_id, 1)
-                    for reaction_id in model.reactions)
+    objective = lp.Expression.sum(
+        prob.var(('z', reaction_id)) * weights.get(reaction_id, 1)
+        for reaction_id in model.reactions)
     prob.set_linear_objective(objective)
 
     # Define constraints
@@ -240,12 +876,7 @@ def flux_minimization(model, fixed, solver, weights={}):
     z = prob.set(('z', rxnid) for rxnid in model.reactions)
     prob.add_linear_constraints(z >= v, v >= -z)
 
-    massbalance_lhs = { compound: 0 for compound in model.compounds }
-    for spec, value in model.matrix.iteritems():
-        compound, rxnid = spec
-        massbalance_lhs[compound] += value * prob.var(('v', rxnid))
-    for compound, lhs in massbalance_lhs.iteritems():
-        prob.add_linear_constraints(lhs == 0)
+    add_mass_balance(prob, model)
 
     # Solve
     result = prob.solve(lp.ObjectiveSense.Minimize)
@@ -253,8 +884,9 @@ def flux_minimization(model, fixed, solver, weights={}):
         raise FluxBalanceError('Non-optimal solution: {}'.format(
             result.status))
 
-    return ((reaction_id, result.get_value(('v', reaction_id)))
-            for reaction_id in model.reactions)
+    reactions = list(model.reactions)
+    return izip(reactions, result.get_values(
+        [('v', reaction_id) for reaction_id in reactions]))
 
 
 def flux_randomization(model, fixed, tfba, solver):
@@ -293,7 +925,7 @@ def flux_randomization(model, fixed, tfba, solver):
         yield reaction_id, fba.get_flux(reaction_id)
 
 
-def consistency_check(model, subset, epsilon, tfba, solver):
+def consistency_check(model, subset, epsilon, tfba, solver, loopless=False):
     """Check that reaction subset of model is consistent using FBA
 
     Yields all reactions that are *not* flux consistent. A reaction is
@@ -309,18 +941,33 @@ def consistency_check(model, subset, epsilon, tfba, solver):
     checking one reaction results in flux in another unchecked reaction,
     that reaction will immediately be marked flux consistent.
 
+    If loopless is True, internal loops are removed from each solution with
+    an LP problem before the support is found, so reactions that can only
+    have flux in internal loops are inconsistent.
+
     Args:
         model: MetabolicModel to check for consistency.
         subset: Subset of model reactions to check.
         epsilon: The threshold at which the flux is considered non-zero.
         tfba: If True enable thermodynamic constraints.
         solver: LP solver instance to use.
+        loopless: If True remove internal loops from the solutions.
 
     Returns:
         An iterator of flux inconsistent reactions in the subset.
     """
 
+    _check_loopless(tfba, loopless)
     fba = _get_fba_problem(model, tfba, solver)
+    reactions = list(model.reactions)
+
+    def flux_support():
+        if loopless:
+            fluxes = fba.get_loopless_fluxes(reactions)
+        else:
+            fluxes = fba.get_fluxes(reactions)
+        return set(rxnid for rxnid, flux in izip(reactions, fluxes)
+                   if abs(flux) >= epsilon)
 
     subset = set(subset)
     while len(subset) > 0:
@@ -329,15 +976,13 @@ def consistency_check(model, subset, epsilon, tfba, solver):
         logger.debug('{} left, checking {}...'.format(len(subset), reaction))
 
         fba.solve(reaction)
-        support = set(rxnid for rxnid in model.reactions
-                      if abs(fba.get_flux(rxnid)) >= epsilon)
+        support = flux_support()
         subset -= support
         if reaction in support:
             continue
         elif model.is_reversible(reaction):
             fba.solve({ reaction: -1 })
-            support = set(rxnid for rxnid in model.reactions
-                          if abs(fba.get_flux(rxnid)) >= epsilon)
+            support = flux_support()
             subset -= support
             if reaction in support:
                 continue
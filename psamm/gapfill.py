@@ -21,6 +21,7 @@ This implements a variant of the algorithms described in [Kumar07]_.
 """
 
 from .lpsolver import lp
+from .matrix import add_mass_balance
 
 class GapFillError(Exception):
     """Indicates an error while running GapFind/GapFill"""
@@ -68,21 +69,17 @@ def gapfind(model, solver, epsilon=1e-5, v_max=1000):
 
     prob.define(*(('xp', compound) for compound in model.compounds), types=lp.VariableType.Binary)
 
-    objective = sum(prob.var(('xp', compound)) for compound in model.compounds)
+    objective = lp.Expression.sum(
+        prob.var(('xp', compound)) for compound in model.compounds)
     prob.set_linear_objective(objective)
 
     for compound, lhs in binary_cons_lhs.iteritems():
         prob.add_linear_constraints(lhs >= prob.var(('xp', compound)))
 
     # Define mass balance constraints
-    massbalance_lhs = { compound: 0 for compound in model.compounds }
-    for spec, value in model.matrix.iteritems():
-        compound, reaction_id = spec
-        massbalance_lhs[compound] += prob.var(('v', reaction_id)) * value
-    for compound, lhs in massbalance_lhs.iteritems():
-        # The constraint is merely >0 meaning that we have implicit sinks
-        # for all compounds.
-        prob.add_linear_constraints(lhs >= 0)
+    # The constraint is merely >0 meaning that we have implicit sinks
+    # for all compounds.
+    add_mass_balance(prob, model, sense=lp.Relation.Greater)
 
     # Solve
     result = prob.solve(lp.ObjectiveSense.Maximize)
@@ -125,8 +122,10 @@ def gapfill(model, core, blocked, solver, epsilon=1e-5, v_max=1000):
     prob.define(*(('ym', reaction_id) for reaction_id in core), types=lp.VariableType.Binary)
     prob.define(*(('yd', reaction_id) for reaction_id in database_reactions), types=lp.VariableType.Binary)
 
-    objective = (sum(prob.var(('ym', reaction_id)) for reaction_id in core) +
-                    sum(prob.var(('yd', reaction_id)) for reaction_id in database_reactions))
+    objective = lp.Expression.sum(
+        prob.var(('ym', reaction_id)) for reaction_id in core)
+    objective += lp.Expression.sum(
+        prob.var(('yd', reaction_id)) for reaction_id in database_reactions)
     prob.set_linear_objective(objective)
 
     # Add constraints on core reactions
@@ -166,14 +165,9 @@ def gapfill(model, core, blocked, solver, epsilon=1e-5, v_max=1000):
             prob.add_linear_constraints(lhs >= 1)
 
     # Define mass balance constraints
-    massbalance_lhs = { compound: 0 for compound in model.compounds }
-    for spec, value in model.matrix.iteritems():
-        compound, reaction_id = spec
-        massbalance_lhs[compound] += prob.var(('v', reaction_id)) * value
-    for compound, lhs in massbalance_lhs.iteritems():
-        # The constraint is merely >0 meaning that we have implicit sinks
-        # for all compounds.
-        prob.add_linear_constraints(lhs >= 0)
+    # The constraint is merely >0 meaning that we have implicit sinks
+    # for all compounds.
+    add_mass_balance(prob, model, sense=lp.Relation.Greater)
 
     # Solve
     result = prob.solve(lp.ObjectiveSense.Minimize)
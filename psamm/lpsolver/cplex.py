@@ -24,13 +24,17 @@ from itertools import repeat, count, izip
 import numbers
 
 import cplex as cp
+import numpy
 
 from .lp import Solver as BaseSolver
 from .lp import Problem as BaseProblem
 from .lp import Result as BaseResult
+from .lp import Constraint as BaseConstraint
 from .lp import (VariableSet, Expression, Relation,
                     ObjectiveSense, VariableType,
-                    InvalidResultError)
+                    InvalidResultError, SnapshotResult,
+                    _problem_format, _write_names, _read_names, _names_after,
+                    _record_build, _record_solve)
 from ..util import LoggerFile
 
 # Module-level logging
@@ -40,10 +44,24 @@ logger = logging.getLogger(__name__)
 class Solver(BaseSolver):
     """Represents an LP-solver using Cplex"""
 
+    @_record_build
     def create_problem(self, **kwargs):
         """Create a new LP-problem using the solver"""
         return Problem(**kwargs)
 
+    @_record_build
+    def read_problem(self, path, format=None, **kwargs):
+        """Create a new LP-problem from a file in LP or MPS format
+
+        See :meth:`psamm.lpsolver.lp.Solver.read_problem`.
+        """
+        format = _problem_format(path, format)
+        problem = Problem(**kwargs)
+        problem._cp.read(path, format)
+        problem._load_problem(_read_names(
+            path, problem._cp.variables.get_names()))
+        return problem
+
 
 class Problem(BaseProblem):
     """Represents an LP-problem of a cplex.Solver"""
@@ -56,6 +74,19 @@ class Problem(BaseProblem):
 
     def __init__(self, **kwargs):
         self._cp = cp.Cplex()
+        self._kwargs = kwargs
+        self._setup_cplex()
+
+        self._variables = {}
+        self._var_names = ('x'+str(i) for i in count(1))
+        self._var_expressions = {}
+        self._constr_names = ('c'+str(i) for i in count(1))
+        self._objective = {}
+
+        self._result = None
+
+    def _setup_cplex(self):
+        """Set output streams and parameters of the Cplex object"""
 
         # Set up output to go to logging streams
         log_stream = LoggerFile(logger, logging.DEBUG)
@@ -68,20 +99,34 @@ class Problem(BaseProblem):
         self._cp.set_error_stream(error_stream)
 
         # Increase feasibility tolerance from default
-        feasibility_tolerance = kwargs.get('feasibility_tolerance', 1e-9)
+        feasibility_tolerance = self._kwargs.get(
+            'feasibility_tolerance', 1e-9)
         self._cp.parameters.simplex.tolerances.feasibility.set(
             feasibility_tolerance)
 
         # Set number of threads
-        if 'threads' in kwargs:
-            logger.info('Setting threads to {!r}'.format(kwargs['threads']))
-            self._cp.parameters.threads.set(kwargs['threads'])
+        if 'threads' in self._kwargs:
+            logger.info('Setting threads to {!r}'.format(
+                self._kwargs['threads']))
+            self._cp.parameters.threads.set(self._kwargs['threads'])
 
         self._cp.parameters.emphasis.numerical.set(True)
 
-        self._variables = {}
-        self._var_names = ('x'+str(i) for i in count(1))
+    def _load_problem(self, variables):
+        """Set up the problem after the Cplex problem has been replaced
 
+        The variables are given as a dict of names to names in the Cplex
+        problem. This is used when a problem is copied or read from a file.
+        """
+        self._variables = dict(variables)
+        self._var_names = _names_after('x', self._cp.variables.get_names())
+        self._var_expressions = {}
+        self._constr_names = _names_after(
+            'c', self._cp.linear_constraints.get_names())
+        self._objective = {
+            lp_name: value for lp_name, value in izip(
+                self._cp.variables.get_names(),
+                self._cp.objective.get_linear()) if value != 0}
         self._result = None
 
     @property
@@ -89,6 +134,7 @@ class Problem(BaseProblem):
         """The underlying Cplex object"""
         return self._cp
 
+    @_record_build
     def define(self, *names, **kwargs):
         """Define variable in the problem
 
@@ -131,10 +177,47 @@ class Problem(BaseProblem):
         self._cp.variables.add(**args)
 
     def var(self, name):
-        """Return the variable as an expression"""
-        if name not in self._variables:
-            raise ValueError('Undefined variable: {}'.format(name))
-        return Expression({ name: 1 })
+        """Return the variable as an expression
+
+        The expression is cached so the same (shared) instance is returned
+        on every call for the same variable.
+        """
+        try:
+            return self._var_expressions[name]
+        except KeyError:
+            if name not in self._variables:
+                raise ValueError('Undefined variable: {}'.format(name))
+            expression = self._unit_expression(name)
+            self._var_expressions[name] = expression
+            return expression
+
+    @_record_build
+    def set_bounds(self, *names, **kwargs):
+        """Change the bounds of defined variables
+
+        This takes the keyword arguments lower and upper in the same way as
+        define(). The remaining parts of the problem are left unchanged.
+        """
+
+        names = tuple(names)
+        lower = kwargs.get('lower', None)
+        upper = kwargs.get('upper', None)
+
+        # Repeat values if a scalar is given
+        if lower is None or isinstance(lower, numbers.Number):
+            lower = repeat(lower, len(names))
+        if upper is None or isinstance(upper, numbers.Number):
+            upper = repeat(upper, len(names))
+
+        lp_names = tuple(self._variables[name] for name in names)
+        lower = tuple(-cp.infinity if value is None else float(value)
+                      for value in lower)
+        upper = tuple(cp.infinity if value is None else float(value)
+                      for value in upper)
+
+        if len(lp_names) > 0:
+            self._cp.variables.set_lower_bounds(izip(lp_names, lower))
+            self._cp.variables.set_upper_bounds(izip(lp_names, upper))
 
     def set(self, names):
         """Return the set of variables as an expression"""
@@ -143,12 +226,15 @@ class Problem(BaseProblem):
             raise ValueError('Undefined variables: {}'.format(set(names) - set(self._variables)))
         return Expression({ VariableSet(names): 1 })
 
+    @_record_build
     def add_linear_constraints(self, *relations):
         """Add constraints to the problem
 
         Each constraint is represented by a Relation, and the
-        expression in that relation can be a set expression.
+        expression in that relation can be a set expression. Returns a
+        list of Constraint handles.
         """
+        constraints = []
         for relation in relations:
             if isinstance(relation, bool):
                 # A bool in place of a relation is accepted to mean
@@ -157,6 +243,7 @@ class Problem(BaseProblem):
                 # '0 == 0' or '2 >= 3').
                 if not relation:
                     raise ValueError('Unsatisfiable relation added')
+                constraints.append(Constraint(self, None))
             else:
                 if relation.sense in (Relation.StrictlyGreater, Relation.StrictlyLess):
                     raise ValueError('Strict relations are invalid in LP-problems: {}'.format(relation))
@@ -166,18 +253,73 @@ class Problem(BaseProblem):
                 for value_set in expression.value_sets():
                     ind, val = zip(*((self._variables[variable], float(value)) for variable, value in value_set))
                     pairs.append(cp.SparsePair(ind=ind, val=val))
+                names = tuple(next(self._constr_names) for _ in pairs)
                 self._cp.linear_constraints.add(lin_expr=pairs, senses=tuple(repeat(relation.sense, len(pairs))),
-                                                rhs=tuple(repeat(float(-expression.offset), len(pairs))))
+                                                rhs=tuple(repeat(float(-expression.offset), len(pairs))),
+                                                names=names)
+                constraints.extend(Constraint(self, name) for name in names)
+
+        return constraints
 
+    @_record_build
+    def add_sparse_constraints(self, rows, columns, values, senses, rhs):
+        """Add constraints given as a sparse matrix in coordinate form
+
+        The rows are added in one call and the coefficients are set in a
+        second call to Cplex. See
+        :meth:`psamm.lpsolver.lp.Problem.add_sparse_constraints`.
+        """
+        row_values, senses, rhs = self._sparse_rows(
+            rows, columns, values, senses, rhs)
+
+        names = tuple(next(self._constr_names) for _ in row_values)
+        offset = self._cp.linear_constraints.get_num()
+        self._cp.linear_constraints.add(
+            senses=senses, rhs=tuple(float(value) for value in rhs),
+            names=names)
+
+        coefficients = []
+        for i, row in enumerate(row_values):
+            for variable, value in row.iteritems():
+                coefficients.append(
+                    (offset + i, self._variables[variable], float(value)))
+        if len(coefficients) > 0:
+            self._cp.linear_constraints.set_coefficients(coefficients)
+
+        return [Constraint(self, name) for name in names]
+
+    @_record_build
     def set_linear_objective(self, expression):
-        """Set linear objective of problem"""
+        """Set linear objective of problem
+
+        Only the coefficients that differ from the current objective are
+        passed to the solver so the cost does not depend on the total
+        number of variables in the problem.
+        """
 
         if isinstance(expression, numbers.Number):
             # Allow expressions with no variables as objective,
             # represented as a number
             expression = Expression()
 
-        self._cp.objective.set_linear((lp_name, expression.value(var)) for var, lp_name in self._variables.iteritems())
+        objective = {}
+        for var, value in expression.values():
+            if var not in self._variables:
+                raise ValueError('Undefined variable: {}'.format(var))
+            if value != 0:
+                objective[self._variables[var]] = float(value)
+
+        # Clear coefficients that are no longer in the objective and
+        # update the coefficients that have changed.
+        changes = [(lp_name, 0) for lp_name in self._objective
+                   if lp_name not in objective]
+        changes.extend((lp_name, value)
+                       for lp_name, value in objective.iteritems()
+                       if self._objective.get(lp_name) != value)
+        if len(changes) > 0:
+            self._cp.objective.set_linear(changes)
+
+        self._objective = objective
 
     def set_objective_sense(self, sense):
         """Set type of problem (maximize or minimize)"""
@@ -188,6 +330,7 @@ class Problem(BaseProblem):
         else:
             raise ValueError('Invalid objective sense')
 
+    @_record_solve
     def solve(self, sense=None):
         """Solve problem"""
         if sense is not None:
@@ -201,6 +344,82 @@ class Problem(BaseProblem):
     def result(self):
         return self._result
 
+    def get_size(self):
+        """Return the number of rows, columns and nonzeros of the problem"""
+        return (self._cp.linear_constraints.get_num(),
+                self._cp.variables.get_num(),
+                self._cp.linear_constraints.get_num_nonzeros())
+
+    def get_basis(self):
+        """Return the basis of the last solution
+
+        The basis is a pair of lists containing the status of each column and
+        each row. Returns None if no basis is available.
+        """
+        try:
+            col_status, row_status = self._cp.solution.basis.get_basis()
+        except cp.exceptions.CplexError:
+            return None
+        return col_status, row_status
+
+    @_record_build
+    def set_basis(self, basis):
+        """Set the starting basis of the next solve"""
+        if basis is None:
+            return
+
+        col_status, row_status = basis
+        if (len(col_status) != self._cp.variables.get_num() or
+                len(row_status) != self._cp.linear_constraints.get_num()):
+            raise ValueError('Basis does not match the problem size')
+
+        self._cp.start.set_start(
+            col_status=col_status, row_status=row_status,
+            col_primal=[], row_primal=[], col_dual=[], row_dual=[])
+
+    @_record_build
+    def copy(self):
+        """Return an independent copy of the problem
+
+        The Cplex object is copied as a whole, see
+        :meth:`psamm.lpsolver.lp.Problem.copy`.
+        """
+        problem = Problem(**self._kwargs)
+        problem._cp = cp.Cplex(self._cp)
+        problem._setup_cplex()
+        problem._load_problem(self._variables)
+        return problem
+
+    def write(self, path, format=None):
+        """Write the problem to a file in LP or MPS format
+
+        See :meth:`psamm.lpsolver.lp.Problem.write`.
+        """
+        format = _problem_format(path, format)
+        self._cp.write(path, filetype=format)
+        _write_names(path, self._variables)
+
+
+class Constraint(BaseConstraint):
+    """Represents a constraint in a cplex.Problem"""
+
+    def __init__(self, prob, name):
+        self._prob = prob
+        self._name = name
+
+    @_record_build
+    def delete(self):
+        """Remove constraint from problem"""
+        if self._name is not None:
+            self._prob._cp.linear_constraints.delete(self._name)
+
+    @_record_build
+    def set_rhs(self, value):
+        """Change the right-hand side of the constraint"""
+        if self._name is None:
+            raise ValueError('Constraint without variables cannot be changed')
+        self._prob._cp.linear_constraints.set_rhs(self._name, float(value))
+
 
 class Result(BaseResult):
     """Represents the solution to a cplex.Problem
@@ -245,3 +464,115 @@ class Result(BaseResult):
         elif expression not in self._problem._variables:
             raise ValueError('Unknown expression: {}'.format(expression))
         return self._problem._cp.solution.get_values(self._problem._variables[expression])
+
+    def _get_lp_names(self, names):
+        lp_names = []
+        for name in names:
+            if name not in self._problem._variables:
+                raise ValueError('Unknown expression: {}'.format(name))
+            lp_names.append(self._problem._variables[name])
+        return lp_names
+
+    def get_values(self, names):
+        """Return values of variables as a :class:`numpy.ndarray`
+
+        All values are obtained from Cplex in a single call.
+        """
+
+        self._check_valid()
+        lp_names = self._get_lp_names(names)
+        if len(lp_names) == 0:
+            return numpy.zeros(0)
+        return numpy.array(
+            self._problem._cp.solution.get_values(lp_names), dtype=float)
+
+    def _check_continuous(self):
+        self._check_valid()
+        if self._problem._cp.get_problem_type() != cp.Cplex.problem_type.LP:
+            raise ValueError('Dual information is only available for LP'
+                             ' problems')
+
+    def _get_row_values(self, constraints, getter, default):
+        """Return array of values of constraints obtained in one call
+
+        Constraints without variables have no row in Cplex and are given
+        the default value.
+        """
+        constraints = list(constraints)
+        values = numpy.empty((len(constraints),) + numpy.shape(default))
+        values[:] = default
+        indices = [i for i, constraint in enumerate(constraints)
+                   if constraint._name is not None]
+        if len(indices) > 0:
+            values[indices] = getter(
+                [constraints[i]._name for i in indices])
+        return values
+
+    @staticmethod
+    def _infinite_limits(values):
+        """Convert the infinity of Cplex to inf"""
+        values[values >= cp.infinity] = numpy.inf
+        values[values <= -cp.infinity] = -numpy.inf
+        return values
+
+    def get_reduced_costs(self, names):
+        """Return reduced costs of variables as a :class:`numpy.ndarray`
+
+        All reduced costs are obtained from Cplex in a single call. Raises
+        :class:`ValueError` if the problem was solved as a MIP.
+        """
+
+        self._check_continuous()
+        lp_names = self._get_lp_names(names)
+        if len(lp_names) == 0:
+            return numpy.zeros(0)
+        return numpy.array(
+            self._problem._cp.solution.get_reduced_costs(lp_names),
+            dtype=float)
+
+    def get_dual_values(self, constraints):
+        """Return dual values of constraints as a :class:`numpy.ndarray`
+
+        All dual values are obtained from Cplex in a single call. Raises
+        :class:`ValueError` if the problem was solved as a MIP.
+        """
+
+        self._check_continuous()
+        return self._get_row_values(
+            constraints, self._problem._cp.solution.get_dual_values, 0.0)
+
+    def get_objective_ranges(self, names):
+        """Return ranges of objective coefficients of variables
+
+        See :meth:`psamm.lpsolver.lp.Result.get_objective_ranges`.
+        """
+
+        self._check_continuous()
+        lp_names = self._get_lp_names(names)
+        if len(lp_names) == 0:
+            return numpy.zeros((0, 2))
+        return self._infinite_limits(numpy.array(
+            self._problem._cp.solution.sensitivity.objective(lp_names),
+            dtype=float))
+
+    def get_rhs_ranges(self, constraints):
+        """Return ranges of right-hand sides of constraints
+
+        See :meth:`psamm.lpsolver.lp.Result.get_rhs_ranges`.
+        """
+
+        self._check_continuous()
+        return self._infinite_limits(self._get_row_values(
+            constraints, self._problem._cp.solution.sensitivity.rhs,
+            (-numpy.inf, numpy.inf)))
+
+    def snapshot(self):
+        """Return copy of result that remains valid after solving again"""
+
+        self._check_valid()
+        values = {}
+        if self.success and len(self._problem._variables) > 0:
+            names, lp_names = zip(*self._problem._variables.iteritems())
+            values = izip(
+                names, self._problem._cp.solution.get_values(list(lp_names)))
+        return SnapshotResult(self.success, self.status, values)
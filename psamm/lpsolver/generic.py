@@ -54,6 +54,19 @@ try:
 except ImportError:
     pass
 
+# Try to load GLPK solver
+try:
+    from . import glpk
+    _solvers.append({
+        'class': glpk.Solver,
+        'name': 'glpk',
+        'integer': True,
+        'rational': False,
+        'priority': 6
+    })
+except ImportError:
+    pass
+
 
 class RequirementsError(Exception):
     """Error resolving solver requirements"""
@@ -0,0 +1,624 @@
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+"""Linear programming solver using GLPK
+
+The GLPK problem object is kept between solves so changes to bounds,
+right-hand sides and the objective are applied directly to the problem and
+the next solve starts from the previous basis.
+"""
+
+from __future__ import absolute_import
+
+from itertools import repeat, count, izip
+import numbers
+
+import numpy
+import swiglpk
+
+from .lp import Solver as BaseSolver
+from .lp import Problem as BaseProblem
+from .lp import Result as BaseResult
+from .lp import Constraint as BaseConstraint
+from .lp import (VariableSet, Expression, Relation,
+                    ObjectiveSense, VariableType,
+                    InvalidResultError, SnapshotResult,
+                    _problem_format, _write_names, _read_names, _names_after,
+                    _record_build, _record_solve)
+
+# Disable terminal output from GLPK. Messages from the solver routines are
+# also disabled through the control parameters, but some routines (e.g.
+# basis construction) print messages regardless.
+swiglpk.glp_term_out(swiglpk.GLP_OFF)
+
+
+def _bounds_args(lower, upper):
+    """Return GLPK bounds type and values from lower and upper bounds"""
+    if lower is None and upper is None:
+        return swiglpk.GLP_FR, 0.0, 0.0
+    elif upper is None:
+        return swiglpk.GLP_LO, float(lower), 0.0
+    elif lower is None:
+        return swiglpk.GLP_UP, 0.0, float(upper)
+    elif lower == upper:
+        return swiglpk.GLP_FX, float(lower), float(upper)
+    return swiglpk.GLP_DB, float(lower), float(upper)
+
+
+class Solver(BaseSolver):
+    """Represents an LP-solver using GLPK"""
+
+    @_record_build
+    def create_problem(self, **kwargs):
+        """Create a new LP-problem using the solver"""
+        return Problem(**kwargs)
+
+    @_record_build
+    def read_problem(self, path, format=None, **kwargs):
+        """Create a new LP-problem from a file in LP or MPS format
+
+        See :meth:`psamm.lpsolver.lp.Solver.read_problem`.
+        """
+        format = _problem_format(path, format)
+        problem = Problem(**kwargs)
+        if format == 'mps':
+            ret = swiglpk.glp_read_mps(
+                problem._p, swiglpk.GLP_MPS_FILE, None, path)
+        else:
+            ret = swiglpk.glp_read_lp(problem._p, None, path)
+        if ret != 0:
+            raise IOError('Unable to read problem from {}'.format(path))
+
+        problem._load_problem(_read_names(path, problem._column_names()))
+        return problem
+
+
+class Problem(BaseProblem):
+    """Represents an LP-problem of a glpk.Solver"""
+
+    VARTYPE_MAP = {
+        VariableType.Continuous: swiglpk.GLP_CV,
+        VariableType.Binary: swiglpk.GLP_BV,
+        VariableType.Integer: swiglpk.GLP_IV
+    }
+
+    ROW_BOUNDS_MAP = {
+        Relation.Equals: swiglpk.GLP_FX,
+        Relation.Greater: swiglpk.GLP_LO,
+        Relation.Less: swiglpk.GLP_UP
+    }
+
+    def __init__(self, **kwargs):
+        self._p = swiglpk.glp_create_prob()
+        swiglpk.glp_create_index(self._p)
+
+        self._smcp = swiglpk.glp_smcp()
+        swiglpk.glp_init_smcp(self._smcp)
+        self._smcp.msg_lev = swiglpk.GLP_MSG_OFF
+
+        # Use the dual simplex method (falling back to the primal simplex
+        # if it fails). On problems with large flux bounds (e.g. the scaled
+        # LP-10 problem of Fastcore) the primal simplex method can report
+        # feasible problems as infeasible. Changing variable bounds also
+        # keeps the previous basis dual feasible so the dual simplex method
+        # is better suited for solving again after such changes.
+        self._smcp.meth = swiglpk.GLP_DUALP
+        if 'feasibility_tolerance' in kwargs:
+            self._smcp.tol_bnd = kwargs['feasibility_tolerance']
+
+        self._iocp = swiglpk.glp_iocp()
+        swiglpk.glp_init_iocp(self._iocp)
+        self._iocp.msg_lev = swiglpk.GLP_MSG_OFF
+
+        # Tighten the integrality tolerance from the default. With big-M
+        # constraints (e.g. in tFBA) a binary variable that is only
+        # integral within the default tolerance can relax a constraint
+        # considerably.
+        self._iocp.tol_int = 1e-10
+
+        self._kwargs = kwargs
+        self._variables = {}
+        self._var_names = ('x'+str(i) for i in count(1))
+        self._var_expressions = {}
+        self._constr_names = ('c'+str(i) for i in count(1))
+        self._objective = {}
+        self._integer = False
+
+        self._result = None
+
+    def __del__(self):
+        # The module may already be unloaded at interpreter shutdown
+        if swiglpk is not None:
+            swiglpk.glp_delete_prob(self._p)
+
+    def _column_names(self):
+        """Return list of column names in the GLPK problem"""
+        return [swiglpk.glp_get_col_name(self._p, index) for index in
+                range(1, swiglpk.glp_get_num_cols(self._p) + 1)]
+
+    def _load_problem(self, variables):
+        """Set up the problem after the GLPK problem has been replaced
+
+        The variables are given as a dict of names to column names. This is
+        used when a problem is copied or read from a file.
+        """
+        swiglpk.glp_create_index(self._p)
+
+        self._variables = {
+            name: swiglpk.glp_find_col(self._p, col_name)
+            for name, col_name in variables.iteritems()}
+        self._var_names = _names_after('x', self._column_names())
+        self._var_expressions = {}
+        self._constr_names = _names_after('c', (
+            swiglpk.glp_get_row_name(self._p, index) or '' for index in
+            range(1, swiglpk.glp_get_num_rows(self._p) + 1)))
+        self._objective = {}
+        for index in range(1, swiglpk.glp_get_num_cols(self._p) + 1):
+            value = swiglpk.glp_get_obj_coef(self._p, index)
+            if value != 0:
+                self._objective[index] = value
+        self._integer = swiglpk.glp_get_num_int(self._p) > 0
+        self._result = None
+
+    @property
+    def glpk(self):
+        """The underlying GLPK problem object"""
+        return self._p
+
+    @_record_build
+    def define(self, *names, **kwargs):
+        """Define variable in the problem
+
+        Variables must be defined before they can be accessed by var() or set().
+        This function takes keyword arguments lower and upper to define the
+        bounds of the variable (default: -inf to inf). The keyword argument types can
+        be used to select the type of the variable (Continuous (default), Binary or Integer).
+        """
+
+        names = tuple(names)
+        lower = kwargs.get('lower', None)
+        upper = kwargs.get('upper', None)
+        vartype = kwargs.get('types', None)
+
+        # Repeat values if a scalar is given
+        if lower is None or isinstance(lower, numbers.Number):
+            lower = repeat(lower, len(names))
+        if upper is None or isinstance(upper, numbers.Number):
+            upper = repeat(upper, len(names))
+        if vartype is None or vartype in (VariableType.Continuous, VariableType.Binary,
+                                          VariableType.Integer):
+            vartype = repeat(vartype, len(names))
+
+        if len(names) == 0:
+            return
+
+        index = swiglpk.glp_add_cols(self._p, len(names))
+        for name, lower, upper, t in izip(names, lower, upper, vartype):
+            lp_name = next(self._var_names)
+            swiglpk.glp_set_col_name(self._p, index, lp_name)
+            t = VariableType.Continuous if t is None else t
+            if t == VariableType.Binary:
+                # Setting the kind to binary also sets the bounds to [0; 1]
+                swiglpk.glp_set_col_kind(self._p, index, self.VARTYPE_MAP[t])
+            else:
+                swiglpk.glp_set_col_bnds(
+                    self._p, index, *_bounds_args(lower, upper))
+                swiglpk.glp_set_col_kind(self._p, index, self.VARTYPE_MAP[t])
+            if t != VariableType.Continuous:
+                self._integer = True
+
+            self._variables[name] = index
+            index += 1
+
+    @_record_build
+    def set_bounds(self, *names, **kwargs):
+        """Change the bounds of defined variables
+
+        This takes the keyword arguments lower and upper in the same way as
+        define(). The remaining parts of the problem are left unchanged.
+        """
+
+        names = tuple(names)
+        lower = kwargs.get('lower', None)
+        upper = kwargs.get('upper', None)
+
+        # Repeat values if a scalar is given
+        if lower is None or isinstance(lower, numbers.Number):
+            lower = repeat(lower, len(names))
+        if upper is None or isinstance(upper, numbers.Number):
+            upper = repeat(upper, len(names))
+
+        for name, lower, upper in izip(names, lower, upper):
+            swiglpk.glp_set_col_bnds(
+                self._p, self._variables[name], *_bounds_args(lower, upper))
+
+    def var(self, name):
+        """Return the variable as an expression
+
+        The expression is cached so the same (shared) instance is returned
+        on every call for the same variable.
+        """
+        try:
+            return self._var_expressions[name]
+        except KeyError:
+            if name not in self._variables:
+                raise ValueError('Undefined variable: {}'.format(name))
+            expression = self._unit_expression(name)
+            self._var_expressions[name] = expression
+            return expression
+
+    def set(self, names):
+        """Return the set of variables as an expression"""
+        names = tuple(names)
+        if any(name not in self._variables for name in names):
+            raise ValueError('Undefined variables: {}'.format(set(names) - set(self._variables)))
+        return Expression({ VariableSet(names): 1 })
+
+    def _add_rows(self, rows):
+        """Add rows given as (sense, values, rhs)-tuples to the problem
+
+        Returns a list of constraints.
+        """
+        rows = list(rows)
+        if len(rows) == 0:
+            return []
+
+        constraints = []
+        index = swiglpk.glp_add_rows(self._p, len(rows))
+        for sense, values, rhs in rows:
+            name = next(self._constr_names)
+            swiglpk.glp_set_row_name(self._p, index, name)
+            swiglpk.glp_set_row_bnds(
+                self._p, index, self.ROW_BOUNDS_MAP[sense],
+                float(rhs), float(rhs))
+
+            values = list(values)
+            ind = swiglpk.intArray(len(values) + 1)
+            val = swiglpk.doubleArray(len(values) + 1)
+            for i, (variable, value) in enumerate(values, 1):
+                ind[i] = self._variables[variable]
+                val[i] = float(value)
+            swiglpk.glp_set_mat_row(self._p, index, len(values), ind, val)
+
+            constraints.append(Constraint(self, name))
+            index += 1
+
+        return constraints
+
+    @_record_build
+    def add_linear_constraints(self, *relations):
+        """Add constraints to the problem
+
+        Each constraint is represented by a Relation, and the
+        expression in that relation can be a set expression. Returns a
+        list of Constraint handles.
+        """
+        constraints = []
+        for relation in relations:
+            if isinstance(relation, bool):
+                # A bool in place of a relation is accepted to mean
+                # a relation that does not involve any variables and
+                # has therefore been evaluated to a truth-value (e.g
+                # '0 == 0' or '2 >= 3').
+                if not relation:
+                    raise ValueError('Unsatisfiable relation added')
+                constraints.append(Constraint(self, None))
+            else:
+                if relation.sense in (Relation.StrictlyGreater, Relation.StrictlyLess):
+                    raise ValueError('Strict relations are invalid in LP-problems: {}'.format(relation))
+
+                expression = relation.expression
+                constraints.extend(self._add_rows(
+                    (relation.sense, value_set, -expression.offset)
+                    for value_set in expression.value_sets()))
+
+        return constraints
+
+    @_record_build
+    def add_sparse_constraints(self, rows, columns, values, senses, rhs):
+        """Add constraints given as a sparse matrix in coordinate form
+
+        The rows are added to GLPK in one call and each row is then set
+        directly from the matrix entries. See
+        :meth:`psamm.lpsolver.lp.Problem.add_sparse_constraints`.
+        """
+        row_values, senses, rhs = self._sparse_rows(
+            rows, columns, values, senses, rhs)
+
+        return self._add_rows(
+            (sense, row.iteritems(), value)
+            for row, sense, value in izip(row_values, senses, rhs))
+
+    @_record_build
+    def set_linear_objective(self, expression):
+        """Set linear objective of problem
+
+        Only the coefficients that differ from the current objective are
+        changed in the GLPK problem.
+        """
+
+        if isinstance(expression, numbers.Number):
+            # Allow expressions with no variables as objective,
+            # represented as a number
+            expression = Expression()
+
+        objective = {}
+        for var, value in expression.values():
+            if var not in self._variables:
+                raise ValueError('Undefined variable: {}'.format(var))
+            if value != 0:
+                objective[self._variables[var]] = float(value)
+
+        for index in self._objective:
+            if index not in objective:
+                swiglpk.glp_set_obj_coef(self._p, index, 0.0)
+        for index, value in objective.iteritems():
+            if self._objective.get(index) != value:
+                swiglpk.glp_set_obj_coef(self._p, index, value)
+
+        self._objective = objective
+
+    def set_objective_sense(self, sense):
+        """Set type of problem (maximize or minimize)"""
+        if sense == ObjectiveSense.Minimize:
+            swiglpk.glp_set_obj_dir(self._p, swiglpk.GLP_MIN)
+        elif sense == ObjectiveSense.Maximize:
+            swiglpk.glp_set_obj_dir(self._p, swiglpk.GLP_MAX)
+        else:
+            raise ValueError('Invalid objective sense')
+
+    @_record_solve
+    def solve(self, sense=None):
+        """Solve problem
+
+        The simplex method starts from the basis of the previous solve. If
+        this basis is no longer valid (e.g. after constraints were deleted)
+        an advanced initial basis is constructed instead. The dual simplex
+        method is used, falling back to the primal simplex method if it
+        fails. Problems with integer variables are solved by branch and
+        bound starting from the LP relaxation.
+        """
+        if sense is not None:
+            self.set_objective_sense(sense)
+
+        ret = swiglpk.glp_simplex(self._p, self._smcp)
+        if ret in (swiglpk.GLP_EBADB, swiglpk.GLP_ESING, swiglpk.GLP_ECOND):
+            swiglpk.glp_adv_basis(self._p, 0)
+            ret = swiglpk.glp_simplex(self._p, self._smcp)
+
+        mip = False
+        if (self._integer and ret == 0 and
+                swiglpk.glp_get_status(self._p) == swiglpk.GLP_OPT):
+            mip = True
+            ret = swiglpk.glp_intopt(self._p, self._iocp)
+
+        self._result = Result(self, ret, mip)
+        return self._result
+
+    @property
+    def result(self):
+        return self._result
+
+    def get_size(self):
+        """Return the number of rows, columns and nonzeros of the problem"""
+        return (swiglpk.glp_get_num_rows(self._p),
+                swiglpk.glp_get_num_cols(self._p),
+                swiglpk.glp_get_num_nz(self._p))
+
+    def get_basis(self):
+        """Return the basis of the last solution
+
+        The basis is a pair of lists containing the status of each column and
+        each row.
+        """
+        cols = swiglpk.glp_get_num_cols(self._p)
+        rows = swiglpk.glp_get_num_rows(self._p)
+        return ([swiglpk.glp_get_col_stat(self._p, j)
+                 for j in xrange(1, cols + 1)],
+                [swiglpk.glp_get_row_stat(self._p, i)
+                 for i in xrange(1, rows + 1)])
+
+    @_record_build
+    def set_basis(self, basis):
+        """Set the starting basis of the next solve"""
+        if basis is None:
+            return
+
+        col_status, row_status = basis
+        if (len(col_status) != swiglpk.glp_get_num_cols(self._p) or
+                len(row_status) != swiglpk.glp_get_num_rows(self._p)):
+            raise ValueError('Basis does not match the problem size')
+
+        for j, status in enumerate(col_status, 1):
+            swiglpk.glp_set_col_stat(self._p, j, status)
+        for i, status in enumerate(row_status, 1):
+            swiglpk.glp_set_row_stat(self._p, i, status)
+
+    @_record_build
+    def copy(self):
+        """Return an independent copy of the problem
+
+        The GLPK problem is copied as a whole, see
+        :meth:`psamm.lpsolver.lp.Problem.copy`.
+        """
+        problem = Problem(**self._kwargs)
+        swiglpk.glp_copy_prob(problem._p, self._p, swiglpk.GLP_ON)
+        problem._load_problem({
+            name: swiglpk.glp_get_col_name(self._p, index)
+            for name, index in self._variables.iteritems()})
+        return problem
+
+    def write(self, path, format=None):
+        """Write the problem to a file in LP or MPS format
+
+        MPS files are written in the free format. See
+        :meth:`psamm.lpsolver.lp.Problem.write`.
+        """
+        format = _problem_format(path, format)
+        if format == 'mps':
+            ret = swiglpk.glp_write_mps(
+                self._p, swiglpk.GLP_MPS_FILE, None, path)
+        else:
+            ret = swiglpk.glp_write_lp(self._p, None, path)
+        if ret != 0:
+            raise IOError('Unable to write problem to {}'.format(path))
+
+        _write_names(path, {
+            name: swiglpk.glp_get_col_name(self._p, index)
+            for name, index in self._variables.iteritems()})
+
+
+class Constraint(BaseConstraint):
+    """Represents a constraint in a glpk.Problem"""
+
+    def __init__(self, prob, name):
+        self._prob = prob
+        self._name = name
+
+    def _index(self):
+        return swiglpk.glp_find_row(self._prob._p, self._name)
+
+    @_record_build
+    def delete(self):
+        """Remove constraint from problem"""
+        if self._name is not None:
+            num = swiglpk.intArray(2)
+            num[1] = self._index()
+            swiglpk.glp_del_rows(self._prob._p, 1, num)
+
+    @_record_build
+    def set_rhs(self, value):
+        """Change the right-hand side of the constraint"""
+        if self._name is None:
+            raise ValueError('Constraint without variables cannot be changed')
+        index = self._index()
+        bounds_type = swiglpk.glp_get_row_type(self._prob._p, index)
+        swiglpk.glp_set_row_bnds(
+            self._prob._p, index, bounds_type, float(value), float(value))
+
+
+class Result(BaseResult):
+    """Represents the solution to a glpk.Problem
+
+    This object will be returned from the glpk.Problem.solve() method or by
+    accessing the glpk.Problem.result property after solving a problem. This
+    class should not be instantiated manually.
+
+    Result will evaluate to a boolean according to the success of the
+    solution, so checking the truth value of the result will immediately
+    indicate whether solving was successful.
+
+    Reduced costs and dual values are available for continuous problems.
+    The sensitivity ranges of objective coefficients and right-hand sides
+    are not provided so these methods raise :class:`NotImplementedError`.
+    """
+
+    def __init__(self, prob, ret, mip):
+        self._problem = prob
+        self._ret = ret
+        self._mip = mip
+
+    def _check_valid(self):
+        if self._problem.result != self:
+            raise InvalidResultError()
+
+    def _get_status(self):
+        if self._mip:
+            return swiglpk.glp_mip_status(self._problem._p)
+        return swiglpk.glp_get_status(self._problem._p)
+
+    @property
+    def success(self):
+        """Return boolean indicating whether a solution was found"""
+        self._check_valid()
+        return self._ret == 0 and self._get_status() == swiglpk.GLP_OPT
+
+    @property
+    def status(self):
+        """Return string indicating the error encountered on failure"""
+        self._check_valid()
+        return 'Return code: {}, status: {}'.format(
+            self._ret, self._get_status())
+
+    def _get_column_value(self, name):
+        if name not in self._problem._variables:
+            raise ValueError('Unknown expression: {}'.format(name))
+        index = self._problem._variables[name]
+        if self._mip:
+            return swiglpk.glp_mip_col_val(self._problem._p, index)
+        return swiglpk.glp_get_col_prim(self._problem._p, index)
+
+    def get_value(self, expression):
+        """Return value of expression"""
+
+        self._check_valid()
+        if isinstance(expression, Expression):
+            return sum(self._get_column_value(var)*value
+                       for var, value in expression.values())
+        return self._get_column_value(expression)
+
+    def get_values(self, names):
+        """Return values of variables as a :class:`numpy.ndarray`"""
+
+        self._check_valid()
+        return numpy.array(
+            [self._get_column_value(name) for name in names], dtype=float)
+
+    def get_reduced_costs(self, names):
+        """Return reduced costs of variables as a :class:`numpy.ndarray`
+
+        Raises :class:`ValueError` if the problem was solved as a MIP.
+        """
+
+        self._check_valid()
+        if self._mip:
+            raise ValueError('Reduced costs are only available for LP problems')
+        costs = []
+        for name in names:
+            if name not in self._problem._variables:
+                raise ValueError('Unknown expression: {}'.format(name))
+            index = self._problem._variables[name]
+            costs.append(swiglpk.glp_get_col_dual(self._problem._p, index))
+        return numpy.array(costs, dtype=float)
+
+    def get_dual_values(self, constraints):
+        """Return dual values of constraints as a :class:`numpy.ndarray`
+
+        Raises :class:`ValueError` if the problem was solved as a MIP.
+        """
+
+        self._check_valid()
+        if self._mip:
+            raise ValueError('Dual values are only available for LP problems')
+        values = []
+        for constraint in constraints:
+            if constraint._name is None:
+                values.append(0.0)
+            else:
+                values.append(swiglpk.glp_get_row_dual(
+                    self._problem._p, constraint._index()))
+        return numpy.array(values, dtype=float)
+
+    def snapshot(self):
+        """Return copy of result that remains valid after solving again"""
+
+        self._check_valid()
+        values = {}
+        if self.success:
+            values = ((name, self._get_column_value(name))
+                      for name in self._problem._variables)
+        return SnapshotResult(self.success, self.status, values)
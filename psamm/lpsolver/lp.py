@@ -30,9 +30,17 @@ constructed faster.
 """
 
 import numbers
-from collections import Counter
+import operator
+import os
+import time
+import functools
+import json
+from collections import Counter, namedtuple
+from itertools import izip, count
 import abc
 
+import numpy
+
 
 class VariableSet(tuple):
     """A tuple used to represent sets of variables"""
@@ -62,6 +70,24 @@ class Expression(object):
     def __init__(self, variables={}, offset=0):
         self._variables = Counter(variables)
         self._offset = offset
+        self._shared = False
+
+    @classmethod
+    def sum(cls, terms):
+        """Return the sum of an iterable of expressions and numbers
+
+        This is equivalent to the built-in :func:`sum` but the terms are
+        accumulated in place in a single expression. The running time is
+        therefore linear in the total number of variables instead of
+        quadratic.
+
+        >>> str(Expression.sum(Expression({v: 1}) for v in 'xyz'))
+        'x + y + z'
+        """
+        expression = cls()
+        for term in terms:
+            expression += term
+        return expression
 
     @property
     def offset(self):
@@ -113,12 +139,38 @@ class Expression(object):
     def __radd__(self, other):
         return self + other
 
+    def __iadd__(self, other):
+        """Add expression with a number or another expression in-place
+
+        The expression is modified instead of creating a new expression.
+        Shared expressions (e.g. those returned by :meth:`Problem.var`) are
+        never modified; a new expression is returned instead.
+        """
+
+        if self._shared:
+            return self + other
+        elif isinstance(other, numbers.Number):
+            self._offset += other
+        elif isinstance(other, self.__class__):
+            self._variables.update(other._variables)
+            self._offset += other._offset
+        else:
+            return NotImplemented
+        return self
+
     def __sub__(self, other):
         return self + -other
 
     def __rsub__(self, other):
         return -self + other
 
+    def __isub__(self, other):
+        """Subtract number or expression in-place"""
+        if isinstance(other, (numbers.Number, self.__class__)):
+            self += -other
+            return self
+        return NotImplemented
+
     def __mul__(self, other):
         return self.__class__(
             {var: value*other for var, value in self._variables.iteritems()},
@@ -298,6 +350,17 @@ class Solver(object):
     def create_problem(self):
         """Create a new :class:`.Problem` instance"""
 
+    def read_problem(self, path, format=None):
+        """Create a new :class:`.Problem` instance from a file
+
+        The file must have been written by :meth:`Problem.write`. The format
+        is determined from the file name extension if it is not given. If the
+        names file written along with the problem is present, the variables
+        can be accessed using the same names as in the written problem.
+        Otherwise, the variables are named as in the file.
+        """
+        raise NotImplementedError('Solver does not support reading problems')
+
 
 class Problem(object):
     """Representation of LP Problem instance
@@ -325,14 +388,116 @@ class Problem(object):
         :class:`.VariableSet`.
         """
 
+    @abc.abstractmethod
+    def set_bounds(self, *names, **kwargs):
+        """Change the bounds of defined variables
+
+        This takes the keyword arguments lower and upper in the same way as
+        :meth:`define`. A bound that is None means that the variable is
+        unbounded in that direction.
+        """
+
     @abc.abstractmethod
     def add_linear_constraints(self, *relations):
         """Add constraints to the problem
 
         Each constraint is represented by a :class:`.Relation`, and the
         expression in that relation can be a set expression.
+
+        Returns a list of :class:`.Constraint` handles, one for each row
+        added to the problem. A set expression results in multiple rows.
         """
 
+    def add_sparse_constraints(self, rows, columns, values, senses, rhs):
+        """Add constraints given as a sparse matrix in coordinate form
+
+        The constraint matrix is given as three parallel sequences: the row
+        index, the column (a variable name defined in the problem) and the
+        coefficient of each non-zero entry. Duplicate entries are summed. The
+        relation sense and the right-hand side can either be given as a
+        single value applying to all rows or as a sequence with a value for
+        each row. If neither is a sequence, the number of rows is determined
+        from the largest row index. A matrix in compressed row form can be
+        converted to coordinate form before it is passed to this method.
+
+        Solver interfaces should override this method to add the constraints
+        using as few calls to the underlying solver as possible.
+
+        Returns a list of :class:`.Constraint` handles, one for each row.
+        """
+
+        row_values, senses, rhs = self._sparse_rows(
+            rows, columns, values, senses, rhs)
+
+        compare = {
+            Relation.Equals: operator.eq,
+            Relation.Greater: operator.ge,
+            Relation.Less: operator.le
+        }
+
+        relations = []
+        for row, sense, value in izip(row_values, senses, rhs):
+            if len(row) == 0:
+                relations.append(compare[sense](0, value))
+            else:
+                relations.append(Relation(sense, Expression(row, -value)))
+        return self.add_linear_constraints(*relations)
+
+    def _unit_expression(self, name):
+        """Return expression of a single variable for caching by var()
+
+        The expression is marked as shared which means that in-place
+        arithmetic will leave it unmodified. The solver interfaces use this
+        to return the same expression instance from :meth:`var` on every
+        call.
+        """
+        expression = Expression({name: 1})
+        expression._shared = True
+        return expression
+
+    def _sparse_rows(self, rows, columns, values, senses, rhs):
+        """Group sparse matrix entries by row
+
+        Returns a list of dictionaries of variable values (one for each row)
+        and lists of relation senses and right-hand sides of the same length.
+        """
+
+        rows = tuple(rows)
+        if not isinstance(senses, basestring):
+            senses = tuple(senses)
+        if not isinstance(rhs, numbers.Number):
+            rhs = tuple(rhs)
+
+        if isinstance(senses, tuple):
+            count = len(senses)
+        elif isinstance(rhs, tuple):
+            count = len(rhs)
+        else:
+            count = max(rows) + 1 if len(rows) > 0 else 0
+
+        # Repeat values if a scalar is given
+        if not isinstance(senses, tuple):
+            senses = (senses,) * count
+        if not isinstance(rhs, tuple):
+            rhs = (rhs,) * count
+
+        if len(senses) != count or len(rhs) != count:
+            raise ValueError('Length of senses and right-hand sides must'
+                             ' match the number of rows')
+
+        for sense in senses:
+            if sense not in (Relation.Equals, Relation.Greater,
+                             Relation.Less):
+                raise ValueError(
+                    'Invalid relation sense in LP-problems: {}'.format(sense))
+
+        row_values = [{} for _ in xrange(count)]
+        for row, column, value in izip(rows, columns, values):
+            row_dict = row_values[row]
+            row_dict[column] = row_dict.get(column, 0) + value
+
+        return row_values, senses, rhs
+
     @abc.abstractmethod
     def set_linear_objective(self, expression):
         """Set linear objective of the problem to the given
@@ -351,6 +516,166 @@ class Problem(object):
     def result(self):
         """Result of solved problem"""
 
+    def get_basis(self):
+        """Return the basis of the last solution
+
+        The basis is returned as a solver-specific object that can be passed
+        to :meth:`set_basis` to start a later solve from this basis. None is
+        returned if no basis is available, e.g. if the solver does not
+        provide access to the basis or the problem is a MILP.
+        """
+        return None
+
+    def set_basis(self, basis):
+        """Set the starting basis of the next solve
+
+        The basis must have been obtained from :meth:`get_basis` and the
+        number of variables and constraints must not have changed since. If
+        basis is None, the solver is free to choose a starting point.
+        """
+        if basis is not None:
+            raise NotImplementedError('Solver does not support basis access')
+
+    def get_size(self):
+        """Return the number of rows, columns and nonzeros of the problem
+
+        Any of the values can be None if the solver does not provide it.
+        """
+        return None, None, None
+
+    def copy(self):
+        """Return an independent copy of the problem
+
+        The copy contains the variables, constraints and objective of the
+        problem and can be modified and solved without affecting the
+        original. This is faster than building the same problem again.
+        Constraint handles refer to the problem that created them.
+        """
+        raise NotImplementedError('Solver does not support copying problems')
+
+    def write(self, path, format=None):
+        """Write the problem to a file in LP or MPS format
+
+        The format (``lp`` or ``mps``) is determined from the file name
+        extension if it is not given. The solver names the variables and
+        constraints in the file (e.g. ``x1`` and ``c1``). The mapping from
+        variable names in the problem to the names in the file is written to
+        a second file with the suffix ``.names``. This allows
+        :meth:`Solver.read_problem` to restore the problem with the original
+        variable names. The names file is a JSON file so only names that are
+        strings, numbers or tuples of these are kept; other variables are
+        named as in the problem file when it is read. Note that the objective
+        sense is not preserved by all solvers in MPS files.
+        """
+        raise NotImplementedError('Solver does not support writing problems')
+
+
+def _problem_format(path, format):
+    """Return file format of problem file (lp or mps)"""
+    if format is None:
+        format = os.path.splitext(path)[1][1:].lower()
+    if format not in ('lp', 'mps'):
+        raise ValueError('Invalid problem file format: {}'.format(format))
+    return format
+
+
+def _encode_name(name):
+    """Return variable name as a JSON value
+
+    Tuples are encoded as objects to distinguish them from lists. Raises
+    :class:`TypeError` if the name cannot be encoded.
+    """
+    if isinstance(name, tuple):
+        return {'tuple': [_encode_name(value) for value in name]}
+    if name is None or isinstance(name, (basestring, numbers.Number)):
+        return name
+    raise TypeError('Name cannot be written: {!r}'.format(name))
+
+
+def _decode_name(value):
+    """Return variable name from JSON value written by _encode_name"""
+    if isinstance(value, dict):
+        return tuple(_decode_name(item) for item in value['tuple'])
+    if isinstance(value, unicode):
+        try:
+            return str(value)
+        except UnicodeEncodeError:
+            return value
+    return value
+
+
+def _write_names(path, variables):
+    """Write names file for problem written to path
+
+    The variables are given as a dict of problem names to names in the file.
+    The file is a JSON list of pairs of the problem name and the name in the
+    file. Variables with names that cannot be encoded are left out.
+    """
+    pairs = []
+    for name, file_name in variables.iteritems():
+        try:
+            pairs.append([_encode_name(name), file_name])
+        except TypeError:
+            continue
+    with open(path + '.names', 'w') as f:
+        json.dump(pairs, f)
+
+
+def _read_names(path, file_names):
+    """Read names file for problem read from path
+
+    Returns a dict of problem names to the given names in the file. If the
+    names file does not exist the names in the file are used directly.
+    Variables that are missing from the names file are named as in the
+    problem file.
+    """
+    file_names = set(file_names)
+    try:
+        with open(path + '.names', 'r') as f:
+            pairs = json.load(f)
+    except IOError:
+        return {name: name for name in file_names}
+
+    variables = {}
+    for name, file_name in pairs:
+        file_name = str(file_name)
+        if file_name in file_names:
+            variables[_decode_name(name)] = file_name
+    for file_name in file_names.difference(variables.itervalues()):
+        variables[file_name] = file_name
+    return variables
+
+
+def _names_after(prefix, names):
+    """Return generator of new names that do not clash with names
+
+    The generator yields names of the form ``<prefix><n>`` with n larger than
+    any such number in the existing names.
+    """
+    start = 1
+    for name in names:
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            start = max(start, int(name[len(prefix):]) + 1)
+    return (prefix + str(i) for i in count(start))
+
+
+class Constraint(object):
+    """Handle of a constraint (a single row) in an LP problem
+
+    Handles are returned when constraints are added to a :class:`.Problem`
+    and can be used to modify the constraint after it has been added.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def delete(self):
+        """Remove constraint from the problem"""
+
+    @abc.abstractmethod
+    def set_rhs(self, value):
+        """Change the right-hand side of the constraint"""
+
 
 class InvalidResultError(Exception):
     """Raised when a result that has been invalidated is accessed"""
@@ -392,6 +717,233 @@ class Result(object):
         values from the result.
         """
 
+    def get_values(self, names):
+        """Get values of variables in result as a :class:`numpy.ndarray`
+
+        The values are returned in the order of the given names. This default
+        implementation calls :meth:`get_value` for each variable, but solvers
+        should override this to obtain all values in one call.
+        """
+        return numpy.array([self.get_value(name) for name in names])
+
+    def get_reduced_costs(self, names):
+        """Get reduced costs of variables as a :class:`numpy.ndarray`
+
+        The reduced cost of a variable is the rate of change of the
+        objective value when the variable is moved away from its bound. For a
+        variable that is fixed by its bounds this is the slope of the optimal
+        objective value as a function of the fixed value. Reduced costs are
+        only available for continuous problems and only from solvers that
+        provide dual information.
+        """
+        raise NotImplementedError(
+            'Solver does not provide reduced costs')
+
+    def get_dual_values(self, constraints):
+        """Get dual values of constraints as a :class:`numpy.ndarray`
+
+        The constraints are given as the :class:`.Constraint` handles
+        returned when the constraints were added. The dual value (shadow
+        price) of a constraint is the rate of change of the objective value
+        when the right-hand side of the constraint is increased. Dual values
+        are only available for continuous problems and only from solvers
+        that provide dual information.
+        """
+        raise NotImplementedError(
+            'Solver does not provide dual values')
+
+    def get_objective_ranges(self, names):
+        """Get ranges of objective coefficients of variables
+
+        Returns a :class:`numpy.ndarray` with a row for each variable giving
+        the lowest and highest value of the objective coefficient of the
+        variable where the current solution remains optimal. Infinite limits
+        are given as ``inf``.
+        """
+        raise NotImplementedError(
+            'Solver does not provide sensitivity ranges')
+
+    def get_rhs_ranges(self, constraints):
+        """Get ranges of right-hand sides of constraints
+
+        Returns a :class:`numpy.ndarray` with a row for each constraint
+        giving the lowest and highest value of the right-hand side of the
+        constraint where the current basis remains optimal, so the dual
+        values stay the same. Infinite limits are given as ``inf``.
+        """
+        raise NotImplementedError(
+            'Solver does not provide sensitivity ranges')
+
+    @abc.abstractmethod
+    def snapshot(self):
+        """Return a copy of the result that remains valid
+
+        The returned :class:`SnapshotResult` holds the values of all variables
+        so it can still be accessed after the problem is solved again.
+        """
+
+
+class SnapshotResult(Result):
+    """Result holding a copy of the values of all variables
+
+    Unlike results obtained directly from solving a problem, this result
+    stays valid when the problem is modified or solved again. Instances are
+    created by :meth:`Result.snapshot`.
+    """
+
+    def __init__(self, success, status, values):
+        self._success = success
+        self._status = status
+        self._values = dict(values)
+
+    @property
+    def success(self):
+        return self._success
+
+    @property
+    def status(self):
+        return self._status
+
+    def _get_variable_value(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise ValueError('Unknown expression: {}'.format(name))
+
+    def get_value(self, expression):
+        if isinstance(expression, Expression):
+            return sum(self._get_variable_value(var)*value
+                       for var, value in expression.values())
+        return self._get_variable_value(expression)
+
+    def get_values(self, names):
+        return numpy.array([self._get_variable_value(name) for name in names])
+
+    def snapshot(self):
+        return self
+
+
+SolveRecord = namedtuple(
+    'SolveRecord', ['wall_time', 'cpu_time', 'rows', 'columns', 'nonzeros'])
+"""Record of a single solve collected by :class:`SolverStatistics`
+
+The problem size (rows, columns and nonzeros) is None if the solver does not
+report it.
+"""
+
+
+class SolverStatistics(object):
+    """Statistics of problem construction and solves of all solvers
+
+    The solver backends report to the module-level instance :data:`statistics`
+    when it is enabled. The time spent constructing problems (creating
+    problems, defining variables, adding constraints and objectives, and
+    changing bounds, right-hand sides and bases) is accumulated in
+    :attr:`build_time`, and each solve is recorded as a :class:`SolveRecord`
+    in :attr:`solves`. Statistics are not collected while disabled (the
+    default) so the solvers are not slowed down. Only the current process is
+    recorded; problems built and solved in worker processes (e.g. of a
+    parallel flux variability analysis) are not included.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """Clear the collected statistics"""
+        self.build_time = 0.0
+        self.solves = []
+        self._build_depth = 0
+
+    @property
+    def solve_count(self):
+        """Number of solves recorded"""
+        return len(self.solves)
+
+    @property
+    def solve_wall_time(self):
+        """Total wall time spent in solves"""
+        return sum(record.wall_time for record in self.solves)
+
+    @property
+    def solve_cpu_time(self):
+        """Total CPU time spent in solves"""
+        return sum(record.cpu_time for record in self.solves)
+
+    def max_size(self):
+        """Return largest rows, columns and nonzeros of the solved problems"""
+        size = [None, None, None]
+        for record in self.solves:
+            for i, value in enumerate(record[2:]):
+                if value is not None and (size[i] is None or
+                                          value > size[i]):
+                    size[i] = value
+        return tuple(size)
+
+    def begin_build(self):
+        """Start timing of problem construction
+
+        Returns the start time to be passed to :meth:`end_build`. Nested
+        calls are only counted once.
+        """
+        self._build_depth += 1
+        return time.time()
+
+    def end_build(self, start):
+        """End timing of problem construction started at start"""
+        self._build_depth -= 1
+        if self._build_depth == 0:
+            self.build_time += time.time() - start
+
+    def begin_solve(self):
+        """Start timing of a solve
+
+        Returns the start times to be passed to :meth:`end_solve`.
+        """
+        return time.time(), time.clock()
+
+    def end_solve(self, start, problem):
+        """End timing of a solve of problem started at start"""
+        wall_start, cpu_start = start
+        wall_time = time.time() - wall_start
+        cpu_time = time.clock() - cpu_start
+        rows, columns, nonzeros = problem.get_size()
+        self.solves.append(
+            SolveRecord(wall_time, cpu_time, rows, columns, nonzeros))
+
+
+statistics = SolverStatistics()
+"""Instance of :class:`SolverStatistics` that all solvers report to"""
+
+
+def _record_build(func):
+    """Decorator for methods that count towards the problem build time"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not statistics.enabled:
+            return func(*args, **kwargs)
+        start = statistics.begin_build()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            statistics.end_build(start)
+    return wrapper
+
+
+def _record_solve(func):
+    """Decorator for the solve method of problems"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not statistics.enabled:
+            return func(self, *args, **kwargs)
+        start = statistics.begin_solve()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            statistics.end_solve(start, self)
+    return wrapper
+
 
 if __name__ == '__main__':
     import doctest
@@ -27,13 +27,16 @@ import qsoptex
 from .lp import Solver as BaseSolver
 from .lp import Problem as BaseProblem
 from .lp import Result as BaseResult
+from .lp import Constraint as BaseConstraint
 from .lp import (VariableSet, Expression, Relation,
-                    ObjectiveSense, VariableType, InvalidResultError)
+                    ObjectiveSense, VariableType, InvalidResultError,
+                    SnapshotResult, _record_build, _record_solve)
 
 
 class Solver(BaseSolver):
     """Represents an LP solver using QSopt_ex"""
 
+    @_record_build
     def create_problem(self, **kwargs):
         """Create a new LP-problem using the solver"""
         return Problem(**kwargs)
@@ -48,6 +51,10 @@ class Problem(BaseProblem):
 
         self._variables = {}
         self._var_names = ('x'+str(i) for i in count(1))
+        self._var_expressions = {}
+        self._bound_constraints = {}
+        self._constr_names = ('c'+str(i) for i in count(1))
+        self._objective = {}
 
         self._result = None
 
@@ -56,6 +63,7 @@ class Problem(BaseProblem):
         """The underlying qsoptex.ExactProblem object"""
         return self._p
 
+    @_record_build
     def define(self, *names, **kwargs):
         """Define variable in the problem
 
@@ -88,13 +96,69 @@ class Problem(BaseProblem):
         for name, lower, upper, t in izip(lp_names, lower, upper, vartype):
             if t != VariableType.Continuous:
                 raise ValueError('Solver does not support non-continuous types')
-            self._p.add_variable(0, lower, upper, name)
+            # Columns are free and the bounds are rows so they can be changed
+            self._p.add_variable(0, None, None, name)
+            self._bound_constraints[name] = [None, None]
+            self._set_bound_rows(name, lower, upper)
+
+    def _set_bound_rows(self, lp_name, lower, upper):
+        """Set the rows that bound the variable
+
+        The existing rows are replaced in the same way as
+        :meth:`Constraint.set_rhs`, and a row is deleted when the bound is
+        removed, so each variable has at most two bound rows.
+        """
+        constraints = self._bound_constraints[lp_name]
+        for i, (sense, value) in enumerate(
+                ((Relation.Greater, lower), (Relation.Less, upper))):
+            if constraints[i] is not None:
+                if value is not None:
+                    constraints[i].set_rhs(value)
+                    continue
+                constraints[i].delete()
+                constraints[i] = None
+            elif value is not None:
+                constraints[i] = self._add_row(sense, [(lp_name, 1)], value)
+
+    @_record_build
+    def set_bounds(self, *names, **kwargs):
+        """Change the bounds of defined variables
+
+        This takes the keyword arguments lower and upper in the same way as
+        define(). QSopt_ex does not provide a way of changing the bounds of
+        a column so the variables are defined as free columns and the bounds
+        are rows that are replaced when the bounds are changed. The bounds
+        can therefore be changed to any values, including relaxing them
+        beyond the bounds given when the variable was defined.
+        """
+
+        names = tuple(names)
+        lower = kwargs.get('lower', None)
+        upper = kwargs.get('upper', None)
+
+        # Repeat values if a scalar is given
+        if lower is None or isinstance(lower, numbers.Number):
+            lower = repeat(lower, len(names))
+        if upper is None or isinstance(upper, numbers.Number):
+            upper = repeat(upper, len(names))
+
+        for name, lower, upper in izip(names, lower, upper):
+            self._set_bound_rows(self._variables[name], lower, upper)
 
     def var(self, name):
-        """Return the variable as an expression"""
-        if name not in self._variables:
-            raise ValueError('Undefined variable: {}'.format(name))
-        return Expression({ name: 1 })
+        """Return the variable as an expression
+
+        The expression is cached so the same (shared) instance is returned
+        on every call for the same variable.
+        """
+        try:
+            return self._var_expressions[name]
+        except KeyError:
+            if name not in self._variables:
+                raise ValueError('Undefined variable: {}'.format(name))
+            expression = self._unit_expression(name)
+            self._var_expressions[name] = expression
+            return expression
 
     def set(self, names):
         """Return the set of variables as an expression"""
@@ -103,12 +167,22 @@ class Problem(BaseProblem):
             raise ValueError('Undefined variables: {}'.format(set(names) - set(self._variables)))
         return Expression({ VariableSet(names): 1 })
 
+    def _add_row(self, sense, values, rhs):
+        """Add a named row to the problem and return the constraint"""
+        name = next(self._constr_names)
+        values = list(values)
+        self._p.add_linear_constraint(sense, values, rhs, name)
+        return Constraint(self, name, sense, values)
+
+    @_record_build
     def add_linear_constraints(self, *relations):
         """Add constraints to the problem
 
         Each constraint is represented by a Relation, and the
-        expression in that relation can be a set expression.
+        expression in that relation can be a set expression. Returns a
+        list of Constraint handles.
         """
+        constraints = []
         for relation in relations:
             if isinstance(relation, bool):
                 # A bool in place of a relation is accepted to mean
@@ -117,25 +191,70 @@ class Problem(BaseProblem):
                 # '0 == 0' or '2 >= 3').
                 if not relation:
                     raise ValueError('Unsatisfiable relation added')
+                constraints.append(Constraint(self, None, None, None))
             else:
                 if relation.sense in (Relation.StrictlyGreater, Relation.StrictlyLess):
                     raise ValueError('Strict relations are invalid in LP-problems: {}'.format(relation))
 
                 expression = relation.expression
-                pairs = []
                 for value_set in expression.value_sets():
                     values = ((self._variables[variable], value) for variable, value in value_set)
-                    self._p.add_linear_constraint(relation.sense, values, -expression.offset)
+                    constraints.append(self._add_row(
+                        relation.sense, values, -expression.offset))
+
+        return constraints
 
+    @_record_build
+    def add_sparse_constraints(self, rows, columns, values, senses, rhs):
+        """Add constraints given as a sparse matrix in coordinate form
+
+        Each row is passed directly to QSopt_ex without building an
+        intermediate expression. See
+        :meth:`psamm.lpsolver.lp.Problem.add_sparse_constraints`.
+        """
+        row_values, senses, rhs = self._sparse_rows(
+            rows, columns, values, senses, rhs)
+
+        constraints = []
+        for row, sense, value in izip(row_values, senses, rhs):
+            values = ((self._variables[variable], v)
+                      for variable, v in row.iteritems())
+            constraints.append(self._add_row(sense, values, value))
+
+        return constraints
+
+    @_record_build
     def set_linear_objective(self, expression):
-        """Set linear objective of problem"""
+        """Set linear objective of problem
+
+        Only the coefficients that differ from the current objective are
+        passed to the solver so the cost does not depend on the total
+        number of variables in the problem.
+        """
 
         if isinstance(expression, numbers.Number):
             # Allow expressions with no variables as objective,
             # represented as a number
             expression = Expression()
 
-        self._p.set_linear_objective((lp_name, expression.value(var)) for var, lp_name in self._variables.iteritems())
+        objective = {}
+        for var, value in expression.values():
+            if var not in self._variables:
+                raise ValueError('Undefined variable: {}'.format(var))
+            if value != 0:
+                objective[self._variables[var]] = value
+
+        # Clear coefficients that are no longer in the objective and
+        # update the coefficients that have changed.
+        changes = [(lp_name, 0) for lp_name in self._objective
+                   if lp_name not in objective]
+        changes.extend((lp_name, value)
+                       for lp_name, value in objective.iteritems()
+                       if self._objective.get(lp_name) != value)
+        if len(changes) > 0:
+            self._p.set_linear_objective(changes)
+
+        self._objective = objective
 
     def set_objective_sense(self, sense):
         """Set type of problem (maximize or minimize)"""
@@ -146,6 +265,7 @@ class Problem(BaseProblem):
         else:
             raise ValueError('Invalid objective sense')
 
+    @_record_solve
     def solve(self, sense=None):
         """Solve problem"""
         if sense is not None:
@@ -159,6 +279,36 @@ class Problem(BaseProblem):
     def result(self):
         return self._result
 
+
+class Constraint(BaseConstraint):
+    """Represents a constraint in a qsoptex.Problem"""
+
+    def __init__(self, prob, name, sense, values):
+        self._prob = prob
+        self._name = name
+        self._sense = sense
+        self._values = values
+
+    @_record_build
+    def delete(self):
+        """Remove constraint from problem"""
+        if self._name is not None:
+            self._prob._p.delete_linear_constraint(self._name)
+
+    @_record_build
+    def set_rhs(self, value):
+        """Change the right-hand side of the constraint
+
+        QSopt_ex does not provide a way of changing the right-hand side so
+        the row is replaced by a new row with the same name.
+        """
+        if self._name is None:
+            raise ValueError('Constraint without variables cannot be changed')
+        self._prob._p.delete_linear_constraint(self._name)
+        self._prob._p.add_linear_constraint(
+            self._sense, self._values, value, self._name)
+
+
 class Result(BaseResult):
     """Represents the solution to a qsoptex.Problem
 
@@ -169,6 +319,10 @@ class Result(BaseResult):
     Result will evaluate to a boolean according to the success of the
     solution, so checking the truth value of the result will immediately
     indicate whether solving was successful.
+
+    Only the values of the variables are available. QSopt_ex does not
+    provide reduced costs, dual values or sensitivity ranges so these
+    methods raise :class:`NotImplementedError`.
     """
 
     def __init__(self, prob):
@@ -199,3 +353,13 @@ class Result(BaseResult):
         elif expression not in self._problem._variables:
             raise ValueError('Unknown expression: {}'.format(expression))
         return self._problem._p.get_value(self._problem._variables[expression])
+
+    def snapshot(self):
+        """Return copy of result that remains valid after solving again"""
+
+        self._check_valid()
+        values = {}
+        if self.success:
+            values = ((name, self._problem._p.get_value(lp_name))
+                      for name, lp_name in self._problem._variables.iteritems())
+        return SnapshotResult(self.success, self.status, values)
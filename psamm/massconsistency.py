@@ -58,16 +58,20 @@ def is_consistent(database, solver, exchange=set(), zeromass=set()):
             prob.define(('m', compound), lower=0, upper=0)
 
     prob.set_linear_objective(
-        sum(prob.var(('m', compound)) for compound in compound_set))
+        lp.Expression.sum(prob.var(('m', compound))
+                          for compound in compound_set))
 
     # Define constraints
-    massbalance_lhs = { reaction: 0 for reaction in database.reactions }
+    reaction_index = {}
+    rows, columns, values = [], [], []
     for spec, value in database.matrix.iteritems():
         compound, reaction = spec
-        massbalance_lhs[reaction] += prob.var(('m', compound.in_compartment(None))) * value
-    for reaction, lhs in massbalance_lhs.iteritems():
         if reaction not in exchange:
-            prob.add_linear_constraints(lhs == 0)
+            rows.append(reaction_index.setdefault(
+                reaction, len(reaction_index)))
+            columns.append(('m', compound.in_compartment(None)))
+            values.append(value)
+    prob.add_sparse_constraints(rows, columns, values, lp.Relation.Equals, 0)
 
     result = prob.solve(lp.ObjectiveSense.Minimize)
     return result.success
@@ -104,26 +108,31 @@ def check_reaction_consistency(database, solver, exchange=set(),
                 lower=0)
     prob.define(*(('r', reaction_id) for reaction_id in database.reactions))
 
-    objective = sum(prob.var(('z', reaction_id)) * weights.get(reaction_id, 1)
-                    for reaction_id in database.reactions)
+    objective = lp.Expression.sum(
+        prob.var(('z', reaction_id)) * weights.get(reaction_id, 1)
+        for reaction_id in database.reactions)
     prob.set_linear_objective(objective)
 
     r = prob.set(('r', reaction_id) for reaction_id in database.reactions)
     z = prob.set(('z', reaction_id) for reaction_id in database.reactions)
     prob.add_linear_constraints(z >= r, r >= -z)
 
-    massbalance_lhs = { reaction_id: 0 for reaction_id in database.reactions }
+    reaction_index = {}
+    rows, columns, values = [], [], []
+    for reaction_id in database.reactions:
+        if reaction_id not in exchange and reaction_id not in checked:
+            rows.append(reaction_index.setdefault(
+                reaction_id, len(reaction_index)))
+            columns.append(('r', reaction_id))
+            values.append(1)
     for spec, value in database.matrix.iteritems():
         compound, reaction_id = spec
-        mass_var = prob.var(('m', compound.in_compartment(None)))
-        massbalance_lhs[reaction_id] += value * mass_var
-    for reaction_id, lhs in massbalance_lhs.iteritems():
         if reaction_id not in exchange:
-            if reaction_id not in checked:
-                residual = prob.var(('r', reaction_id))
-                prob.add_linear_constraints(lhs + residual == 0)
-            else:
-                prob.add_linear_constraints(lhs == 0)
+            rows.append(reaction_index.setdefault(
+                reaction_id, len(reaction_index)))
+            columns.append(('m', compound.in_compartment(None)))
+            values.append(value)
+    prob.add_sparse_constraints(rows, columns, values, lp.Relation.Equals, 0)
 
     # Solve
     result = prob.solve(lp.ObjectiveSense.Minimize)
@@ -170,21 +179,23 @@ def check_compound_consistency(database, solver, exchange=set(),
     # Define z variables
     prob.define(*(('z', compound) for compound in compound_set),
                 lower=0, upper=1)
-    prob.set_linear_objective(sum(prob.var(('z', compound))
-                              for compound in compound_set))
+    prob.set_linear_objective(lp.Expression.sum(
+        prob.var(('z', compound)) for compound in compound_set))
 
     z = prob.set(('z', compound) for compound in compound_set)
     m = prob.set(('m', compound) for compound in compound_set)
     prob.add_linear_constraints(m >= z)
 
-    massbalance_lhs = { reaction_id: 0 for reaction_id in database.reactions }
+    reaction_index = {}
+    rows, columns, values = [], [], []
     for spec, value in database.matrix.iteritems():
         compound, reaction_id = spec
-        mass_var = prob.var(('m', compound.in_compartment(None)))
-        massbalance_lhs[reaction_id] += value * mass_var
-    for reaction_id, lhs in massbalance_lhs.iteritems():
         if reaction_id not in exchange:
-            prob.add_linear_constraints(lhs == 0)
+            rows.append(reaction_index.setdefault(
+                reaction_id, len(reaction_index)))
+            columns.append(('m', compound.in_compartment(None)))
+            values.append(value)
+    prob.add_sparse_constraints(rows, columns, values, lp.Relation.Equals, 0)
 
     # Solve
     result = prob.solve(lp.ObjectiveSense.Maximize)
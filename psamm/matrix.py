@@ -0,0 +1,102 @@
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+"""Utilities for the stoichiometric matrix of a model
+
+The stoichiometric matrix is built either in coordinate form, for adding
+the mass balance constraints to an LP problem, or as a dense array where
+e.g. the nullspace can be found.
+"""
+
+from itertools import izip
+
+import numpy
+
+from .lpsolver import lp
+
+
+def mass_balance_entries(entries, var_prefix='v'):
+    """Return the mass balance matrix in coordinate form
+
+    The entries argument is an iterable of ((compound, reaction), value)
+    pairs, e.g. the ``matrix.iteritems()`` of a model. There is one row for
+    each compound in the order that the compounds first appear, and the
+    column of each entry is the variable name ``(var_prefix, reaction)``.
+
+    Returns:
+        Tuple of the lists of row indices, variable names and values, and
+        the list of compounds of the rows.
+    """
+    compound_index = {}
+    compounds = []
+    rows, columns, values = [], [], []
+    for (compound, reaction_id), value in entries:
+        row = compound_index.get(compound)
+        if row is None:
+            row = compound_index[compound] = len(compounds)
+            compounds.append(compound)
+        rows.append(row)
+        columns.append((var_prefix, reaction_id))
+        values.append(value)
+    return rows, columns, values, compounds
+
+
+def add_mass_balance(prob, model, var_prefix='v', sense=lp.Relation.Equals):
+    """Add mass balance constraints of the model to the LP problem
+
+    A constraint is added for each compound keeping the sum of the fluxes
+    times the stoichiometric values at zero (or in the given relation to
+    zero). The flux of each reaction is the variable
+    ``(var_prefix, reaction)`` which must be defined in the problem.
+
+    Returns:
+        Dictionary of constraint handles of the compounds.
+    """
+    rows, columns, values, compounds = mass_balance_entries(
+        model.matrix.iteritems(), var_prefix)
+    constraints = prob.add_sparse_constraints(
+        rows, columns, values, sense, 0)
+    return dict(zip(compounds, constraints))
+
+
+def stoichiometric_matrix(entries, reactions):
+    """Return the stoichiometric matrix as a dense array
+
+    The entries argument is an iterable of ((compound, reaction), value)
+    pairs. The matrix has one column for each reaction in the order of
+    reactions and one row for each compound in the order that the
+    compounds first appear. Entries of other reactions are ignored.
+    """
+    reaction_index = dict((reaction_id, i)
+                          for i, reaction_id in enumerate(reactions))
+    rows, columns, values, compounds = mass_balance_entries(entries)
+
+    matrix = numpy.zeros((len(compounds), len(reactions)))
+    for row, (_, reaction_id), value in izip(rows, columns, values):
+        if reaction_id in reaction_index:
+            matrix[row, reaction_index[reaction_id]] = value
+    return matrix
+
+
+def nullspace(matrix):
+    """Return an orthonormal basis of the nullspace of matrix as columns"""
+    if matrix.shape[0] == 0:
+        return numpy.eye(matrix.shape[1])
+    _, s, vh = numpy.linalg.svd(matrix)
+    tolerance = max(matrix.shape) * numpy.finfo(float).eps * s[0]
+    rank = numpy.sum(s > tolerance)
+    return vh[rank:].T
@@ -432,6 +432,11 @@ class FlipableStoichiometricMatrixView(StoichiometricMatrixView):
         compound, reaction = key
         return self._value_mul(reaction) * super(FlipableStoichiometricMatrixView, self).__getitem__(key)
 
+    def iteritems(self):
+        for key, value in super(
+                FlipableStoichiometricMatrixView, self).iteritems():
+            yield key, self._value_mul(key[1]) * value
+
 
 class FlipableLimitsView(LimitsView):
     """Provides a limits view that flips with the underlying flipable model view
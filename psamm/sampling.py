@@ -0,0 +1,284 @@
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+"""Sampling of the flux space using artificial centering hit-and-run
+
+The flux space of a model (the fluxes that are within the flux bounds and
+keep every compound at steady state) is sampled using the artificial
+centering hit-and-run (ACHR) random walk. Warm-up points are first found by
+minimizing and maximizing the flux of each reaction with LP. Each step of the
+walk then moves from the current point in the direction from the center of
+the points seen so far to a random warm-up point. The step length is drawn
+uniformly from the segment of this line that is within the flux bounds. All
+the points on the line are at steady state so no LP problems are solved
+during the walk, and each step is a few vector operations on the flux
+vector.
+
+Independent chains can be run in worker processes and the samples can be
+written to a ``.npy`` file that is memory-mapped so all the samples do not
+have to be kept in memory.
+"""
+
+import logging
+import multiprocessing
+
+import numpy
+
+from .fluxanalysis import FluxBalanceProblem
+from . import matrix
+
+# Module-level logging
+logger = logging.getLogger(__name__)
+
+# Directions and distances smaller than this are ignored
+_EPSILON = 1e-9
+
+
+def _flux_bounds(model, reactions, fixed):
+    """Return arrays of lower and upper flux bounds of reactions
+
+    The fixed dictionary gives additional lower bounds.
+    """
+    lower = numpy.array(
+        [model.limits[reaction_id].lower for reaction_id in reactions],
+        dtype=float)
+    upper = numpy.array(
+        [model.limits[reaction_id].upper for reaction_id in reactions],
+        dtype=float)
+
+    for i, reaction_id in enumerate(reactions):
+        if reaction_id in fixed:
+            lower[i] = max(lower[i], fixed[reaction_id])
+            if lower[i] > upper[i]:
+                raise ValueError(
+                    'Fixed flux of {} is above the upper bound'.format(
+                        reaction_id))
+
+    return lower, upper
+
+
+def warmup_points(model, reactions, lower, upper, solver):
+    """Return array of warm-up points of the flux space
+
+    The points are the solutions found when minimizing and maximizing the
+    flux of each reaction with the given bounds, with one row for each
+    point and one column for each reaction. The points are clipped to the
+    bounds to remove solver tolerances.
+    """
+    fba = FluxBalanceProblem(model, solver)
+    for reaction_id, value_lower, value_upper in zip(reactions, lower, upper):
+        fba.set_flux_bounds(reaction_id, value_lower, value_upper)
+
+    points = numpy.empty((2 * len(reactions), len(reactions)))
+    for i, reaction_id in enumerate(reactions):
+        fba.solve(reaction_id)
+        points[2*i] = fba.get_fluxes(reactions)
+        fba.solve({reaction_id: -1})
+        points[2*i+1] = fba.get_fluxes(reactions)
+
+    return numpy.clip(points, lower, upper)
+
+
+def _achr_chain(warmup, lower, upper, nullspace, count, thinning, seed,
+                walkers=100):
+    """Yield count points of an ACHR random walk
+
+    A block of walkers is moved at the same time so each step is a few
+    matrix operations on the block. The walkers start at the center of the
+    warm-up points and share the center, which is updated with the points
+    of all walkers. After every thinning steps each walker yields a point.
+    The warm-up points are projected on the nullspace of the stoichiometric
+    matrix so every direction keeps the points in the steady state, and the
+    step length keeps the points within the bounds. The points are
+    therefore yielded without any correction.
+    """
+    rng = numpy.random.RandomState(seed)
+
+    warmup = warmup.dot(nullspace).dot(nullspace.T)
+    center = warmup.mean(axis=0)
+    points = numpy.tile(center, (min(walkers, max(count, 1)), 1))
+    steps = len(warmup)
+    remaining = count
+
+    while remaining > 0:
+        for _ in xrange(thinning):
+            directions = (
+                warmup[rng.randint(len(warmup), size=len(points))] - center)
+            fixed = numpy.abs(directions) <= _EPSILON
+
+            # Range of the step length that keeps each point within bounds
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                to_lower = (lower - points) / directions
+                to_upper = (upper - points) / directions
+            alpha_min = numpy.where(
+                fixed, -numpy.inf,
+                numpy.minimum(to_lower, to_upper)).max(axis=1)
+            alpha_max = numpy.where(
+                fixed, numpy.inf,
+                numpy.maximum(to_lower, to_upper)).min(axis=1)
+
+            valid = numpy.isfinite(alpha_min) & numpy.isfinite(alpha_max)
+            valid &= alpha_max - alpha_min > _EPSILON
+            alpha = numpy.zeros(len(points))
+            alpha[valid] = rng.uniform(alpha_min[valid], alpha_max[valid])
+            points += alpha[:, numpy.newaxis] * directions
+
+            steps += len(points)
+            center += (points.sum(axis=0) - len(points) * center) / steps
+
+        for point in points[:remaining]:
+            yield point
+        remaining -= len(points)
+
+
+# Sampling problem of the current worker process
+_worker_problem = None
+
+
+def _sample_worker_init(warmup, lower, upper, nullspace, thinning, output):
+    """Store the sampling problem of a worker process"""
+    global _worker_problem
+    _worker_problem = warmup, lower, upper, nullspace, thinning, output
+
+
+def _sample_worker_run(task):
+    """Run a chain in a worker process
+
+    The samples are written to the output file at the rows of the chain and
+    None is returned, or if there is no output file the samples are returned
+    as an array.
+    """
+    seed, start, count = task
+    warmup, lower, upper, nullspace, thinning, output = _worker_problem
+    if output is not None:
+        samples = numpy.load(output, mmap_mode='r+')
+        rows = samples[start:start+count]
+    else:
+        rows = numpy.empty((count, len(lower)))
+
+    for i, point in enumerate(_achr_chain(
+            warmup, lower, upper, nullspace, count, thinning, seed)):
+        rows[i] = point
+
+    if output is not None:
+        samples.flush()
+        del samples
+        return None
+    return rows
+
+
+def _chain_tasks(samples, chains, rng):
+    """Return list of seed, start row and count of each chain"""
+    tasks = []
+    start = 0
+    for i in range(chains):
+        count = samples // chains + (1 if i < samples % chains else 0)
+        if count > 0:
+            tasks.append((rng.randint(2**31 - 1), start, count))
+        start += count
+    return tasks
+
+
+def sample(model, solver, samples, fixed={}, thinning=100, output=None,
+           parallel=None, seed=None):
+    """Sample the flux space of the model using ACHR
+
+    The warm-up points are found using the LP solver and the samples are
+    then generated without solving LP problems. If parallel is larger than
+    one, the samples are split between the same number of independent
+    chains that are run by a pool of worker processes. The chains start at
+    the center of the warm-up points and each chain is written to
+    consecutive rows of the result.
+
+    If output is given, the samples are written to a ``.npy`` file with
+    that name as they are generated and the result is a read-only
+    memory-mapped array of the file. Otherwise the samples are returned in
+    an array in memory.
+
+    Args:
+        model: MetabolicModel to sample.
+        solver: LP solver instance to use for the warm-up points.
+        samples: Number of samples to generate.
+        fixed: dict of additional lower bounds on reaction fluxes.
+        thinning: Number of steps between each sample.
+        output: File name of ``.npy`` file to write the samples to.
+        parallel: Number of chains to run in worker processes.
+        seed: Seed of the random number generator.
+
+    Returns:
+        Tuple of the list of reaction IDs and an array of samples with one
+        row for each sample and one column for each reaction in the order
+        of the list.
+    """
+
+    if samples < 0:
+        raise ValueError('Invalid number of samples: {}'.format(samples))
+    if thinning < 1:
+        raise ValueError('Invalid thinning: {}'.format(thinning))
+
+    reactions = sorted(model.reactions)
+    lower, upper = _flux_bounds(model, reactions, fixed)
+
+    logger.info('Finding warm-up points of {} reactions...'.format(
+        len(reactions)))
+    warmup = warmup_points(model, reactions, lower, upper, solver)
+    nullspace = matrix.nullspace(matrix.stoichiometric_matrix(
+        model.matrix.iteritems(), reactions))
+
+    chains = 1 if parallel is None or parallel <= 1 else parallel
+    rng = numpy.random.RandomState(seed)
+    tasks = _chain_tasks(samples, chains, rng)
+
+    if output is not None:
+        result = numpy.lib.format.open_memmap(
+            output, mode='w+', dtype=float, shape=(samples, len(reactions)))
+        result.flush()
+        if chains > 1:
+            # Workers write to the file directly
+            del result
+    else:
+        result = numpy.empty((samples, len(reactions)))
+
+    logger.info('Sampling {} points in {} chains...'.format(
+        samples, len(tasks)))
+    if chains == 1:
+        for chain_seed, start, count in tasks:
+            for i, point in enumerate(_achr_chain(
+                    warmup, lower, upper, nullspace, count, thinning,
+                    chain_seed)):
+                result[start+i] = point
+    else:
+        pool = multiprocessing.Pool(
+            min(chains, max(1, len(tasks))), _sample_worker_init,
+            (warmup, lower, upper, nullspace, thinning, output))
+        try:
+            for (_, start, count), rows in zip(
+                    tasks, pool.imap(_sample_worker_run, tasks)):
+                if rows is not None:
+                    result[start:start+count] = rows
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    if output is not None:
+        if chains == 1:
+            result.flush()
+            del result
+        result = numpy.load(output, mmap_mode='r')
+
+    return reactions, result
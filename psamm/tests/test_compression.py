@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+import math
+import unittest
+
+from psamm.metabolicmodel import MetabolicModel
+from psamm.database import DictDatabase
+from psamm import compression, fluxanalysis, fastcore
+from psamm.datasource.modelseed import parse_reaction
+from psamm.reaction import Reaction, Compound
+
+try:
+    from psamm.lpsolver import cplex
+except ImportError:
+    cplex = None
+
+requires_solver = unittest.skipIf(cplex is None, 'solver not available')
+
+
+@requires_solver
+class TestCompressModel(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> (2) |A|'))
+        self.database.set_reaction('rxn_2', parse_reaction('|A| <=> |B|'))
+        self.database.set_reaction('rxn_3', parse_reaction('|A| => |D|'))
+        self.database.set_reaction('rxn_4', parse_reaction('|A| => |C|'))
+        self.database.set_reaction('rxn_5', parse_reaction('|C| => |D|'))
+        self.database.set_reaction('rxn_6', parse_reaction('|D| =>'))
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        self.solver = cplex.Solver()
+
+    def test_compress_model_blocked(self):
+        compressed = compression.compress_model(
+            self.model, self.solver, keep=['rxn_6'])
+        self.assertEqual(compressed.blocked, {'rxn_2'})
+        self.assertIsNone(compressed.lumped_reaction('rxn_2'))
+
+    def test_compress_model_lumped_reactions(self):
+        compressed = compression.compress_model(
+            self.model, self.solver, keep=['rxn_6'])
+        self.assertEqual(set(compressed.model.reactions),
+                         {'rxn_1', 'rxn_3', 'rxn_4', 'rxn_6'})
+        self.assertEqual(
+            compressed.members('rxn_4'), {'rxn_4': 1.0, 'rxn_5': 1.0})
+        self.assertEqual(compressed.lumped_reaction('rxn_5'), ('rxn_4', 1.0))
+        self.assertEqual(tuple(compressed.model.limits['rxn_4']), (0, 1000))
+        self.assertEqual(
+            compressed.expand_reactions(['rxn_4']), {'rxn_4', 'rxn_5'})
+
+    def test_compress_model_keeps_exchange_reactions(self):
+        compressed = compression.compress_model(
+            self.model, self.solver, keep=['rxn_6'])
+        self.assertTrue(compressed.model.is_exchange('rxn_1'))
+        self.assertTrue(compressed.model.is_exchange('rxn_6'))
+        self.assertFalse(compressed.model.is_exchange('rxn_4'))
+
+    def test_compress_model_flux_balance(self):
+        compressed = compression.compress_model(
+            self.model, self.solver, keep=['rxn_6'])
+        fluxes = compressed.expand_fluxes(fluxanalysis.flux_balance(
+            compressed.model, 'rxn_6', tfba=False, solver=self.solver))
+        self.assertEqual(set(fluxes), set(self.model.reactions))
+        self.assertAlmostEqual(fluxes['rxn_1'], 500)
+        self.assertAlmostEqual(fluxes['rxn_2'], 0)
+        self.assertAlmostEqual(fluxes['rxn_6'], 1000)
+        self.assertAlmostEqual(fluxes['rxn_4'], fluxes['rxn_5'])
+        self.assertAlmostEqual(fluxes['rxn_3'] + fluxes['rxn_5'], 1000)
+
+    def test_compress_model_tfba(self):
+        compressed = compression.compress_model(
+            self.model, self.solver, keep=['rxn_6'])
+        fluxes = compressed.expand_fluxes(fluxanalysis.flux_balance(
+            compressed.model, 'rxn_6', tfba=True, solver=self.solver))
+        self.assertAlmostEqual(fluxes['rxn_6'], 1000)
+
+    def test_compress_model_flux_variability(self):
+        compressed = compression.compress_model(
+            self.model, self.solver, keep=['rxn_6'])
+        bounds = compressed.expand_bounds(fluxanalysis.flux_variability(
+            compressed.model, compressed.model.reactions, {'rxn_6': 1000},
+            tfba=False, solver=self.solver))
+        expected = dict(fluxanalysis.flux_variability(
+            self.model, self.model.reactions, {'rxn_6': 1000},
+            tfba=False, solver=self.solver))
+        self.assertEqual(set(bounds), set(expected))
+        for reaction_id, (lower, upper) in expected.iteritems():
+            self.assertAlmostEqual(bounds[reaction_id][0], lower)
+            self.assertAlmostEqual(bounds[reaction_id][1], upper)
+
+    def test_compress_model_fastcc(self):
+        compressed = compression.compress_model(self.model, self.solver)
+        self.assertEqual(
+            set(fastcore.fastcc(compressed.model, 0.001, self.solver)),
+            set())
+
+    def test_compress_model_keep_missing_reaction(self):
+        with self.assertRaises(ValueError):
+            compression.compress_model(
+                self.model, self.solver, keep=['rxn_7'])
+
+
+@requires_solver
+class TestCompressReversedChain(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> |A|'))
+        self.database.set_reaction('rxn_2', parse_reaction('|B| <=> |A|'))
+        self.database.set_reaction('rxn_3', parse_reaction('|B| =>'))
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        self.model.limits['rxn_2'].lower = -100
+        self.solver = cplex.Solver()
+
+    def test_compress_reversed_chain(self):
+        compressed = compression.compress_model(
+            self.model, self.solver, keep=['rxn_3'])
+        self.assertEqual(set(compressed.model.reactions), {'rxn_3'})
+        self.assertEqual(compressed.members('rxn_3'), {
+            'rxn_1': 1.0, 'rxn_2': -1.0, 'rxn_3': 1.0})
+        self.assertEqual(tuple(compressed.model.limits['rxn_3']), (0, 100))
+
+        fluxes = compressed.expand_fluxes(fluxanalysis.flux_balance(
+            compressed.model, 'rxn_3', tfba=False, solver=self.solver))
+        self.assertAlmostEqual(fluxes['rxn_1'], 100)
+        self.assertAlmostEqual(fluxes['rxn_2'], -100)
+        self.assertAlmostEqual(fluxes['rxn_3'], 100)
+
+
+class TestMergeEnzymeSubsets(unittest.TestCase):
+    def setUp(self):
+        self.ratio = math.sqrt(2)
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> |A|'))
+        self.database.set_reaction('rxn_2', Reaction(
+            Reaction.Right, [(Compound('A'), 1)],
+            [(Compound('B'), self.ratio), (Compound('C'), 1)]))
+        self.database.set_reaction('rxn_3', parse_reaction('|B| =>'))
+        self.database.set_reaction('rxn_4', parse_reaction('|C| =>'))
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+
+    def test_merge_keeps_exact_ratio(self):
+        compressor = compression._Compressor(
+            self.model, sorted(self.model.reactions), set())
+        blocked, merged = compressor.merge_enzyme_subsets()
+        self.assertEqual(blocked, {})
+        self.assertEqual(merged, 3)
+
+        members = compressor.members['rxn_1']
+        self.assertAlmostEqual(members['rxn_3'], self.ratio, places=12)
+        self.assertAlmostEqual(members['rxn_4'], 1.0, places=12)
+        self.assertEqual(compressor.stoichiometry['rxn_1'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+import unittest
+
+from psamm.metabolicmodel import MetabolicModel
+from psamm.database import DictDatabase
+from psamm import coupling
+from psamm.coupling import Coupling
+from psamm.datasource.modelseed import parse_reaction
+
+try:
+    from psamm.lpsolver import cplex
+except ImportError:
+    cplex = None
+
+requires_solver = unittest.skipIf(cplex is None, 'solver not available')
+
+
+class TestImplications(unittest.TestCase):
+    def test_implications_unknown(self):
+        implications = coupling._Implications()
+        self.assertIsNone(implications.get('rxn_1', 'rxn_2'))
+
+    def test_implications_transitive(self):
+        implications = coupling._Implications()
+        implications.add('rxn_1', 'rxn_2', True)
+        implications.add('rxn_3', 'rxn_1', True)
+        implications.add('rxn_2', 'rxn_4', True)
+        self.assertTrue(implications.get('rxn_1', 'rxn_4'))
+        self.assertTrue(implications.get('rxn_3', 'rxn_4'))
+        self.assertIsNone(implications.get('rxn_4', 'rxn_3'))
+
+    def test_implications_from_support(self):
+        implications = coupling._Implications()
+        implications.add_support(
+            {'rxn_1', 'rxn_2'}, ['rxn_1', 'rxn_2', 'rxn_3'])
+        self.assertFalse(implications.get('rxn_1', 'rxn_3'))
+        self.assertFalse(implications.get('rxn_2', 'rxn_3'))
+        self.assertIsNone(implications.get('rxn_1', 'rxn_2'))
+        self.assertIsNone(implications.get('rxn_3', 'rxn_1'))
+
+
+@requires_solver
+class TestFluxCoupling(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> (2) |A|'))
+        self.database.set_reaction('rxn_2', parse_reaction('|A| <=> |B|'))
+        self.database.set_reaction('rxn_3', parse_reaction('|A| => |D|'))
+        self.database.set_reaction('rxn_4', parse_reaction('|A| => |C|'))
+        self.database.set_reaction('rxn_5', parse_reaction('|C| => |D|'))
+        self.database.set_reaction('rxn_6', parse_reaction('|D| =>'))
+        self.database.set_reaction('rxn_7', parse_reaction('|D| => |E|'))
+        self.database.set_reaction('rxn_8', parse_reaction('|E| =>'))
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        self.solver = cplex.Solver()
+
+    def test_flux_coupling(self):
+        result = dict(((r1, r2), (c, ratio)) for r1, r2, c, ratio in
+                      coupling.flux_coupling(self.model, self.solver))
+        self.assertEqual(result, {
+            ('rxn_3', 'rxn_1'): (Coupling.Directional, None),
+            ('rxn_4', 'rxn_1'): (Coupling.Directional, None),
+            ('rxn_5', 'rxn_1'): (Coupling.Directional, None),
+            ('rxn_6', 'rxn_1'): (Coupling.Directional, None),
+            ('rxn_7', 'rxn_1'): (Coupling.Directional, None),
+            ('rxn_8', 'rxn_1'): (Coupling.Directional, None),
+            ('rxn_4', 'rxn_5'): (Coupling.Full, (1.0, 1.0)),
+            ('rxn_7', 'rxn_8'): (Coupling.Full, (1.0, 1.0))
+        })
+
+    def test_flux_coupling_full_ratio(self):
+        self.model.limits['rxn_6'].upper = 0
+        result = dict(((r1, r2), (c, ratio)) for r1, r2, c, ratio in
+                      coupling.flux_coupling(self.model, self.solver))
+        coupling_type, (lower, upper) = result['rxn_1', 'rxn_8']
+        self.assertEqual(coupling_type, Coupling.Full)
+        self.assertAlmostEqual(lower, 0.5)
+        self.assertAlmostEqual(upper, 0.5)
+
+    def test_flux_coupling_partial(self):
+        self.database.set_reaction('rxn_9', parse_reaction('|C| + |D| =>'))
+        self.model.add_reaction('rxn_9')
+        self.model.limits['rxn_3'].upper = 0
+        result = dict(((r1, r2), (c, ratio)) for r1, r2, c, ratio in
+                      coupling.flux_coupling(self.model, self.solver))
+        coupling_type, (lower, upper) = result['rxn_4', 'rxn_5']
+        self.assertEqual(coupling_type, Coupling.Partial)
+        self.assertAlmostEqual(lower, 1)
+        self.assertAlmostEqual(upper, 2)
+
+        # The ratio of rxn_1 is scaled from the fully coupled rxn_4
+        coupling_type, (lower, upper) = result['rxn_1', 'rxn_5']
+        self.assertEqual(coupling_type, Coupling.Partial)
+        self.assertAlmostEqual(lower, 0.5)
+        self.assertAlmostEqual(upper, 1)
+
+    def test_flux_coupling_reactions(self):
+        result = list(coupling.flux_coupling(
+            self.model, self.solver, reactions=['rxn_2', 'rxn_5', 'rxn_4']))
+        self.assertEqual(
+            result, [('rxn_5', 'rxn_4', Coupling.Full, (1.0, 1.0))])
+
+    def test_flux_coupling_parallel(self):
+        expected = list(coupling.flux_coupling(self.model, self.solver))
+        result = list(coupling.flux_coupling(
+            self.model, self.solver, parallel=2))
+        self.assertEqual(result, expected)
+
+    def test_problem_find_witness(self):
+        p = coupling.FluxCouplingProblem(self.model, self.solver)
+        reactions = sorted(self.model.reactions)
+        self.assertIsNone(p.find_witness('rxn_6', 'rxn_1', reactions))
+        support = p.find_witness('rxn_3', 'rxn_4', reactions)
+        self.assertIn('rxn_3', support)
+        self.assertNotIn('rxn_4', support)
+
+    def test_problem_ratio_ranges(self):
+        p = coupling.FluxCouplingProblem(self.model, self.solver)
+        ranges = p.ratio_ranges('rxn_5', 'rxn_4')
+        self.assertEqual(len(ranges), 1)
+        self.assertAlmostEqual(ranges[0][0], 1)
+        self.assertAlmostEqual(ranges[0][1], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -114,6 +114,13 @@ class TestMetabolicDatabase(unittest.TestCase):
     def test_matrix_len(self):
         self.assertEqual(len(self.database.matrix), 10)
 
+    def test_matrix_iteritems(self):
+        matrix = dict(self.database.matrix.iteritems())
+        self.assertEqual(len(matrix), 10)
+        self.assertEqual(matrix[Compound('A'), 'rxn_1'], 2)
+        self.assertEqual(matrix[Compound('A'), 'rxn_2'], -1)
+        self.assertEqual(matrix[Compound('D', 'e'), 'rxn_6'], -1)
+
 class TestChainedDatabase(unittest.TestCase):
     def setUp(self):
         database1 = DictDatabase()
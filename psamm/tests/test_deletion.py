@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+import unittest
+
+from psamm.metabolicmodel import MetabolicModel
+from psamm.database import DictDatabase
+from psamm import deletion
+from psamm.datasource.modelseed import parse_reaction
+from psamm.expression.boolean import Expression
+
+try:
+    from psamm.lpsolver import cplex
+except ImportError:
+    cplex = None
+
+requires_solver = unittest.skipIf(cplex is None, 'solver not available')
+
+
+@requires_solver
+class TestReactionDeletion(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> (2) |A|'))
+        self.database.set_reaction('rxn_2', parse_reaction('|A| <=> |B|'))
+        self.database.set_reaction('rxn_3', parse_reaction('|A| => |D|'))
+        self.database.set_reaction('rxn_4', parse_reaction('|A| => |C|'))
+        self.database.set_reaction('rxn_5', parse_reaction('|C| => |D|'))
+        self.database.set_reaction('rxn_6', parse_reaction('|D| =>'))
+        self.database.set_reaction('rxn_7', parse_reaction('|E| => |F|'))
+        self.database.set_reaction('rxn_8', parse_reaction('|F| => |E|'))
+
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        self.model.limits['rxn_5'].upper = 100
+
+        self.solver = cplex.Solver()
+
+    def test_single_deletion(self):
+        fluxes = dict(deletion.single_deletion(
+            self.model, 'rxn_6', self.solver))
+
+        self.assertAlmostEqual(fluxes['rxn_1'], 0)
+        self.assertAlmostEqual(fluxes['rxn_2'], 1000)
+        self.assertAlmostEqual(fluxes['rxn_3'], 100)
+        self.assertAlmostEqual(fluxes['rxn_4'], 1000)
+        self.assertAlmostEqual(fluxes['rxn_6'], 0)
+        self.assertAlmostEqual(fluxes['rxn_7'], 1000)
+
+    def test_single_deletion_infeasible(self):
+        self.model.limits['rxn_5'].lower = 10
+        fluxes = dict(deletion.single_deletion(
+            self.model, 'rxn_6', self.solver, reactions=['rxn_3', 'rxn_4']))
+
+        self.assertAlmostEqual(fluxes['rxn_3'], 100)
+        self.assertIsNone(fluxes['rxn_4'])
+
+    def test_double_deletion(self):
+        reactions = ['rxn_2', 'rxn_3', 'rxn_4', 'rxn_5']
+        fluxes = list(deletion.double_deletion(
+            self.model, 'rxn_6', self.solver, reactions=reactions))
+
+        self.assertEqual([(r1, r2) for r1, r2, _ in fluxes], [
+            ('rxn_2', 'rxn_3'), ('rxn_2', 'rxn_4'), ('rxn_2', 'rxn_5'),
+            ('rxn_3', 'rxn_4'), ('rxn_3', 'rxn_5'), ('rxn_4', 'rxn_5')])
+
+        fluxes = {(r1, r2): value for r1, r2, value in fluxes}
+        self.assertAlmostEqual(fluxes['rxn_2', 'rxn_3'], 100)
+        self.assertAlmostEqual(fluxes['rxn_2', 'rxn_4'], 1000)
+        self.assertAlmostEqual(fluxes['rxn_3', 'rxn_4'], 0)
+        self.assertAlmostEqual(fluxes['rxn_3', 'rxn_5'], 0)
+        self.assertAlmostEqual(fluxes['rxn_4', 'rxn_5'], 1000)
+
+    def test_double_deletion_parallel(self):
+        fluxes = list(deletion.double_deletion(
+            self.model, 'rxn_6', self.solver))
+        parallel_fluxes = list(deletion.double_deletion(
+            self.model, 'rxn_6', self.solver, parallel=2, block_size=5))
+
+        self.assertEqual(len(fluxes), 28)
+        for (r1, r2, value), (p1, p2, parallel_value) in zip(
+                fluxes, parallel_fluxes):
+            self.assertEqual((r1, r2), (p1, p2))
+            self.assertAlmostEqual(value, parallel_value)
+
+
+class TestGeneRules(unittest.TestCase):
+    def setUp(self):
+        self.rules = deletion.GeneRules({
+            'rxn_1': 'A and (B or C)',
+            'rxn_2': ['B', 'D'],
+            'rxn_3': Expression('E')
+        })
+
+    def test_genes(self):
+        self.assertEqual(self.rules.genes, {'A', 'B', 'C', 'D', 'E'})
+
+    def test_reactions(self):
+        self.assertEqual(self.rules.reactions('B'), {'rxn_1', 'rxn_2'})
+        self.assertEqual(self.rules.reactions('F'), set())
+
+    def test_disabled_reactions_and(self):
+        self.assertEqual(self.rules.disabled_reactions(['A']), {'rxn_1'})
+
+    def test_disabled_reactions_or(self):
+        self.assertEqual(self.rules.disabled_reactions(['B']), set())
+        self.assertEqual(
+            self.rules.disabled_reactions(['B', 'C']), {'rxn_1'})
+
+    def test_disabled_reactions_list(self):
+        self.assertEqual(
+            self.rules.disabled_reactions(['B', 'D']), {'rxn_2'})
+
+    def test_disabled_reactions_unknown_gene(self):
+        self.assertEqual(self.rules.disabled_reactions(['F']), set())
+
+    def test_disabled_reactions_nested_rule(self):
+        # Expanding this rule into disjunctive normal form would give 2^40
+        # clauses.
+        rule = ' and '.join(
+            '(g{0}a or g{0}b)'.format(i) for i in range(40))
+        rules = deletion.GeneRules({'rxn_1': rule})
+        self.assertEqual(rules.disabled_reactions(['g3a']), set())
+        self.assertEqual(
+            rules.disabled_reactions(['g3a', 'g3b']), {'rxn_1'})
+
+
+@requires_solver
+class TestGeneDeletion(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> (2) |A|'))
+        self.database.set_reaction('rxn_2', parse_reaction('|A| <=> |B|'))
+        self.database.set_reaction('rxn_3', parse_reaction('|A| => |D|'))
+        self.database.set_reaction('rxn_4', parse_reaction('|A| => |C|'))
+        self.database.set_reaction('rxn_5', parse_reaction('|C| => |D|'))
+        self.database.set_reaction('rxn_6', parse_reaction('|D| =>'))
+
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        self.model.limits['rxn_5'].upper = 100
+
+        self.rules = deletion.GeneRules({
+            'rxn_1': 'g1',
+            'rxn_2': 'g2',
+            'rxn_3': 'g3 or g4',
+            'rxn_4': 'g5 and g6',
+            'rxn_5': 'g6',
+            'rxn_7': 'g7'
+        })
+        self.solver = cplex.Solver()
+
+    def test_single_gene_deletion(self):
+        knockouts = [('g1',), ('g2',), ('g3',), ('g5',), ('g6',), ('g7',)]
+        fluxes = list(deletion.gene_deletion(
+            self.model, 'rxn_6', self.solver, self.rules, knockouts))
+
+        self.assertEqual([k for k, _ in fluxes], knockouts)
+        fluxes = dict(fluxes)
+        self.assertAlmostEqual(fluxes['g1',], 0)
+        self.assertAlmostEqual(fluxes['g2',], 1000)
+        self.assertAlmostEqual(fluxes['g3',], 1000)
+        self.assertAlmostEqual(fluxes['g5',], 1000)
+        self.assertAlmostEqual(fluxes['g6',], 1000)
+        self.assertAlmostEqual(fluxes['g7',], 1000)
+
+    def test_double_gene_deletion(self):
+        knockouts = [('g3', 'g4'), ('g4', 'g3'), ('g3', 'g5'),
+                     ('g4', 'g6'), ('g2', 'g5')]
+        fluxes = list(deletion.gene_deletion(
+            self.model, 'rxn_6', self.solver, self.rules, knockouts,
+            block_size=2))
+
+        self.assertEqual([k for k, _ in fluxes], knockouts)
+        fluxes = dict(fluxes)
+        self.assertAlmostEqual(fluxes['g3', 'g4'], 100)
+        self.assertAlmostEqual(fluxes['g4', 'g3'], 100)
+        self.assertAlmostEqual(fluxes['g3', 'g5'], 1000)
+        self.assertAlmostEqual(fluxes['g4', 'g6'], 1000)
+        self.assertAlmostEqual(fluxes['g2', 'g5'], 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
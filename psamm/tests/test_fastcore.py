@@ -16,19 +16,27 @@
 #
 # Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
 
+import random
 import unittest
 
 from psamm.metabolicmodel import MetabolicModel
 from psamm.database import DictDatabase
 from psamm import fastcore
 from psamm.datasource.modelseed import parse_reaction
+from psamm.reaction import Reaction, Compound
 
 try:
     from psamm.lpsolver import cplex
 except ImportError:
     cplex = None
 
+try:
+    from psamm.lpsolver import glpk
+except ImportError:
+    glpk = None
+
 requires_solver = unittest.skipIf(cplex is None, 'solver not available')
+requires_glpk = unittest.skipIf(glpk is None, 'GLPK not available')
 
 
 @requires_solver
@@ -82,6 +90,29 @@ class TestFastcoreSimpleVlassisModel(unittest.TestCase):
         supp = set(fastcore.support_positive(result, 0.001*0.999))
         self.assertEqual(supp, { 'rxn_1', 'rxn_4', 'rxn_5', 'rxn_6' })
 
+    def test_problem_lp7_repeated(self):
+        problem = fastcore.FastcoreProblem(self.model, 0.001, self.solver)
+        supp = set(fastcore.support_positive(
+            problem.lp7({'rxn_5'}), 0.001*0.999))
+        self.assertEqual(supp, { 'rxn_1', 'rxn_4', 'rxn_5', 'rxn_6' })
+
+        supp = set(fastcore.support_positive(
+            problem.lp7({'rxn_3'}), 0.001*0.999))
+        self.assertTrue({ 'rxn_1', 'rxn_3', 'rxn_6' }.issubset(supp))
+
+    def test_problem_lp10_repeated(self):
+        problem = fastcore.FastcoreProblem(
+            self.model, 0.001, self.solver, scaling=1e3)
+        penalty = { 'rxn_1', 'rxn_3', 'rxn_4', 'rxn_5' }
+        supp = set(fastcore.support(
+            problem.lp10({'rxn_6'}, penalty, weights={'rxn_3': 3}),
+            0.999*0.001))
+        self.assertEqual(supp, { 'rxn_1', 'rxn_4', 'rxn_5', 'rxn_6' })
+
+        supp = set(fastcore.support(
+            problem.lp10({'rxn_6'}, penalty), 0.999*0.001))
+        self.assertEqual(supp, { 'rxn_1', 'rxn_3', 'rxn_6' })
+
     def test_find_sparse_mode_singleton(self):
         core = { 'rxn_1' }
         mode = set(fastcore.find_sparse_mode(
@@ -159,6 +190,34 @@ class TestFastcoreSimpleVlassisModel(unittest.TestCase):
             fastcore.fastcore(self.model, { 'rxn_7' }, 0.001,
                               solver=self.solver)
 
+    def test_fastcore_batch(self):
+        self.model.remove_reaction('rxn_2')
+        cores = [('a', { 'rxn_3' }), ('b', { 'rxn_4' }), ('c', { 'rxn_6' })]
+        results = list(fastcore.fastcore_batch(
+            self.model, cores, 0.001, solver=self.solver))
+        self.assertEqual(results, [
+            (key, fastcore.fastcore(self.model, core, 0.001,
+                                    solver=self.solver))
+            for key, core in cores])
+
+    def test_fastcore_batch_inconsistent_core(self):
+        self.database.set_reaction('rxn_7', parse_reaction('|E| <=>'))
+        self.model.add_reaction('rxn_7')
+        cores = [('a', { 'rxn_7' }), ('b', { 'rxn_4' })]
+        results = list(fastcore.fastcore_batch(
+            self.model, cores, 0.001, solver=self.solver))
+        self.assertEqual(results, [
+            ('a', None), ('b', { 'rxn_1', 'rxn_4', 'rxn_5', 'rxn_6' })])
+
+    def test_fastcore_batch_parallel(self):
+        self.model.remove_reaction('rxn_2')
+        cores = [('a', { 'rxn_3' }), ('b', { 'rxn_4' }), ('c', { 'rxn_6' })]
+        results = list(fastcore.fastcore_batch(
+            self.model, cores, 0.001, solver=self.solver))
+        parallel_results = list(fastcore.fastcore_batch(
+            self.model, cores, 0.001, solver=self.solver, parallel=2))
+        self.assertEqual(results, parallel_results)
+
 
 @requires_solver
 class TestFastcoreTinyBiomassModel(unittest.TestCase):
@@ -224,6 +283,76 @@ class TestFlippingModel(unittest.TestCase):
             fastcore.fastcore(self.model, core, 0.001, solver=self.solver)),
             { 'rxn_1', 'rxn_2', 'rxn_3', 'rxn_4' })
 
+    def test_problem_lp7_flipped(self):
+        problem = fastcore.FastcoreProblem(self.model, 0.001, self.solver)
+        fluxes = dict(problem.lp7({'rxn_2'}, flipped={'rxn_2'}))
+        self.assertGreaterEqual(fluxes['rxn_2'], 0.001*0.999)
+        self.assertGreaterEqual(fluxes['rxn_3'], 0.001*0.999)
+
+        fluxes = dict(problem.lp7({'rxn_2'}))
+        self.assertGreaterEqual(fluxes['rxn_2'], 0.001*0.999)
+        self.assertLessEqual(fluxes['rxn_3'], -0.001*0.999)
+
+    def test_problem_lp10_flipped(self):
+        problem = fastcore.FastcoreProblem(
+            self.model, 0.001, self.solver, scaling=1e3)
+        fluxes = dict(problem.lp10(
+            {'rxn_2'}, {'rxn_1', 'rxn_3', 'rxn_4'}, flipped={'rxn_2'}))
+        self.assertGreaterEqual(fluxes['rxn_2'], 0.999)
+        self.assertGreaterEqual(fluxes['rxn_3'], 0.999)
+
+    def test_fastcc_inconsistent_after_flip(self):
+        self.database.set_reaction('rxn_5', parse_reaction('|D| <=> |E|'))
+        self.model.add_reaction('rxn_5')
+        self.assertEqual(
+            set(fastcore.fastcc(self.model, 0.001, solver=self.solver)),
+            { 'rxn_5' })
+
+
+
+@requires_glpk
+class TestFastcoreGlpk(unittest.TestCase):
+    """Test fastcore using GLPK on a random network
+
+    The LP-10 problems of this network have large flux bounds with the
+    default scaling. GLPK must solve these without reporting them as
+    infeasible.
+    """
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.database = DictDatabase()
+        for i in range(120):
+            compounds = rng.sample(range(60), 3)
+            left = [(Compound('c{}'.format(compounds[0])), 1)]
+            right = [(Compound('c{}'.format(c)), rng.choice([1, 2]))
+                     for c in compounds[1:]]
+            direction = (Reaction.Bidir if rng.random() < 0.4
+                         else Reaction.Right)
+            self.database.set_reaction(
+                'rxn_{}'.format(i), Reaction(direction, left, right))
+        for i in range(0, 60, 4):
+            self.database.set_reaction('ex_{}'.format(i), Reaction(
+                Reaction.Bidir, [(Compound('c{}'.format(i)), 1)], []))
+
+        self.solver = glpk.Solver()
+        model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        consistent = fastcore.fastcc_consistent_subset(
+            model, 0.001, solver=self.solver)
+        self.model = MetabolicModel.load_model(
+            self.database, sorted(consistent))
+        self.core = set(rng.sample(sorted(consistent), 8))
+
+    def test_fastcore_induced_model(self):
+        induced = fastcore.fastcore(
+            self.model, self.core, 0.001, solver=self.solver)
+        self.assertTrue(self.core.issubset(induced))
+
+        model = MetabolicModel.load_model(self.database, induced)
+        self.assertTrue(fastcore.fastcc_is_consistent(
+            model, 0.001, solver=self.solver))
+
 
 if __name__ == '__main__':
     unittest.main()
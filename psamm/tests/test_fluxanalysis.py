@@ -22,6 +22,7 @@ from psamm.metabolicmodel import MetabolicModel
 from psamm.database import DictDatabase
 from psamm import fluxanalysis
 from psamm.datasource.modelseed import parse_reaction
+from psamm.lpsolver import lp
 
 try:
     from psamm.lpsolver import cplex
@@ -72,6 +73,117 @@ class TestFluxBalance(unittest.TestCase):
         self.assertEqual(fluxes['rxn_2'], 0)
         self.assertEqual(fluxes['rxn_6'], 1000)
 
+    def test_flux_balance_problem_set_flux_bounds(self):
+        p = fluxanalysis.FluxBalanceProblem(self.model, self.solver)
+        p.set_flux_bounds('rxn_3', 0, 0)
+        p.set_flux_bounds('rxn_4', 0, 0)
+        p.solve('rxn_6')
+        self.assertAlmostEqual(p.get_flux('rxn_6'), 0)
+
+        p.set_flux_bounds('rxn_4', 0, 100)
+        p.solve('rxn_6')
+        self.assertAlmostEqual(p.get_flux('rxn_6'), 100)
+
+    def test_flux_balance_problem_deletions_keep_problem_size(self):
+        p = fluxanalysis.FluxBalanceProblem(self.model, self.solver)
+        size = p.prob.get_size()
+        for reaction_id in sorted(self.model.reactions):
+            bounds = tuple(self.model.limits[reaction_id])
+            p.set_flux_bounds(reaction_id, 0, 0)
+            p.solve('rxn_6')
+            p.set_flux_bounds(reaction_id, *bounds)
+        self.assertEqual(p.prob.get_size(), size)
+        p.solve('rxn_6')
+        self.assertAlmostEqual(p.get_flux('rxn_6'), 1000)
+
+    def test_flux_balance_problem_minimize_l1(self):
+        p = fluxanalysis.FluxBalanceProblem(self.model, self.solver)
+        p.solve('rxn_6')
+        p.minimize_l1()
+        self.assertAlmostEqual(p.get_flux('rxn_6'), 1000)
+        self.assertAlmostEqual(p.get_flux('rxn_3'), 1000)
+        self.assertAlmostEqual(p.get_flux('rxn_4'), 0)
+        self.assertAlmostEqual(p.get_flux('rxn_5'), 0)
+
+        # The optimum constraint must not restrict the next solve
+        p.set_flux_bounds('rxn_1', 0, 100)
+        p.solve('rxn_6')
+        p.minimize_l1(weights={'rxn_3': 3})
+        self.assertAlmostEqual(p.get_flux('rxn_6'), 200)
+        self.assertAlmostEqual(p.get_flux('rxn_3'), 0)
+        self.assertAlmostEqual(p.get_flux('rxn_5'), 200)
+
+    def test_parsimonious_flux_balance(self):
+        fluxes = dict(
+            (reaction_id, (fba_flux, flux)) for reaction_id, fba_flux, flux in
+            fluxanalysis.parsimonious_flux_balance(
+                self.model, 'rxn_6', solver=self.solver))
+        self.assertAlmostEqual(fluxes['rxn_6'][0], 1000)
+        self.assertAlmostEqual(fluxes['rxn_6'][1], 1000)
+        self.assertAlmostEqual(fluxes['rxn_3'][1], 1000)
+        self.assertAlmostEqual(fluxes['rxn_4'][1], 0)
+        self.assertAlmostEqual(fluxes['rxn_5'][1], 0)
+
+    def test_parsimonious_flux_balance_with_weights(self):
+        fluxes = dict(
+            (reaction_id, flux) for reaction_id, _, flux in
+            fluxanalysis.parsimonious_flux_balance(
+                self.model, 'rxn_6', solver=self.solver,
+                weights={'rxn_3': 3}))
+        self.assertAlmostEqual(fluxes['rxn_6'], 1000)
+        self.assertAlmostEqual(fluxes['rxn_3'], 0)
+        self.assertAlmostEqual(fluxes['rxn_5'], 1000)
+
+    def test_robustness(self):
+        points = [(100,), (200,), (600,)]
+        results = list(fluxanalysis.robustness(
+            self.model, 'rxn_6', ['rxn_1'], points, tfba=False,
+            solver=self.solver, minimize=True))
+        self.assertEqual([point for point, _ in results], points)
+        self.assertAlmostEqual(results[0][1]['rxn_6'], 200)
+        self.assertAlmostEqual(results[1][1]['rxn_6'], 400)
+        self.assertAlmostEqual(results[1][1]['rxn_3'], 400)
+        self.assertIsNone(results[2][1])
+
+    def test_robustness_phase_plane_parallel(self):
+        points = fluxanalysis.phase_plane_points([100, 200], [0, 50, 100])
+        results = list(fluxanalysis.robustness(
+            self.model, 'rxn_6', ['rxn_1', 'rxn_4'], points, tfba=False,
+            solver=self.solver, parallel=2))
+        self.assertEqual([point for point, _ in results], points)
+        for (rxn_1, rxn_4), fluxes in results:
+            self.assertAlmostEqual(fluxes['rxn_6'], 2 * rxn_1)
+            self.assertAlmostEqual(fluxes['rxn_5'], rxn_4)
+
+
+    def test_robustness_breakpoints(self):
+        self.database.set_reaction('rxn_7', parse_reaction('|A| =>'))
+        model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        breakpoints = fluxanalysis.robustness_breakpoints(
+            model, 'rxn_6', 'rxn_1', self.solver)
+        self.assertEqual(len(breakpoints), 3)
+        for (flux, value), expected in zip(
+                breakpoints, [(0, 0), (500, 1000), (1000, 1000)]):
+            self.assertAlmostEqual(flux, expected[0])
+            self.assertAlmostEqual(value, expected[1])
+
+    def test_robustness_breakpoints_linear_in_range(self):
+        breakpoints = fluxanalysis.robustness_breakpoints(
+            self.model, 'rxn_6', 'rxn_1', self.solver,
+            minimum=100, maximum=1000)
+        self.assertEqual(len(breakpoints), 2)
+        self.assertAlmostEqual(breakpoints[0][0], 100)
+        self.assertAlmostEqual(breakpoints[0][1], 200)
+        self.assertAlmostEqual(breakpoints[1][0], 500)
+        self.assertAlmostEqual(breakpoints[1][1], 1000)
+
+class TestPhasePlanePoints(unittest.TestCase):
+    def test_phase_plane_points(self):
+        self.assertEqual(
+            fluxanalysis.phase_plane_points([0, 1, 2], [0, 1]),
+            [(0, 0), (0, 1), (1, 1), (1, 0), (2, 0), (2, 1)])
+
 
 @requires_solver
 class TestFluxBalanceThermodynamic(unittest.TestCase):
@@ -102,6 +214,44 @@ class TestFluxBalanceThermodynamic(unittest.TestCase):
         self.assertEquals(fluxes['rxn_5'], 0)
 
 
+    def test_find_loop_reactions(self):
+        loops = fluxanalysis.find_loop_reactions(self.model, self.solver)
+        self.assertEqual(loops, {'rxn_2', 'rxn_3', 'rxn_4', 'rxn_5'})
+
+    def test_find_loop_reactions_with_forced_flux(self):
+        database = DictDatabase()
+        database.set_reaction('ex_A', parse_reaction('|A| <=>'))
+        database.set_reaction('rxn_1', parse_reaction('|A| => |B|'))
+        database.set_reaction('rxn_2', parse_reaction('|B| => |C|'))
+        database.set_reaction('rxn_3', parse_reaction('|B| <=> |D|'))
+        database.set_reaction('rxn_4', parse_reaction('|D| <=> |B|'))
+        database.set_reaction('ex_C', parse_reaction('|C| <=>'))
+        model = MetabolicModel.load_model(database, database.reactions)
+        model.limits['rxn_2'].lower = 5
+
+        loops = fluxanalysis.find_loop_reactions(model, self.solver)
+        self.assertEqual(loops, {'rxn_3', 'rxn_4'})
+
+        fluxes = dict(fluxanalysis.flux_balance(
+            model, 'ex_C', tfba=True, solver=self.solver))
+        self.assertAlmostEqual(fluxes['rxn_2'], fluxes['ex_C'])
+        self.assertGreaterEqual(fluxes['rxn_2'], 5)
+
+    def test_loop_reactions_given(self):
+        p = fluxanalysis.FluxBalanceTDProblem(
+            self.model, self.solver, loop_reactions={'rxn_3'})
+        p.prob.var(('alpha', 'rxn_3'))
+        with self.assertRaises(ValueError):
+            p.prob.var(('alpha', 'rxn_2'))
+
+    def test_binaries_only_for_loop_reactions(self):
+        p = fluxanalysis.FluxBalanceTDProblem(self.model, self.solver)
+        p.prob.var(('alpha', 'rxn_2'))
+        with self.assertRaises(ValueError):
+            p.prob.var(('alpha', 'rxn_1'))
+        with self.assertRaises(ValueError):
+            p.prob.var(('alpha', 'ex_A'))
+
 @requires_solver
 class TestFluxVariability(unittest.TestCase):
     def setUp(self):
@@ -157,6 +307,82 @@ class TestFluxVariability(unittest.TestCase):
         self.assertEqual(fluxes['rxn_7'][1], 0)
         self.assertEqual(fluxes['rxn_8'][1], 0)
 
+    def test_flux_variability_thermodynamic_parallel(self):
+        loop_reactions = fluxanalysis.find_loop_reactions(
+            self.model, self.solver)
+        fluxes = dict(fluxanalysis.flux_variability(
+            self.model, self.model.reactions, {'rxn_6': 200},
+            tfba=True, solver=self.solver, parallel=2,
+            loop_reactions=loop_reactions))
+
+        self.assertEqual(fluxes['rxn_2'][0], 0)
+        self.assertEqual(fluxes['rxn_2'][1], 0)
+        self.assertEqual(fluxes['rxn_7'][1], 0)
+        self.assertEqual(fluxes['rxn_8'][1], 0)
+
+    def test_flux_variability_loopless(self):
+        fluxes = dict(fluxanalysis.flux_variability(
+            self.model, self.model.reactions, {'rxn_6': 200},
+            tfba=False, solver=self.solver, loopless=True))
+
+        self.assertAlmostEqual(fluxes['rxn_1'][0], 100)
+        self.assertAlmostEqual(fluxes['rxn_5'][0], 0)
+        self.assertAlmostEqual(fluxes['rxn_5'][1], 100)
+        self.assertAlmostEqual(fluxes['rxn_6'][0], 200)
+        self.assertAlmostEqual(fluxes['rxn_7'][1], 0)
+        self.assertAlmostEqual(fluxes['rxn_8'][1], 0)
+
+    def test_flux_variability_loopless_with_tfba(self):
+        with self.assertRaises(ValueError):
+            list(fluxanalysis.flux_variability(
+                self.model, self.model.reactions, {}, tfba=True,
+                solver=self.solver, loopless=True))
+
+    def test_loopless_fluxes(self):
+        p = fluxanalysis.FluxBalanceProblem(self.model, self.solver)
+        p.solve({'rxn_6': 1, 'rxn_7': 1})
+        self.assertAlmostEqual(p.get_flux('rxn_7'), 1000)
+
+        fluxes = p.get_loopless_fluxes(['rxn_6', 'rxn_7', 'rxn_8'])
+        self.assertAlmostEqual(fluxes[0], 1000)
+        self.assertAlmostEqual(fluxes[1], 0)
+        self.assertAlmostEqual(fluxes[2], 0)
+
+        # Bounds are restored so the loop is possible again
+        p.solve('rxn_7')
+        self.assertAlmostEqual(p.get_flux('rxn_7'), 1000)
+
+    def test_flux_variability_skips_solves_at_limits(self):
+        lp.statistics.enabled = True
+        lp.statistics.reset()
+        try:
+            fluxes = dict(fluxanalysis.flux_variability(
+                self.model, self.model.reactions, {'rxn_6': 200},
+                tfba=False, solver=self.solver))
+            solve_count = lp.statistics.solve_count
+        finally:
+            lp.statistics.enabled = False
+            lp.statistics.reset()
+
+        self.assertLess(solve_count, 2 * len(fluxes))
+        self.assertEqual(fluxes['rxn_2'], (0, 0))
+        self.assertEqual(fluxes['rxn_5'], (0, 100))
+
+    def test_flux_variability_parallel(self):
+        reactions = sorted(self.model.reactions)
+        fluxes = list(fluxanalysis.flux_variability(
+            self.model, reactions, {'rxn_6': 200},
+            tfba=False, solver=self.solver))
+        parallel_fluxes = list(fluxanalysis.flux_variability(
+            self.model, reactions, {'rxn_6': 200},
+            tfba=False, solver=self.solver, parallel=2))
+
+        self.assertEqual([r for r, _ in parallel_fluxes], reactions)
+        for (_, bounds), (_, parallel_bounds) in zip(
+                fluxes, parallel_fluxes):
+            self.assertAlmostEqual(bounds[0], parallel_bounds[0])
+            self.assertAlmostEqual(bounds[1], parallel_bounds[1])
+
 
 @requires_solver
 class TestFluxConsistency(unittest.TestCase):
@@ -194,6 +420,14 @@ class TestFluxConsistency(unittest.TestCase):
             self.model, core, epsilon=0.001, tfba=True, solver=self.solver))
         self.assertEqual(inconsistent, {'rxn_7', 'rxn_8'})
 
+    def test_check_on_inconsistent_with_loop_removal(self):
+        self.model.remove_reaction('rxn_2')
+        core = self.model.reactions
+        inconsistent = set(fluxanalysis.consistency_check(
+            self.model, core, epsilon=0.001, tfba=False, solver=self.solver,
+            loopless=True))
+        self.assertEqual(inconsistent, {'rxn_7', 'rxn_8'})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -16,6 +16,10 @@
 #
 # Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
 
 from psamm.lpsolver import lp
@@ -25,13 +29,58 @@ try:
 except ImportError:
     cplex = None
 
+try:
+    from psamm.lpsolver import glpk
+except ImportError:
+    glpk = None
+
 requires_solver = unittest.skipIf(cplex is None, 'solver not available')
+requires_glpk = unittest.skipIf(glpk is None, 'GLPK not available')
+
+
+class TestExpression(unittest.TestCase):
+    def test_iadd_expression_in_place(self):
+        e = lp.Expression({'x': 1})
+        e_id = id(e)
+        e += lp.Expression({'x': 2, 'y': 1})
+        self.assertEqual(id(e), e_id)
+        self.assertEqual(e.value('x'), 3)
+        self.assertEqual(e.value('y'), 1)
+
+    def test_iadd_number(self):
+        e = lp.Expression({'x': 1})
+        e += 4
+        self.assertEqual(e.offset, 4)
+
+    def test_isub_expression(self):
+        e = lp.Expression({'x': 1, 'y': 2}, 1)
+        e -= lp.Expression({'y': 2}, 3)
+        self.assertEqual(e.value('x'), 1)
+        self.assertEqual(e.value('y'), 0)
+        self.assertEqual(e.offset, -2)
+
+    def test_sum(self):
+        e = lp.Expression.sum(
+            lp.Expression({v: i}) for i, v in enumerate('xyz', start=1))
+        self.assertEqual(e.value('x'), 1)
+        self.assertEqual(e.value('y'), 2)
+        self.assertEqual(e.value('z'), 3)
+        self.assertEqual(e.offset, 0)
+
+    def test_sum_with_numbers(self):
+        e = lp.Expression.sum([lp.Expression({'x': 1}), 2, 3])
+        self.assertEqual(e.value('x'), 1)
+        self.assertEqual(e.offset, 5)
 
 
 @requires_solver
 class TestCplexProblem(unittest.TestCase):
     def setUp(self):
         self.solver = cplex.Solver()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
 
     def test_objective_reset_on_set_linear_objective(self):
         prob = self.solver.create_problem()
@@ -51,6 +100,32 @@ class TestCplexProblem(unittest.TestCase):
         result = prob.solve()
         self.assertAlmostEqual(result.get_value('y'), 10)
 
+    def test_objective_coefficient_change_on_set_linear_objective(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_objective_sense(lp.ObjectiveSense.Maximize)
+
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+        result = prob.solve()
+        self.assertAlmostEqual(result.get_value('x'), 10)
+
+        # Only the coefficient of x changes
+        prob.set_linear_objective(-prob.var('x') + prob.var('y'))
+        result = prob.solve()
+        self.assertAlmostEqual(result.get_value('x'), 0)
+        self.assertAlmostEqual(result.get_value('y'), 10)
+
+        # Clear the objective
+        prob.set_linear_objective(0)
+        self.assertEqual(prob.cplex.objective.get_linear(), [0.0, 0.0])
+
+    def test_set_linear_objective_with_undefined_variable(self):
+        prob = self.solver.create_problem()
+        prob.define('x')
+        with self.assertRaises(ValueError):
+            prob.set_linear_objective(lp.Expression({'y': 1}))
+
     def test_result_to_bool_conversion_on_optimal(self):
         '''Run a feasible LP problem and check that the result evaluates to True'''
         prob = self.solver.create_problem()
@@ -74,6 +149,496 @@ class TestCplexProblem(unittest.TestCase):
         result = prob.solve()
         self.assertFalse(result)
 
+    def test_result_get_values(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', 'z', lower=0, upper=10)
+        prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        values = result.get_values(['y', 'x'])
+        self.assertEqual(values.shape, (2,))
+        self.assertAlmostEqual(values[0], 2)
+        self.assertAlmostEqual(values[1], 10)
+
+    def test_result_get_reduced_costs(self):
+        prob = self.solver.create_problem()
+        prob.define('x', lower=0, upper=10)
+        prob.define('y', lower=3, upper=3)
+        prob.add_linear_constraints(prob.var('x') + 2*prob.var('y') <= 12)
+        prob.set_linear_objective(prob.var('x') + 0.5*prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        costs = result.get_reduced_costs(['y', 'x'])
+        self.assertEqual(costs.shape, (2,))
+        self.assertAlmostEqual(costs[0], -1.5)
+        self.assertAlmostEqual(costs[1], 0)
+
+    def test_result_get_dual_values(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        constraints = prob.add_linear_constraints(
+            prob.var('x') + 2*prob.var('y') <= 12, prob.var('x') <= 8, 0 == 0)
+        prob.set_linear_objective(prob.var('x') + prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        values = result.get_dual_values(constraints)
+        self.assertEqual(values.shape, (3,))
+        self.assertAlmostEqual(values[0], 0.5)
+        self.assertAlmostEqual(values[1], 0.5)
+        self.assertAlmostEqual(values[2], 0)
+
+    def test_result_get_sensitivity_ranges(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        constraints = prob.add_linear_constraints(
+            prob.var('x') + 2*prob.var('y') <= 12, prob.var('x') <= 8)
+        prob.set_linear_objective(prob.var('x') + prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+
+        objective = result.get_objective_ranges(['x', 'y'])
+        self.assertEqual(objective.shape, (2, 2))
+        self.assertAlmostEqual(objective[0, 0], 0.5)
+        self.assertEqual(objective[0, 1], float('inf'))
+        self.assertAlmostEqual(objective[1, 0], 0)
+        self.assertAlmostEqual(objective[1, 1], 2)
+
+        rhs = result.get_rhs_ranges(constraints)
+        self.assertEqual(rhs.shape, (2, 2))
+        self.assertAlmostEqual(rhs[0, 0], 8)
+        self.assertAlmostEqual(rhs[0, 1], 28)
+        self.assertAlmostEqual(rhs[1, 0], 0)
+        self.assertAlmostEqual(rhs[1, 1], 10)
+
+    def test_result_dual_values_of_mip(self):
+        prob = self.solver.create_problem()
+        prob.define('x', types=lp.VariableType.Integer, lower=0, upper=10)
+        c, = prob.add_linear_constraints(prob.var('x') <= 5)
+        prob.set_linear_objective(prob.var('x'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        with self.assertRaises(ValueError):
+            result.get_dual_values([c])
+
+    def test_result_get_values_unknown_variable(self):
+        prob = self.solver.create_problem()
+        prob.define('x', lower=0, upper=10)
+        prob.set_linear_objective(prob.var('x'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        with self.assertRaises(ValueError):
+            result.get_values(['x', 'y'])
+
+    def test_result_snapshot_valid_after_solve(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+        snapshot = prob.solve(lp.ObjectiveSense.Maximize).snapshot()
+
+        prob.set_linear_objective(prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('y'), 10)
+
+        self.assertTrue(snapshot.success)
+        self.assertAlmostEqual(snapshot.get_value('x'), 10)
+        self.assertAlmostEqual(
+            snapshot.get_value(prob.var('x') + 2*prob.var('y')), 14)
+        self.assertAlmostEqual(snapshot.get_values(['y'])[0], 2)
+
+    def test_set_basis_from_previous_solve(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+        prob.solve(lp.ObjectiveSense.Maximize)
+        basis = prob.get_basis()
+        self.assertIsNotNone(basis)
+
+        prob.set_linear_objective(prob.var('x') + 2*prob.var('y'))
+        prob.solve(lp.ObjectiveSense.Maximize)
+
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+        prob.set_basis(basis)
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 10)
+        self.assertEqual(prob.cplex.solution.progress.get_num_iterations(), 0)
+
+    def test_set_basis_with_wrong_size(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.set_linear_objective(prob.var('x'))
+        prob.solve(lp.ObjectiveSense.Maximize)
+        basis = prob.get_basis()
+
+        prob.define('z', lower=0, upper=10)
+        with self.assertRaises(ValueError):
+            prob.set_basis(basis)
+
+    def test_var_is_not_modified_by_in_place_add(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y')
+        e = prob.var('x')
+        e += prob.var('y')
+        self.assertEqual(e.value('y'), 1)
+        self.assertEqual(prob.var('x').value('y'), 0)
+
+    def test_add_sparse_constraints(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', 'z', lower=0, upper=10)
+        prob.add_sparse_constraints(
+            [0, 0, 1, 1], ['x', 'y', 'y', 'z'], [1, 1, 1, -1],
+            [lp.Relation.Less, lp.Relation.Equals], [12, 0])
+        prob.set_linear_objective(2*prob.var('x') + prob.var('z'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 10)
+        self.assertAlmostEqual(result.get_value('y'), 2)
+        self.assertAlmostEqual(result.get_value('z'), 2)
+
+    def test_add_sparse_constraints_with_duplicate_entries(self):
+        prob = self.solver.create_problem()
+        prob.define('x', lower=0, upper=10)
+        prob.add_sparse_constraints(
+            [0, 0], ['x', 'x'], [1, 1], lp.Relation.Less, 8)
+        prob.set_linear_objective(prob.var('x'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 4)
+
+    def test_set_bounds(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.set_linear_objective(prob.var('x') + prob.var('y'))
+        prob.set_bounds('x', lower=0, upper=4)
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 4)
+        self.assertAlmostEqual(result.get_value('y'), 10)
+
+        prob.set_bounds('x', 'y', lower=[1, 2], upper=[1, 3])
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 1)
+        self.assertAlmostEqual(result.get_value('y'), 3)
+
+    def test_constraint_set_rhs(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        c, = prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 5)
+        prob.set_linear_objective(prob.var('x'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 5)
+
+        c.set_rhs(3)
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 3)
+
+    def test_constraint_delete(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        c1, c2 = prob.add_sparse_constraints(
+            [0, 1], ['x', 'y'], [1, 1], lp.Relation.Less, [5, 2])
+        prob.set_linear_objective(prob.var('x') + prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 5)
+
+        c1.delete()
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 10)
+        self.assertAlmostEqual(result.get_value('y'), 2)
+
+    def test_copy_is_independent(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        c, = prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+
+        prob2 = prob.copy()
+        prob2.define('z', lower=0, upper=1)
+        prob2.add_linear_constraints(prob2.var('y') >= 4)
+        prob2.set_linear_objective(2*prob2.var('x') + prob2.var('z'))
+        c.set_rhs(11)
+
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 10)
+        self.assertAlmostEqual(result.get_value('y'), 1)
+
+        result = prob2.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 8)
+        self.assertAlmostEqual(result.get_value('y'), 4)
+        self.assertAlmostEqual(result.get_value('z'), 1)
+
+    def test_write_and_read_problem(self):
+        prob = self.solver.create_problem()
+        prob.define(('v', 'rxn_1'), ('v', 'rxn_2'), lower=0, upper=10)
+        prob.add_linear_constraints(
+            prob.var(('v', 'rxn_1')) + prob.var(('v', 'rxn_2')) <= 12)
+        prob.set_linear_objective(
+            2*prob.var(('v', 'rxn_1')) + prob.var(('v', 'rxn_2')))
+
+        for format in ('lp', 'mps'):
+            path = os.path.join(self.tempdir, 'problem.' + format)
+            prob.write(path)
+
+            prob2 = self.solver.read_problem(path)
+            result = prob2.solve(lp.ObjectiveSense.Maximize)
+            self.assertAlmostEqual(result.get_value(('v', 'rxn_1')), 10)
+            self.assertAlmostEqual(result.get_value(('v', 'rxn_2')), 2)
+
+            prob2.define('z', lower=0, upper=1)
+            prob2.add_linear_constraints(
+                prob2.var(('v', 'rxn_1')) + prob2.var('z') <= 9)
+            prob2.set_linear_objective(prob2.var('z'))
+            result = prob2.solve(lp.ObjectiveSense.Maximize)
+            self.assertAlmostEqual(result.get_value('z'), 1)
+
+
+@requires_glpk
+class TestGlpkProblem(unittest.TestCase):
+    def setUp(self):
+        self.solver = glpk.Solver()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_objective_reset_on_set_linear_objective(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_objective_sense(lp.ObjectiveSense.Maximize)
+
+        prob.set_linear_objective(2*prob.var('x'))
+        result = prob.solve()
+        self.assertAlmostEqual(result.get_value('x'), 10)
+
+        prob.set_linear_objective(prob.var('y'))
+        result = prob.solve()
+        self.assertAlmostEqual(result.get_value('y'), 10)
+
+    def test_result_to_bool_conversion_on_infeasible(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', 'z', lower=0, upper=10)
+        prob.add_linear_constraints(2*prob.var('x') == -prob.var('y'),
+                                    prob.var('x') + prob.var('z') >= 6,
+                                    prob.var('z') <= 3)
+        prob.set_linear_objective(2*prob.var('x'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertFalse(result)
+
+    def test_add_sparse_constraints(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', 'z', lower=0, upper=10)
+        prob.add_sparse_constraints(
+            [0, 0, 1, 1], ['x', 'y', 'y', 'z'], [1, 1, 1, -1],
+            [lp.Relation.Less, lp.Relation.Equals], [12, 0])
+        prob.set_linear_objective(2*prob.var('x') + prob.var('z'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        values = result.get_values(['x', 'y', 'z'])
+        self.assertAlmostEqual(values[0], 10)
+        self.assertAlmostEqual(values[1], 2)
+        self.assertAlmostEqual(values[2], 2)
+
+    def test_set_bounds_and_constraint_changes(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        c1, c2 = prob.add_linear_constraints(
+            prob.var('x') <= 5, prob.var('x') + prob.var('y') >= 3)
+        prob.set_linear_objective(prob.var('x') - prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 5)
+        self.assertAlmostEqual(result.get_value('y'), 0)
+
+        c1.set_rhs(2)
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 2)
+        self.assertAlmostEqual(result.get_value('y'), 1)
+
+        c1.delete()
+        prob.set_bounds('x', lower=0, upper=4)
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 4)
+
+        prob.set_bounds('x', lower=1, upper=1)
+        c2.set_rhs(6)
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 1)
+        self.assertAlmostEqual(result.get_value('y'), 5)
+
+    def test_result_get_reduced_costs(self):
+        prob = self.solver.create_problem()
+        prob.define('x', lower=0, upper=10)
+        prob.define('y', lower=3, upper=3)
+        prob.add_linear_constraints(prob.var('x') + 2*prob.var('y') <= 12)
+        prob.set_linear_objective(prob.var('x') + 0.5*prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        costs = result.get_reduced_costs(['y', 'x'])
+        self.assertEqual(costs.shape, (2,))
+        self.assertAlmostEqual(costs[0], -1.5)
+        self.assertAlmostEqual(costs[1], 0)
+
+    def test_result_get_dual_values(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        constraints = prob.add_linear_constraints(
+            prob.var('x') + 2*prob.var('y') <= 12, prob.var('x') <= 8, 0 == 0)
+        prob.set_linear_objective(prob.var('x') + prob.var('y'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        values = result.get_dual_values(constraints)
+        self.assertEqual(values.shape, (3,))
+        self.assertAlmostEqual(values[0], 0.5)
+        self.assertAlmostEqual(values[1], 0.5)
+        self.assertAlmostEqual(values[2], 0)
+
+    def test_result_get_reduced_costs_of_mip(self):
+        prob = self.solver.create_problem()
+        prob.define('x', types=lp.VariableType.Integer, lower=0, upper=10)
+        prob.set_linear_objective(prob.var('x'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        with self.assertRaises(ValueError):
+            result.get_reduced_costs(['x'])
+
+    def test_integer_variables(self):
+        prob = self.solver.create_problem()
+        prob.define('x', lower=0, upper=10)
+        prob.define('y', types=lp.VariableType.Integer, lower=0, upper=10)
+        prob.define('b', types=lp.VariableType.Binary)
+        prob.add_linear_constraints(2*prob.var('y') <= 7,
+                                    prob.var('x') <= 10*prob.var('b'))
+        prob.set_linear_objective(
+            prob.var('x') + prob.var('y') - 2*prob.var('b'))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('y'), 3)
+        self.assertAlmostEqual(result.get_value('b'), 1)
+        self.assertAlmostEqual(result.get_value('x'), 10)
+
+    def test_set_basis_from_previous_solve(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+        prob.solve(lp.ObjectiveSense.Maximize)
+        basis = prob.get_basis()
+
+        prob.set_linear_objective(prob.var('x') + 2*prob.var('y'))
+        prob.solve(lp.ObjectiveSense.Maximize)
+
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+        prob.set_basis(basis)
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 10)
+        self.assertAlmostEqual(result.get_value('y'), 2)
+
+    def test_copy_is_independent(self):
+        prob = self.solver.create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        c, = prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_linear_objective(2*prob.var('x') + prob.var('y'))
+
+        prob2 = prob.copy()
+        prob2.define('z', lower=0, upper=1)
+        prob2.add_linear_constraints(prob2.var('y') >= 4)
+        prob2.set_linear_objective(2*prob2.var('x') + prob2.var('z'))
+        c.set_rhs(11)
+
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 10)
+        self.assertAlmostEqual(result.get_value('y'), 1)
+
+        result = prob2.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value('x'), 8)
+        self.assertAlmostEqual(result.get_value('y'), 4)
+        self.assertAlmostEqual(result.get_value('z'), 1)
+
+    def test_write_and_read_problem(self):
+        prob = self.solver.create_problem()
+        prob.define(('v', 'rxn_1'), ('v', 'rxn_2'), lower=0, upper=10)
+        prob.add_linear_constraints(
+            prob.var(('v', 'rxn_1')) + prob.var(('v', 'rxn_2')) <= 12)
+        prob.set_linear_objective(
+            2*prob.var(('v', 'rxn_1')) + prob.var(('v', 'rxn_2')))
+
+        for format in ('lp', 'mps'):
+            path = os.path.join(self.tempdir, 'problem.' + format)
+            prob.write(path)
+
+            prob2 = self.solver.read_problem(path)
+            result = prob2.solve(lp.ObjectiveSense.Maximize)
+            self.assertAlmostEqual(result.get_value(('v', 'rxn_1')), 10)
+            self.assertAlmostEqual(result.get_value(('v', 'rxn_2')), 2)
+
+            prob2.define('z', lower=0, upper=1)
+            prob2.add_linear_constraints(
+                prob2.var(('v', 'rxn_1')) + prob2.var('z') <= 9)
+            prob2.set_linear_objective(prob2.var('z'))
+            result = prob2.solve(lp.ObjectiveSense.Maximize)
+            self.assertAlmostEqual(result.get_value('z'), 1)
+
+    def test_write_names_file_as_json(self):
+        prob = self.solver.create_problem()
+        prob.define(('v', 'rxn_1'), lower=0, upper=10)
+        prob.define(('mu', object()), lower=0, upper=5)
+        prob.add_linear_constraints(prob.var(('v', 'rxn_1')) <= 8)
+        prob.set_linear_objective(prob.var(('v', 'rxn_1')))
+
+        path = os.path.join(self.tempdir, 'problem.lp')
+        prob.write(path)
+        with open(path + '.names', 'r') as f:
+            pairs = json.load(f)
+        self.assertEqual(len(pairs), 1)
+        self.assertEqual(pairs[0][0], {'tuple': ['v', 'rxn_1']})
+
+        prob2 = self.solver.read_problem(path)
+        result = prob2.solve(lp.ObjectiveSense.Maximize)
+        self.assertAlmostEqual(result.get_value(('v', 'rxn_1')), 8)
+
+
+@requires_glpk
+class TestSolverStatistics(unittest.TestCase):
+    def setUp(self):
+        lp.statistics.enabled = True
+        lp.statistics.reset()
+
+    def tearDown(self):
+        lp.statistics.enabled = False
+        lp.statistics.reset()
+
+    def test_solves_are_recorded(self):
+        prob = glpk.Solver().create_problem()
+        prob.define('x', 'y', lower=0, upper=10)
+        prob.add_linear_constraints(prob.var('x') + prob.var('y') <= 12)
+        prob.set_linear_objective(prob.var('x'))
+        prob.solve(lp.ObjectiveSense.Maximize)
+        prob.solve(lp.ObjectiveSense.Minimize)
+
+        self.assertEqual(lp.statistics.solve_count, 2)
+        self.assertEqual(lp.statistics.solves[0][2:], (1, 2, 2))
+        self.assertEqual(lp.statistics.max_size(), (1, 2, 2))
+        self.assertGreater(lp.statistics.build_time, 0)
+        self.assertGreaterEqual(lp.statistics.solve_wall_time, 0)
+
+    def test_problem_edits_are_recorded(self):
+        prob = glpk.Solver().create_problem()
+        prob.define('x', lower=0, upper=10)
+        c, = prob.add_linear_constraints(prob.var('x') <= 8)
+
+        calls = []
+        begin_build = lp.statistics.begin_build
+
+        def record_begin():
+            calls.append(True)
+            return begin_build()
+        lp.statistics.begin_build = record_begin
+        try:
+            prob.set_bounds('x', lower=1, upper=5)
+            c.set_rhs(4)
+            c.delete()
+        finally:
+            del lp.statistics.begin_build
+        self.assertEqual(len(calls), 3)
+
+    def test_nothing_recorded_when_disabled(self):
+        lp.statistics.enabled = False
+        prob = glpk.Solver().create_problem()
+        prob.define('x', lower=0, upper=10)
+        prob.set_linear_objective(prob.var('x'))
+        prob.solve(lp.ObjectiveSense.Maximize)
+
+        self.assertEqual(lp.statistics.solve_count, 0)
+        self.assertEqual(lp.statistics.build_time, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
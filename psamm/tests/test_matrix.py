@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+import unittest
+
+import numpy
+
+from psamm.metabolicmodel import MetabolicModel
+from psamm.database import DictDatabase
+from psamm.datasource.modelseed import parse_reaction
+from psamm.lpsolver import lp
+from psamm import matrix
+
+try:
+    from psamm.lpsolver import cplex
+except ImportError:
+    cplex = None
+
+requires_solver = unittest.skipIf(cplex is None, 'solver not available')
+
+
+class TestStoichiometricMatrix(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> (2) |A|'))
+        self.database.set_reaction('rxn_2', parse_reaction('|A| => |B|'))
+        self.database.set_reaction('rxn_3', parse_reaction('|B| =>'))
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+
+    def test_mass_balance_entries(self):
+        rows, columns, values, compounds = matrix.mass_balance_entries(
+            self.model.matrix.iteritems(), 'w')
+        entries = set(
+            (compounds[row], column, value)
+            for row, column, value in zip(rows, columns, values))
+        a, b = sorted(compounds, key=str)
+        self.assertEqual(entries, {
+            (a, ('w', 'rxn_1'), 2), (a, ('w', 'rxn_2'), -1),
+            (b, ('w', 'rxn_2'), 1), (b, ('w', 'rxn_3'), -1)})
+
+    def test_stoichiometric_matrix(self):
+        reactions = ['rxn_1', 'rxn_2', 'rxn_3']
+        s = matrix.stoichiometric_matrix(
+            self.model.matrix.iteritems(), reactions)
+        self.assertEqual(s.shape, (2, 3))
+        self.assertTrue(numpy.allclose(s.dot([1, 2, 2]), 0))
+        self.assertEqual(sorted(numpy.abs(s).sum(axis=1)), [2, 3])
+
+    @requires_solver
+    def test_add_mass_balance(self):
+        prob = cplex.Solver().create_problem()
+        for reaction_id in self.model.reactions:
+            prob.define(('v', reaction_id), lower=0, upper=10)
+        constraints = matrix.add_mass_balance(prob, self.model)
+        self.assertEqual(len(constraints), 2)
+
+        prob.set_linear_objective(prob.var(('v', 'rxn_3')))
+        result = prob.solve(lp.ObjectiveSense.Maximize)
+        self.assertTrue(result)
+        self.assertAlmostEqual(result.get_value(('v', 'rxn_1')), 5)
+
+
+class TestNullspace(unittest.TestCase):
+    def test_nullspace_of_matrix(self):
+        s = numpy.array([[1.0, -1.0, 0.0], [0.0, 1.0, -1.0]])
+        nullspace = matrix.nullspace(s)
+        self.assertEqual(nullspace.shape, (3, 1))
+        self.assertTrue(numpy.allclose(s.dot(nullspace), 0))
+
+    def test_nullspace_of_empty_matrix(self):
+        nullspace = matrix.nullspace(numpy.zeros((0, 2)))
+        self.assertTrue(numpy.allclose(nullspace, numpy.eye(2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
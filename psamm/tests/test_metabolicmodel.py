@@ -217,6 +217,14 @@ class TestMetabolicModelFlipableView(unittest.TestCase):
         self.assertEqual(self.model.matrix[Compound('C'), 'rxn_5'], 1)
         self.assertEqual(self.model.matrix[Compound('D'), 'rxn_5'], -1)
 
+    def test_flipable_model_view_matrix_iteritems_after_flip(self):
+        self.model.flip({ 'rxn_4' })
+        matrix = dict(self.model.matrix.iteritems())
+        self.assertEqual(matrix[Compound('A'), 'rxn_1'], 2)
+        self.assertEqual(matrix[Compound('A'), 'rxn_2'], -1)
+        self.assertEqual(matrix[Compound('A'), 'rxn_4'], 1)
+        self.assertEqual(matrix[Compound('C'), 'rxn_4'], -1)
+
     def test_flipable_model_view_limits_get_item_after_flip(self):
         self.model.flip({ 'rxn_1', 'rxn_2' })
         self.assertEqual(self.model.limits['rxn_1'].bounds, (-1000, 0))
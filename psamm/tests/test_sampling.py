@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# This file is part of PSAMM.
+#
+# PSAMM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PSAMM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PSAMM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2015  Jon Lund Steffensen <jon_steffensen@uri.edu>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from psamm.metabolicmodel import MetabolicModel
+from psamm.database import DictDatabase
+from psamm import sampling
+from psamm.matrix import stoichiometric_matrix
+from psamm.datasource.modelseed import parse_reaction
+
+try:
+    from psamm.lpsolver import cplex
+except ImportError:
+    cplex = None
+
+requires_solver = unittest.skipIf(cplex is None, 'solver not available')
+
+
+@requires_solver
+class TestSampling(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.database.set_reaction('rxn_1', parse_reaction('=> (2) |A|'))
+        self.database.set_reaction('rxn_2', parse_reaction('|A| <=> |B|'))
+        self.database.set_reaction('rxn_3', parse_reaction('|A| => |D|'))
+        self.database.set_reaction('rxn_4', parse_reaction('|A| => |C|'))
+        self.database.set_reaction('rxn_5', parse_reaction('|C| => |D|'))
+        self.database.set_reaction('rxn_6', parse_reaction('|D| =>'))
+        self.model = MetabolicModel.load_model(
+            self.database, self.database.reactions)
+        self.solver = cplex.Solver()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_samples_are_feasible(self):
+        reactions, samples = sampling.sample(
+            self.model, self.solver, 200, thinning=10, seed=1)
+        self.assertEqual(reactions, sorted(self.model.reactions))
+        self.assertEqual(samples.shape, (200, 6))
+
+        matrix = stoichiometric_matrix(
+            self.model.matrix.iteritems(), reactions)
+        self.assertTrue(numpy.allclose(matrix.dot(samples.T), 0))
+        self.assertTrue(numpy.all(samples >= -1e-9))
+        self.assertTrue(numpy.all(samples <= 1000 + 1e-9))
+
+        # Samples are spread out in the flux space
+        self.assertGreater(numpy.ptp(samples[:, 0]), 100)
+
+    def test_samples_with_fixed_lower_bound(self):
+        reactions, samples = sampling.sample(
+            self.model, self.solver, 50, fixed={'rxn_6': 900}, thinning=10,
+            seed=1)
+        column = reactions.index('rxn_6')
+        self.assertTrue(numpy.all(samples[:, column] >= 900 - 1e-9))
+
+    def test_samples_are_steady_state_at_active_bounds(self):
+        self.model.limits['rxn_4'].upper = 50
+        reactions, samples = sampling.sample(
+            self.model, self.solver, 200, fixed={'rxn_6': 900},
+            thinning=10, seed=2)
+
+        matrix = stoichiometric_matrix(
+            self.model.matrix.iteritems(), reactions)
+        self.assertLess(numpy.abs(matrix.dot(samples.T)).max(), 1e-6)
+        column = reactions.index('rxn_4')
+        self.assertTrue(numpy.all(samples[:, column] <= 50 + 1e-9))
+        column = reactions.index('rxn_6')
+        self.assertTrue(numpy.all(samples[:, column] >= 900 - 1e-9))
+
+    def test_same_seed_gives_same_samples(self):
+        _, samples1 = sampling.sample(
+            self.model, self.solver, 20, thinning=5, seed=3)
+        _, samples2 = sampling.sample(
+            self.model, self.solver, 20, thinning=5, seed=3)
+        self.assertTrue(numpy.array_equal(samples1, samples2))
+
+    def test_parallel_chains_written_to_file(self):
+        path = os.path.join(self.tempdir, 'samples.npy')
+        _, samples = sampling.sample(
+            self.model, self.solver, 101, thinning=5, output=path,
+            parallel=2, seed=3)
+        self.assertIsInstance(samples, numpy.memmap)
+        self.assertEqual(samples.shape, (101, 6))
+
+        _, expected = sampling.sample(
+            self.model, self.solver, 101, thinning=5, parallel=2, seed=3)
+        self.assertTrue(numpy.array_equal(numpy.load(path), expected))
+
+    def test_invalid_thinning(self):
+        with self.assertRaises(ValueError):
+            sampling.sample(self.model, self.solver, 10, thinning=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -44,6 +44,15 @@ class LoggerFile(object):
         This is a noop."""
 
 
+def chunks(items, count):
+    """Split list of items into consecutive chunks of at most count items
+
+    This is used to divide work between the processes of a
+    :class:`multiprocessing.Pool` in chunks of neighbouring items.
+    """
+    return [items[i:i+count] for i in range(0, len(items), count)]
+
+
 def convex_cardinality_relaxed(f, epsilon=1e-5):
     """Transform L1-norm optimization function into approximate cardinality optimization
 
@@ -48,7 +48,7 @@ setup(
 
     test_suite='psamm.tests',
 
-    install_requires=['PyYAML>=3.11,<4.0'],
+    install_requires=['PyYAML>=3.11,<4.0', 'numpy'],
     extras_require={
         'docs': ['sphinx', 'mock']
     })